@@ -0,0 +1,177 @@
+import json
+from datetime import datetime
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request, stream_with_context
+from werkzeug.exceptions import HTTPException
+
+from config import db, cache
+from models import Venue, Artist, ArtistGenre, Show
+from pagination import Page, page_args
+from queries import venue_shows, artist_shows, venue_details, artist_details, upcoming_shows_query
+
+
+# ----------------------------------------------------------------------------#
+# JSON API, version 1.
+#
+# Mirrors the HTML views with the same data. Collections stream as NDJSON,
+# one object per line, fetched STREAM_BATCH rows at a time so memory stays
+# flat however large they grow. Every response carries an ETag derived from
+# the response cache's tag versions, so a matching If-None-Match is answered
+# 304 without a query.
+# ----------------------------------------------------------------------------#
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+STREAM_BATCH = 1000
+NDJSON = 'application/x-ndjson'
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Page):
+        return {'data': list(value), 'next_cursor': value.next_cursor, 'prev_cursor': value.prev_cursor}
+    if hasattr(value, '_asdict'):
+        return value._asdict()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def dumps(value):
+    return json.dumps(value, default=_json_default, separators=(',', ':'))
+
+
+def json_response(value):
+    return Response(dumps(value), mimetype='application/json')
+
+
+def ndjson_response(rows, transform=None):
+    """Streams ``rows`` (a query or select) as NDJSON, STREAM_BATCH rows per fetch."""
+    def generate():
+        result = db.session.execute(rows.execution_options(yield_per=STREAM_BATCH))
+        for batch in result.partitions():
+            batch = [row._asdict() for row in batch]
+            if transform is not None:
+                transform(batch)
+            yield ''.join(dumps(row) + '\n' for row in batch)
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON)
+
+
+def shows_page(shows_of, owner_id):
+    when = request.args.get('when')
+    if when not in ('upcoming', 'past'):
+        abort(400)
+    cursor, per_page = page_args(current_app.config['SHOWS_PER_SECTION'])
+    return json_response(shows_of(owner_id, when, cursor, per_page))
+
+
+def http_error(error):
+    return jsonify(error=error.name, status=error.code), error.code
+
+
+# By code as well, or the app's HTML 404/500 pages would take precedence.
+api.register_error_handler(HTTPException, http_error)
+for code in (400, 404, 405, 500):
+    api.register_error_handler(code, http_error)
+
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@api.route('/venues')
+@cache.conditional('venues')
+def venues():
+    """Every venue in the order of the venues page, grouped there by state and city."""
+    return ndjson_response(
+        db.select(
+            Venue.id,
+            Venue.name,
+            Venue.city,
+            Venue.state,
+            Venue.upcoming_shows_count.label('num_upcoming_shows')
+        )
+        .order_by(Venue.state, Venue.city, Venue.id)
+    )
+
+
+@api.route('/venues/<int:venue_id>')
+@cache.conditional('venue:{venue_id}')
+def venue(venue_id):
+    venue = db.session.get(Venue, venue_id)
+    if not venue:
+        abort(404)
+    return json_response(venue_details(venue, current_app.config['SHOWS_PER_SECTION']))
+
+
+@api.route('/venues/<int:venue_id>/shows')
+@cache.conditional('venue:{venue_id}')
+def venue_show_page(venue_id):
+    """A venue's ?when=upcoming|past shows after ?cursor."""
+    return shows_page(venue_shows, venue_id)
+
+
+#  Artists
+#  ----------------------------------------------------------------
+
+def _add_genres(rows):
+    genres = {row['id']: [] for row in rows}
+    for artist_id, genre in db.session.execute(
+        db.select(ArtistGenre.artist_id, ArtistGenre.genre)
+        .where(ArtistGenre.artist_id.in_(genres))
+        .order_by(ArtistGenre.artist_id, ArtistGenre.genre)
+    ):
+        genres[artist_id].append(genre)
+    for row in rows:
+        row['genres'] = genres[row['id']]
+
+
+@api.route('/artists')
+@cache.conditional('artists')
+def artists():
+    """Every artist by id, optionally only those playing ?genre=."""
+    query = db.select(
+        Artist.id,
+        Artist.name,
+        Artist.city,
+        Artist.state,
+        Artist.upcoming_shows_count.label('num_upcoming_shows')
+    ).order_by(Artist.id)
+    genre = request.args.get('genre')
+    if genre:
+        query = query.join(ArtistGenre, ArtistGenre.artist_id == Artist.id).where(ArtistGenre.genre == genre)
+    return ndjson_response(query, _add_genres)
+
+
+@api.route('/artists/<int:artist_id>')
+@cache.conditional('artist:{artist_id}')
+def artist(artist_id):
+    artist = db.session.get(Artist, artist_id)
+    if not artist:
+        abort(404)
+    return json_response(artist_details(artist, current_app.config['SHOWS_PER_SECTION']))
+
+
+@api.route('/artists/<int:artist_id>/shows')
+@cache.conditional('artist:{artist_id}')
+def artist_show_page(artist_id):
+    """An artist's ?when=upcoming|past shows after ?cursor."""
+    return shows_page(artist_shows, artist_id)
+
+
+#  Shows
+#  ----------------------------------------------------------------
+
+@api.route('/shows')
+@cache.conditional('shows')
+def shows():
+    """Every upcoming show, soonest first."""
+    return ndjson_response(upcoming_shows_query().order_by(Show.start_time, Show.id).statement)
+
+
+@api.route('/show-tickets/<ticket>')
+def show_ticket(ticket):
+    """Whether a show submitted in ingest mode is still queued, landed (with its id) or was rejected."""
+    status = current_app.extensions['show_ingest'].status(ticket)
+    if status is None:
+        abort(404)
+    return jsonify(status)
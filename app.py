@@ -2,39 +2,99 @@
 # Imports
 # ----------------------------------------------------------------------------#
 
-import dateutil.parser
-import babel
-from flask import abort, render_template, request, flash, redirect, url_for
+import hmac
+import importlib
+import os
+from datetime import datetime, timezone
+from functools import lru_cache
+from flask import Blueprint, Flask, abort, current_app, render_template, request, flash, redirect, url_for, Response
+from jinja2 import FileSystemBytecodeCache
 import logging
 from logging import Formatter, FileHandler
-from forms import *
-from sqlalchemy import func
-from models import Venue, Artist, Show
-import ast
-from config import app, db
+from models import Venue, Artist, ArtistGenre, Show
+from pagination import page_args, paginate
+from queries import (venue_shows, artist_shows, venue_details, artist_details,
+                     upcoming_shows_query)
+import search
+import typeahead
+import booking
+import bulk
+import counters  # keeps the show counters in step with writes
+import cli
+import metrics
+from instrumentation import log_event
+from api import api, json_response
+from freshness import conditional_page
+from ingest import ShowIngest, IngestBusy
+from thumbnails import SIZES, ThumbnailError
+import config
+from config import db, cache, unit_of_work, thumbnails
+from database import dispose_after_fork
+
+show_ingest = ShowIngest()
+main = Blueprint('main', __name__)
+
+# Imported where first used rather than above, so a worker that never needs
+# them doesn't pay for them at start; preload() imports them before forking.
+DEFERRED_IMPORTS = ('babel.dates', 'dateutil.parser', 'forms', 'PIL.Image', 'PIL.ImageOps')
 
 
 # ----------------------------------------------------------------------------#
 # Filters.
 # ----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format = "EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format = "EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
 
 
-app.jinja_env.filters['datetime'] = format_datetime
+@lru_cache(maxsize=64)
+def compiled_datetime_format(format, locale):
+  """Parses a Babel pattern and its locale once per (format, locale)."""
+  import babel.dates
+  return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format)), babel.Locale.parse(locale)
+
+
+def format_datetime(value, format='medium', locale='en'):
+  if isinstance(value, str):
+      try:
+          value = datetime.fromisoformat(value)
+      except ValueError:
+          import dateutil.parser
+          value = dateutil.parser.parse(value)
+  pattern, locale = compiled_datetime_format(format, locale)
+  if value.tzinfo is None:
+      # babel.dates.format_datetime treats naive datetimes as UTC too
+      value = value.replace(tzinfo=timezone.utc)
+  return pattern.apply(value, locale)
+
+
+main.add_app_template_filter(format_datetime, 'datetime')
+
+# ----------------------------------------------------------------------------#
+# Cache invalidation.
+# ----------------------------------------------------------------------------#
+
+
+def venue_cache_tags(venue_id):
+  """Tags of every cached page showing this venue's name or image."""
+  artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+  return ['venues', 'shows', f'venue:{venue_id}'] + [f'artist:{row.artist_id}' for row in artist_ids]
+
+
+def artist_cache_tags(artist_id):
+  """Tags of every cached page showing this artist's name or image."""
+  venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+  return ['artists', 'shows', f'artist:{artist_id}'] + [f'venue:{row.venue_id}' for row in venue_ids]
+
 
 # ----------------------------------------------------------------------------#
 # Controllers.
 # ----------------------------------------------------------------------------#
 
 
-@app.route('/')
+@main.route('/')
 def index():
   return render_template('pages/home.html')
 
@@ -42,24 +102,24 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
+@main.route('/venues')
+@cache.cached('venues')
 def venues():
     """Renders a template displaying all venues grouped by city and state."""
     data = []
+    cursor, per_page = page_args()
 
-    # Query to get venues with the count of upcoming shows
-    locations = (
+    # Query to get venues with their precomputed count of upcoming shows
+    locations = paginate(
         db.session.query(
             Venue.state,
             Venue.city,
             Venue.id,
             Venue.name,
-            func.count(Show.id).label('num_upcoming_shows')
-        )
-        .outerjoin(Show, (Show.venue_id == Venue.id) & (Show.start_time > datetime.now()))
-        .group_by(Venue.state, Venue.city, Venue.id)
-        .order_by(Venue.state, Venue.city)
-        .all()
+            Venue.upcoming_shows_count.label('num_upcoming_shows')
+        ),
+        (Venue.state, Venue.city, Venue.id),
+        cursor, per_page
     )
     # Group venues by city and state
     unique_locations = {}
@@ -80,44 +140,49 @@ def venues():
             'venues': venues
         })
 
-    return render_template('pages/venues.html', areas=data)
+    return render_template('pages/venues.html', areas=data, page=locations)
 
 
-@app.route('/venues/search', methods=['POST'])
+@main.route('/venues/search', methods=['POST'])
+@unit_of_work.read_only
 def search_venues():
     """
     Searches for venues based on a search term provided in a POST request.
     """
     search_term = request.form.get('search_term', '').lower()
+    cursor, per_page = page_args()
+    hits, total = search.search(Venue, search_term, cursor, per_page)
 
-    # Query to search venues and count upcoming shows
-    search_results = (
+    # Query names and precomputed upcoming show counts for this page of hits
+    search_results = {
+        result.id: result for result in
         db.session.query(
             Venue.id,
             Venue.name,
-            func.count(Show.id).label('num_upcoming_shows')
+            Venue.upcoming_shows_count.label('num_upcoming_shows')
         )
-        .outerjoin(Show, (Show.venue_id == Venue.id) & (Show.start_time > datetime.now()))
-        .filter(Venue.name.ilike(f'%{search_term}%'))
-        .group_by(Venue.id)
-        .all()
-    )
+        .filter(Venue.id.in_([hit.id for hit in hits]))
+    }
 
+    # A hit can outlive its row, e.g. deleted since the search index saw it.
     data = [{
-        'id': result.id,
-        'name': result.name,
-        'num_upcoming_shows': result.num_upcoming_shows
-    } for result in search_results]
+        'id': hit.id,
+        'name': search_results[hit.id].name,
+        'num_upcoming_shows': search_results[hit.id].num_upcoming_shows
+    } for hit in hits if hit.id in search_results]
 
     response = {
-        'count': len(search_results),
+        'count': total - (len(hits) - len(data)),
         'data': data
     }
 
-    return render_template('pages/search_venues.html', results=response, search_term=search_term)
+    return render_template('pages/search_venues.html', results=response,
+                           search_term=search_term, page=hits)
 
 
-@app.route('/venues/<int:venue_id>')
+@main.route('/venues/<int:venue_id>')
+@conditional_page(Venue, 'venue_id')
+@cache.cached('venue:{venue_id}')
 def show_venue(venue_id):
     """
     Displays the details of a specific venue with upcoming and past shows.
@@ -127,60 +192,36 @@ def show_venue(venue_id):
     if not venue:
         return abort(404)
 
-    # Query shows with artist information
-    shows = (
-        db.session.query(Show, Artist)
-        .join(Artist, Show.artist_id == Artist.id)
-        .filter(Show.venue_id == venue_id)
-        .all()
-    )
-
-    upcoming_shows = []
-    past_shows = []
-
-    for show, artist in shows:
-        show_data = {
-            'artist_id': artist.id,
-            'artist_name': artist.name,
-            'artist_image_link': artist.image_link,
-            'start_time': show.start_time.strftime('%Y-%m-%d %H:%M:%S')
-        }
-        if show.start_time > datetime.now():
-            upcoming_shows.append(show_data)
-        else:
-            past_shows.append(show_data)
-
-    data = {
-        'id': venue.id,
-        'name': venue.name,
-        'address': venue.address,
-        'city': venue.city,
-        'state': venue.state,
-        'phone': venue.phone,
-        'website': venue.website_link,
-        'facebook_link': venue.facebook_link,
-        'seeking_talent': venue.seeking_talent,
-        'seeking_description': venue.seeking_description,
-        'image_link': venue.image_link,
-        'past_shows': past_shows,
-        'upcoming_shows': upcoming_shows,
-        'past_shows_count': len(past_shows),
-        'upcoming_shows_count': len(upcoming_shows),
-    }
+    data = venue_details(venue, current_app.config['SHOWS_PER_SECTION'])
 
     return render_template('pages/show_venue.html', venue=data)
 
+
+@main.route('/venues/<int:venue_id>/shows')
+@cache.cached('venue:{venue_id}')
+def more_venue_shows(venue_id):
+    """
+    Renders the next tiles of a venue's ?when=upcoming|past shows after ?cursor.
+    """
+    when = request.args.get('when')
+    if when not in ('upcoming', 'past'):
+        return abort(400)
+    cursor, per_page = page_args(current_app.config['SHOWS_PER_SECTION'])
+    shows = venue_shows(venue_id, when, cursor, per_page)
+    return render_template('pages/show_venue_tiles.html', shows=shows, venue_id=venue_id, when=when)
+
 #  Create Venue
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues/create', methods=['GET'])
+@main.route('/venues/create', methods=['GET'])
 def create_venue_form():
+  from forms import VenueForm
   form = VenueForm()
   return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/create', methods=['POST'])
+@main.route('/venues/create', methods=['POST'])
 def create_venue_submission():
     """
     Creates a new venue record in the database based on submitted form data.
@@ -199,17 +240,15 @@ def create_venue_submission():
             facebook_link=form_data['facebook_link'],
         )
 
-        db.session.add(venue)
-        db.session.commit()
+        with unit_of_work.transaction():
+            db.session.add(venue)
+        cache.invalidate('venues')
 
         flash(f'Venue {form_data["name"]} was successfully listed!')
 
     except Exception as e:
         error = True
-        db.session.rollback()
-        print(f"An error occurred: {e}")
-    finally:
-        db.session.close()
+        log_event('venue_create_failed', logging.ERROR, exc_info=True, error=e)
 
     if error:
         flash('An error occurred. Venue could not be listed.')
@@ -217,29 +256,28 @@ def create_venue_submission():
     return render_template('pages/home.html')
 
 
-@app.route('/venues/<int:venue_id>', methods=['DELETE'])
+@main.route('/venues/<int:venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
     """
     Deletes a venue from the database based on the provided venue ID.
     """
     err = False
     try:
-        venue = db.session.get(Venue, venue_id)
-        if not venue:
-            flash('Venue not found.')
-            return render_template('pages/venues.html')
+        with unit_of_work.transaction():
+            venue = db.session.get(Venue, venue_id)
+            if not venue:
+                flash('Venue not found.')
+                return render_template('pages/venues.html')
 
-        db.session.delete(venue)
-        db.session.commit()
+            tags = venue_cache_tags(venue_id)
+            db.session.delete(venue)
+        cache.invalidate(*tags)
 
         flash('Venue successfully deleted.')
 
     except Exception as e:
         err = True
-        db.session.rollback()
-        print(f"An error occurred: {e}")
-    finally:
-        db.session.close()
+        log_event('venue_delete_failed', logging.ERROR, exc_info=True, venue_id=venue_id, error=e)
 
     if err:
         flash('An error occurred. Venue could not be deleted.')
@@ -250,40 +288,62 @@ def delete_venue(venue_id):
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists')
+@main.route('/artists')
+@cache.cached('artists')
 def artists():
-  """Get list artists
+  """Get list artists, optionally only those playing ?genre=
   """
-  data = db.session.query(Artist).all()
-  return render_template('pages/artists.html', artists=data)
-
-
-@app.route('/artists/search', methods=['POST'])
+  cursor, per_page = page_args()
+  genre = request.args.get('genre')
+  query = db.session.query(Artist.id, Artist.name)
+  if genre:
+      # Answered from the (genre, artist_id) index on artist_genre
+      query = query.join(ArtistGenre, ArtistGenre.artist_id == Artist.id).filter(ArtistGenre.genre == genre)
+  data = paginate(query, (Artist.id,), cursor, per_page)
+  return render_template('pages/artists.html', artists=data, page=data, genre=genre)
+
+
+@main.route('/artists/search', methods=['POST'])
+@unit_of_work.read_only
 def search_artists():
     """
     Searches for artists based on a search term provided in a POST request.
     """
 
     search_term = request.form.get('search_term', '').lower()
-    search_results = Artist.query.filter(
-        Artist.name.ilike(f'%{search_term}%')).all()
+    cursor, per_page = page_args()
+    hits, total = search.search(Artist, search_term, cursor, per_page)
 
-    data = [{
-        'id': artist.id,
-        'name': artist.name,
-        'num_upcoming_shows': db.session.query(func.count(Show.id)).filter(
-            Show.artist_id == artist.id, Show.start_time > datetime.now()).scalar()
+    # Query names and precomputed upcoming show counts for this page of hits
+    search_results = {
+        result.id: result for result in
+        db.session.query(
+            Artist.id,
+            Artist.name,
+            Artist.upcoming_shows_count.label('num_upcoming_shows')
+        )
+        .filter(Artist.id.in_([hit.id for hit in hits]))
+    }
 
-    } for artist in search_results]
+    # A hit can outlive its row, e.g. deleted since the search index saw it.
+    data = [{
+        'id': hit.id,
+        'name': search_results[hit.id].name,
+        'num_upcoming_shows': search_results[hit.id].num_upcoming_shows
+    } for hit in hits if hit.id in search_results]
 
     response = {
-        'count': len(search_results),
+        'count': total - (len(hits) - len(data)),
         'data': data
     }
-    return render_template('pages/search_artists.html', results=response, search_term=search_term)
+
+    return render_template('pages/search_artists.html', results=response,
+                           search_term=search_term, page=hits)
 
 
-@app.route('/artists/<int:artist_id>')
+@main.route('/artists/<int:artist_id>')
+@conditional_page(Artist, 'artist_id')
+@cache.cached('artist:{artist_id}')
 def show_artist(artist_id):
     """
     Displays the details of a specific artist with past and upcoming shows.
@@ -294,58 +354,40 @@ def show_artist(artist_id):
     if not artist:
         return abort(404)
 
-    shows = db.session.query(Show).join(Venue).filter(
-        Show.artist_id == artist_id).all()
-
-    past_shows = []
-    upcoming_shows = []
-    for show in shows:
-        show_data = {
-            'venue_id': show.venue_id,
-            'venue_name': show.venue.name,
-            'artist_image_link': artist.image_link,
-            'start_time': show.start_time.strftime('%Y-%m-%d %H:%M:%S')
-        }
-        if show.start_time < datetime.now():
-            past_shows.append(show_data)
-        else:
-            upcoming_shows.append(show_data)
-    genres = ast.literal_eval(artist.genres)
-    data = {
-        'id': artist.id,
-        'name': artist.name,
-        'genres': genres,
-        'city': artist.city,
-        'state': artist.state,
-        'phone': artist.phone,
-        'website': artist.website_link,
-        'facebook_link': artist.facebook_link,
-        'seeking_venue': artist.seeking_venue,
-        'seeking_description': artist.seeking_description,
-        'image_link': artist.image_link,
-        'past_shows': past_shows,
-        'upcoming_shows': upcoming_shows,
-        'past_shows_count': len(past_shows),
-        'upcoming_shows_count': len(upcoming_shows)
-    }
+    data = artist_details(artist, current_app.config['SHOWS_PER_SECTION'])
 
     return render_template('pages/show_artist.html', artist=data)
 
 
+@main.route('/artists/<int:artist_id>/shows')
+@cache.cached('artist:{artist_id}')
+def more_artist_shows(artist_id):
+    """
+    Renders the next tiles of an artist's ?when=upcoming|past shows after ?cursor.
+    """
+    when = request.args.get('when')
+    if when not in ('upcoming', 'past'):
+        return abort(400)
+    cursor, per_page = page_args(current_app.config['SHOWS_PER_SECTION'])
+    shows = artist_shows(artist_id, when, cursor, per_page)
+    return render_template('pages/show_artist_tiles.html', shows=shows, artist_id=artist_id, when=when)
+
+
 #  Update
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@main.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
     """
     Presents a pre-populated form for editing an artist's details.
     """
+    from forms import ArtistForm
     form = ArtistForm()
     artist = db.session.get(Artist, artist_id)
     if not artist:
         return abort(404)
     if artist:
         form.name.data = artist.name
-        form.genres.data = artist.genres
+        form.genres.data = list(artist.genres)
         form.city.data = artist.city
         form.state.data = artist.state
         form.phone.data = artist.phone
@@ -357,40 +399,42 @@ def edit_artist(artist_id):
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@main.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
     """Editing an artist's
     """
     artist_data = request.form.to_dict()
 
     try:
-        artist = db.session.get(Artist, artist_id)
-        artist.name = artist_data.get('name')
-        artist.city = artist_data.get('city')
-        artist.state = artist_data.get('state')
-        artist.phone = artist_data.get('phone')
-        artist.website_link = artist_data.get('website_link')
-        artist.facebook_link = artist_data.get('facebook_link')
-        artist.image_link = artist_data.get('image_link')
-        artist.seeking_venue = artist_data.get('seeking_venue', False)
-        artist.seeking_description = artist_data.get('seeking_description')
-
-        db.session.commit()
+        with unit_of_work.transaction():
+            artist = db.session.get(Artist, artist_id)
+            artist.name = artist_data.get('name')
+            artist.city = artist_data.get('city')
+            artist.state = artist_data.get('state')
+            artist.phone = artist_data.get('phone')
+            artist.website_link = artist_data.get('website_link')
+            artist.facebook_link = artist_data.get('facebook_link')
+            artist.image_link = artist_data.get('image_link')
+            artist.seeking_venue = artist_data.get('seeking_venue', False)
+            artist.seeking_description = artist_data.get('seeking_description')
+
+            tags = artist_cache_tags(artist_id)
+        cache.invalidate(*tags)
         flash('Artist ' + artist.name + ' was successfully updated!')
 
     except Exception as e:
-        db.session.rollback()
-        print(e)
+        log_event('artist_update_failed', logging.ERROR, exc_info=True, artist_id=artist_id, error=e)
         flash('An Error occurred: Artist could not be updated')
 
-    return redirect(url_for('show_artist', artist_id=artist_id))
+    return redirect(url_for('main.show_artist', artist_id=artist_id))
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@main.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
     venue = db.session.get(Venue, venue_id)
 
     if venue:
+        from forms import VenueForm
         form = VenueForm(obj=venue)
 
         return render_template('forms/edit_venue.html', form=form, venue=venue)
@@ -399,7 +443,7 @@ def edit_venue(venue_id):
         return redirect(url_for('pages/venues.html'))
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@main.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     """Editing an venue
     """
@@ -408,27 +452,28 @@ def edit_venue_submission(venue_id):
 
     if venue:
         try:
-            venue_data = request.form.to_dict()
-            venue.name = venue_data.get('name')
-            venue.city = venue_data.get('city')
-            venue.state = venue_data.get('state')
-            venue.address = venue_data.get('address')
-            venue.phone = venue_data.get('phone')
-            venue.website_link = venue_data.get('website_link')
-            venue.facebook_link = venue_data.get('facebook_link')
-            venue.image_link = venue_data.get('image_link')
-            venue.seeking_talent = venue_data.get('seeking_talent')
-            venue.seeking_description = venue_data.get('seeking_description')
-
-            db.session.commit()
+            with unit_of_work.transaction():
+                venue_data = request.form.to_dict()
+                venue.name = venue_data.get('name')
+                venue.city = venue_data.get('city')
+                venue.state = venue_data.get('state')
+                venue.address = venue_data.get('address')
+                venue.phone = venue_data.get('phone')
+                venue.website_link = venue_data.get('website_link')
+                venue.facebook_link = venue_data.get('facebook_link')
+                venue.image_link = venue_data.get('image_link')
+                venue.seeking_talent = venue_data.get('seeking_talent')
+                venue.seeking_description = venue_data.get('seeking_description')
+
+                tags = venue_cache_tags(venue_id)
+            cache.invalidate(*tags)
             flash('Venue {} was successfully updated!'.format(venue.name))
 
         except Exception as e:
-            db.session.rollback()
-            print(e)
+            log_event('venue_update_failed', logging.ERROR, exc_info=True, venue_id=venue_id, error=e)
             flash('An Error occurred: Venue could not be updated')
 
-        return redirect(url_for('show_venue', venue_id=venue_id))
+        return redirect(url_for('main.show_venue', venue_id=venue_id))
     else:
         flash('Venue not found!')
         return None
@@ -437,13 +482,14 @@ def edit_venue_submission(venue_id):
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/create', methods=['GET'])
+@main.route('/artists/create', methods=['GET'])
 def create_artist_form():
+  from forms import ArtistForm
   form = ArtistForm()
   return render_template('forms/new_artist.html', form=form)
 
 
-@app.route('/artists/create', methods=['POST'])
+@main.route('/artists/create', methods=['POST'])
 def create_artist_submission():
     """
     Handles the creation of a new Artist record.
@@ -467,7 +513,7 @@ def create_artist_submission():
             city=city,
             state=state,
             phone=phone,
-            genres=str(genres),
+            genres=genres,
             website_link=website_link,
             facebook_link=facebook_link,
             image_link=image_link,
@@ -475,16 +521,15 @@ def create_artist_submission():
             seeking_description=seeking_description
         )
 
-        db.session.add(artist)
-        db.session.commit()
+        with unit_of_work.transaction():
+            db.session.add(artist)
+        cache.invalidate('artists')
 
     except Exception as e:
         error = True
-        db.session.rollback()
-        print(f"Error creating artist: {e}")
+        log_event('artist_create_failed', logging.ERROR, exc_info=True, error=e)
 
     finally:
-        db.session.close()
         if error:
             flash(f'Error: Artist {name} could not be listed.')
         else:
@@ -496,83 +541,215 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+@main.route('/shows')
+@cache.cached('shows')
 def shows():
   """
   Displays a list of upcoming shows at all venues.
   """
 
-  today = datetime.now()
-  upcoming_shows = db.session.query(Show).join(Artist).join(
-      Venue).filter(Show.start_time > today).all()
+  cursor, per_page = page_args()
+  upcoming_shows = paginate(upcoming_shows_query(), (Show.start_time, Show.id), cursor, per_page)
 
-  shows = [{
-      'venue_id': show.venue_id,
-      'venue_name': show.venue.name,
-      'artist_id': show.artist_id,
-      'artist_name': show.artist.name,
-      'start_time': show.start_time.strftime('%Y-%m-%d %H:%M:%S')
-  } for show in upcoming_shows]
+  return render_template('pages/shows.html', shows=upcoming_shows, page=upcoming_shows)
 
-  return render_template('pages/shows.html', shows=shows)
 
-
-@app.route('/shows/create')
+@main.route('/shows/create')
 def create_shows():
   # renders form. do not touch.
+  from forms import ShowForm
   form = ShowForm()
   return render_template('forms/new_show.html', form=form)
 
 
-@app.route('/shows/create', methods=['POST'])
+@main.route('/shows/create', methods=['POST'])
 def create_show_submission():
   """
-  Handles the creation of a new Show record.
+  Handles the creation of a new Show record, refusing to double-book its
+  venue or artist. In ingest mode the show is queued instead, and answered
+  202 with its ticket's status URL.
   """
-  error = False
+  error = None
+  ticket = None
 
   try:
     artist_id = int(request.form['artist_id'])
     venue_id = int(request.form['venue_id'])
     start_time = datetime.strptime(
         request.form['start_time'], '%Y-%m-%d %H:%M:%S')
+    end_time = request.form.get('end_time')
+    end_time = booking.end_time_for(
+        start_time, datetime.strptime(end_time, '%Y-%m-%d %H:%M:%S') if end_time else None)
 
-    show = Show(artist_id=artist_id, venue_id=venue_id, start_time=start_time)
-    db.session.add(show)
-    db.session.commit()
+    if show_ingest.enabled:
+        ticket = show_ingest.submit(artist_id, venue_id, start_time, end_time)
+    else:
+        with unit_of_work.transaction() as session:
+            booking.check(session.connection(), venue_id, artist_id, start_time, end_time)
+            session.add(Show(artist_id=artist_id, venue_id=venue_id,
+                             start_time=start_time, end_time=end_time))
+        # The listings' counts change too, in the pages and the API.
+        show = {'venue_id': venue_id, 'artist_id': artist_id}
+        cache.invalidate(*bulk.cache_tags(bulk.KINDS['shows'], [show]))
+
+  except IngestBusy as e:
+    log_event('show_ingest_busy', logging.WARNING)
+    flash('Too many shows are being listed right now. Please try again shortly.')
+    return render_template('pages/home.html'), 503, {'Retry-After': str(e.retry_after)}
 
   except (ValueError, Exception) as e:
-    error = True
-    db.session.rollback()
-    print(f"Error creating show: {e}")
+    conflict = booking.as_conflict(e)
+    if conflict:
+        error = f'Show could not be listed. {conflict}'
+    else:
+        error = 'An error occurred. Show could not be listed.'
+        log_event('show_create_failed', logging.ERROR, exc_info=True, error=e)
 
-  finally:
-    db.session.close()
-    flash('Show was successfully listed!' if not error else 'An error occurred. Show could not be listed.')
+  if error:
+    flash(error)
+  elif ticket:
+    flash('Show was received and will be listed shortly.')
+    return render_template('pages/home.html'), 202, {'Location': url_for('api.show_ticket', ticket=ticket)}
+  else:
+    flash('Show was successfully listed!')
 
   return render_template('pages/home.html')
 
 
-@app.errorhandler(404)
+#  Typeahead
+#  ----------------------------------------------------------------
+
+TYPEAHEAD_LIMIT = 10
+MAX_TYPEAHEAD_LIMIT = 50
+
+
+@main.route('/typeahead')
+def typeahead_names():
+  """
+  Venues or artists (``kind``) with a word of their name starting with ``q``,
+  for the pickers of the show form: {"results": [{"id": 1, "name": ...}]}.
+  """
+  model = typeahead.KINDS.get(request.args.get('kind'))
+  if model is None:
+    abort(400)
+  limit = max(1, min(request.args.get('limit', TYPEAHEAD_LIMIT, type=int), MAX_TYPEAHEAD_LIMIT))
+  names = typeahead.typeahead(model, request.args.get('q', ''), limit)
+  response = json_response({'results': [{'id': id, 'name': name} for id, name in names]})
+  # Backspacing retypes a prefix the browser already asked for.
+  response.cache_control.max_age = 10
+  return response
+
+
+#  Images
+#  ----------------------------------------------------------------
+
+IMAGE_OWNERS = {'venue': Venue, 'artist': Artist}
+
+
+@main.route('/img/<kind>/<int:id>/<size>')
+def thumbnail(kind, id, size):
+  """A thumbnail of a venue's or artist's image, from the disk cache in thumbnails.py."""
+  model = IMAGE_OWNERS.get(kind)
+  if model is None or size not in SIZES:
+    abort(404)
+  image_link = db.session.query(model.image_link).filter(model.id == id).scalar()
+  if not image_link:
+    abort(404)
+  try:
+    return thumbnails.send(image_link, size)
+  except ThumbnailError:
+    # Not a redirect to image_link: that would send browsers wherever a
+    # user's link points, from our domain.
+    abort(404)
+
+
+@main.route('/metrics')
+def metrics_endpoint():
+  """Prometheus scrape endpoint, see METRICS_ENABLED and METRICS_TOKEN."""
+  if not current_app.config['METRICS_ENABLED']:
+      abort(404)
+  token = current_app.config['METRICS_TOKEN']
+  if token and not hmac.compare_digest(request.headers.get('Authorization', '').encode(),
+                                           f'Bearer {token}'.encode()):
+      abort(401)
+  return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@main.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
+@main.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+# ----------------------------------------------------------------------------#
+# App factory.
+# ----------------------------------------------------------------------------#
+
+def create_app(config_object=None, **settings):
+  """
+  Builds the app from the settings in config.py, then those of
+  ``config_object`` (e.g. config.Production), then ``settings``.
+  """
+  app = Flask(__name__)
+  app.config.from_object(config)
+  if config_object is not None:
+      app.config.from_object(config_object)
+  app.config.update(settings)
+  if not app.config.get('SECRET_KEY'):
+      raise RuntimeError('Set SECRET_KEY: every process serving the app must share it.')
+  if app.config['TEMPLATE_CACHE_DIR']:
+      os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+      app.jinja_options = {**app.jinja_options,
+                           'bytecode_cache': FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])}
+
+  config.moment.init_app(app)
+  db.init_app(app)
+  cache.init_app(app)
+  config.instrumentation.init_app(app)
+  unit_of_work.init_app(app, db)
+  config.replicas.init_app(app, db)
+  config.assets.init_app(app)
+  thumbnails.init_app(app)
+  show_ingest.init_app(app, db)
+  dispose_after_fork(app, db)
+
+  app.register_blueprint(main)
+  app.register_blueprint(api)
+  cli.init_app(app)
+
+  if not app.debug:
+      file_handler = FileHandler('error.log')
+      file_handler.setFormatter(
+          Formatter(
+              '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+      )
+      app.logger.setLevel(logging.INFO)
+      file_handler.setLevel(logging.INFO)
+      app.logger.addHandler(file_handler)
+      # Structured events from instrumentation.log_event.
+      logging.getLogger('fyyur').addHandler(file_handler)
+      app.logger.info('errors')
+  return app
+
+
+def preload(app):
+  """
+  Does the work a worker would otherwise do on its first requests: imports
+  DEFERRED_IMPORTS, compiles every template and the URL map. Call it before
+  a server forks its workers (see wsgi.py) and they all start with it done.
+  """
+  for module in DEFERRED_IMPORTS:
+      importlib.import_module(module)
+  for name in app.jinja_env.list_templates():
+      app.jinja_env.get_template(name)
+  app.url_map.update()
+  for format in DATETIME_FORMATS:
+      compiled_datetime_format(format, 'en')
+
 
 # ----------------------------------------------------------------------------#
 # Launch.
@@ -580,11 +757,11 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
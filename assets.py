@@ -0,0 +1,282 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+from flask import current_app, request, send_from_directory, url_for
+
+
+# ----------------------------------------------------------------------------#
+# Static asset pipeline.
+#
+# ``flask assets build`` copies everything in static/ to static/dist/ under
+# content-hashed names (css/main.css -> css/main.1b2c3d4e5f60.css), joins
+# the files of each bundle below into one, minifies the CSS, and writes a
+# .gz and, with the brotli package installed, a .br next to every file that
+# compresses. manifest.json maps each original name to its hashed one.
+#
+# Once built, url_for('static', filename='css/main.css') and the asset_url()
+# and asset_urls() template helpers resolve to the hashed names, and the
+# static view serves them precompressed when the client accepts it, with a
+# year-long immutable Cache-Control: a changed file gets a new name. Without
+# a build, everything falls back to the plain files in static/.
+# ----------------------------------------------------------------------------#
+
+# Bundle name -> its files, in order.
+BUNDLES = {
+    'css/app.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    # Run in <head> as the page loads.
+    'js/head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    # Deferred, so they run in this order once the page has parsed.
+    'js/app.js': [
+        'js/libs/jquery-1.11.1.min.js',
+        'js/script.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+}
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+COMPRESSIBLE = {'.css', '.js', '.json', '.map', '.svg', '.txt', '.xml', '.eot', '.otf', '.ttf'}
+# Not worth a sibling below this size, or unless it saves this fraction.
+MIN_COMPRESS_SIZE = 1024
+MIN_COMPRESS_SAVING = 0.1
+# Content-Encoding -> sibling suffix, most preferred first.
+ENCODINGS = {'br': '.br', 'gzip': '.gz'}
+
+CSS_TOKENS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/', re.S)
+CSS_URL = re.compile(r'url\(\s*([\'"]?)(.*?)\1\s*\)')
+SOURCE_MAP = re.compile(r'^\s*//[#@] sourceMappingURL=.*$', re.M)
+
+
+def minify_css(css):
+    """Drops comments and needless whitespace; leaves everything else alone."""
+    css = CSS_TOKENS.sub(lambda m: m.group(1) or '', css)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    # Only after colons: a space before one is a descendant selector.
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}').strip()
+
+
+def _hashed_name(name, content):
+    root, ext = posixpath.splitext(name)
+    return f'{root}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def _compress(path, content):
+    """Writes the compressed siblings of ``path`` worth keeping; returns their encodings."""
+    if posixpath.splitext(path)[1] not in COMPRESSIBLE or len(content) < MIN_COMPRESS_SIZE:
+        return []
+    variants = {'gzip': gzip.compress(content, 9, mtime=0)}
+    brotli = _brotli()
+    if brotli is not None:
+        variants['br'] = brotli.compress(content, quality=11)
+
+    encodings = []
+    for encoding, suffix in ENCODINGS.items():
+        compressed = variants.get(encoding)
+        if compressed is not None and len(compressed) <= len(content) * (1 - MIN_COMPRESS_SAVING):
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            encodings.append(encoding)
+    return encodings
+
+
+class Build:
+    """One run of the pipeline from ``static_folder`` into its dist/ folder."""
+
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self.out = os.path.join(static_folder, DIST)
+        self.files = {}
+        # Bytes sent for every file, compressed where it pays; no 'br' without brotli.
+        self.stats = {'files': 0, 'bytes': 0, 'gzip': 0}
+        if _brotli() is not None:
+            self.stats['br'] = 0
+
+    def sources(self):
+        for root, dirs, files in os.walk(self.static_folder):
+            if os.path.abspath(root) == os.path.abspath(self.static_folder):
+                dirs[:] = [d for d in dirs if d != DIST]
+            for file in sorted(files):
+                path = os.path.join(root, file)
+                yield os.path.relpath(path, self.static_folder).replace(os.sep, '/')
+
+    def read(self, name):
+        with open(os.path.join(self.static_folder, name), 'rb') as f:
+            return f.read()
+
+    def rewrite_urls(self, css, source, target):
+        """Points ``source``'s relative url()s at their hashed names, relative to ``target``."""
+        def replace(match):
+            quote, url = match.groups()
+            if not url or re.match(r'^(?:[a-z]+:|/|#)', url, re.I):
+                return match.group(0)
+            path, sep, suffix = re.match(r'^([^?#]*)([?#]?)(.*)$', url).groups()
+            name = posixpath.normpath(posixpath.join(posixpath.dirname(source), path))
+            entry = self.files.get(name)
+            if entry is None:
+                return match.group(0)
+            hashed = posixpath.relpath(entry['path'], posixpath.dirname(target) or '.')
+            return f'url({quote}{hashed}{sep}{suffix}{quote})'
+        return CSS_URL.sub(replace, css)
+
+    def emit(self, name, content):
+        hashed = _hashed_name(name, content)
+        path = os.path.join(self.out, hashed)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        encodings = _compress(path, content)
+        self.files[name] = {'path': hashed, 'encodings': encodings}
+        self.stats['files'] += 1
+        self.stats['bytes'] += len(content)
+        for encoding in ENCODINGS:
+            if encoding in self.stats:
+                compressed = encoding in encodings
+                self.stats[encoding] += os.path.getsize(path + ENCODINGS[encoding]) if compressed else len(content)
+
+    def css(self, name, target=None):
+        css = self.read(name).decode('utf-8')
+        css = self.rewrite_urls(css, name, target or name)
+        return css if name.endswith('.min.css') else minify_css(css)
+
+    def run(self):
+        names = list(self.sources())
+        # Everything a stylesheet may point at first, so url()s can be rewritten.
+        for name in names:
+            if not name.endswith('.css'):
+                self.emit(name, self.read(name))
+        for name in names:
+            if name.endswith('.css'):
+                self.emit(name, self.css(name).encode('utf-8'))
+        for bundle, members in BUNDLES.items():
+            if bundle.endswith('.css'):
+                content = '\n'.join(self.css(member, bundle) for member in members)
+            else:
+                # Pre-minified libraries and small scripts; joined, not minified.
+                content = ';\n'.join(SOURCE_MAP.sub('', self.read(member).decode('utf-8')).strip()
+                                     for member in members) + ';\n'
+            self.emit(bundle, content.encode('utf-8'))
+
+        manifest = os.path.join(self.out, MANIFEST)
+        with open(manifest + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'files': self.files}, f, indent=1, sort_keys=True)
+        os.replace(manifest + '.tmp', manifest)
+        return self.files
+
+    def clean(self):
+        """Deletes the files of earlier builds that this one didn't write."""
+        keep = {MANIFEST}
+        for entry in self.files.values():
+            keep.add(entry['path'])
+            keep.update(entry['path'] + ENCODINGS[encoding] for encoding in entry['encodings'])
+        removed = 0
+        for root, dirs, files in os.walk(self.out):
+            for file in files:
+                path = os.path.join(root, file)
+                if os.path.relpath(path, self.out).replace(os.sep, '/') not in keep:
+                    os.remove(path)
+                    removed += 1
+        return removed
+
+
+def build(static_folder, clean=False):
+    """Builds static_folder/dist and returns the Build, with its stats."""
+    run = Build(static_folder)
+    run.run()
+    if clean:
+        run.stats['removed'] = run.clean()
+    return run
+
+
+class Assets:
+    """
+    Configuration:
+
+        ASSETS_MANIFEST     manifest written by `flask assets build`
+                            (static/dist/manifest.json)
+    """
+
+    def __init__(self, app=None):
+        self.files = {}
+        self.served = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASSETS_MANIFEST', os.path.join(app.static_folder, DIST, MANIFEST))
+        self.static_folder = app.static_folder
+        self.load(app.config['ASSETS_MANIFEST'])
+
+        app.url_defaults(self._hashed_filename)
+        app.view_functions['static'] = self.send_static_file
+        app.jinja_env.globals.update(asset_url=self.url, asset_urls=self.urls)
+        app.extensions['assets'] = self
+
+    def load(self, manifest):
+        try:
+            with open(manifest, encoding='utf-8') as f:
+                self.files = json.load(f)['files']
+        except FileNotFoundError:
+            self.files = {}
+        self.served = {f"{DIST}/{entry['path']}": entry['encodings'] for entry in self.files.values()}
+
+    def _hashed_filename(self, endpoint, values):
+        if endpoint == 'static':
+            entry = self.files.get(values.get('filename'))
+            if entry is not None:
+                values['filename'] = f"{DIST}/{entry['path']}"
+
+    def url(self, name):
+        """The URL of static file ``name``, hashed once built."""
+        return url_for('static', filename=name)
+
+    def urls(self, bundle):
+        """The built ``bundle``, or the URLs of its files without a build."""
+        if bundle in self.files:
+            return [self.url(bundle)]
+        return [self.url(name) for name in BUNDLES[bundle]]
+
+    def send_static_file(self, filename):
+        encodings = self.served.get(filename)
+        if encodings is None:
+            return current_app.send_static_file(filename)
+
+        encoding = next((encoding for encoding in encodings if request.accept_encodings[encoding]), None)
+        response = send_from_directory(
+            self.static_folder,
+            filename + ENCODINGS[encoding] if encoding else filename,
+            mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+            max_age=IMMUTABLE_MAX_AGE,
+        )
+        if encoding:
+            response.content_encoding = encoding
+        if encodings:
+            response.vary.add('Accept-Encoding')
+        response.cache_control.immutable = True
+        return response
@@ -0,0 +1,77 @@
+"""
+Times rendering 10k show tiles through pages/show_venue_tiles.html with the
+original datetime filter (strftime'd strings re-parsed by dateutil, Babel
+pattern parsed per call) and with the current one (native datetimes,
+compiled patterns cached per format and locale).
+
+Usage:
+    python -m benchmarks.bench_datetime_filter
+    python -m benchmarks.bench_datetime_filter --tiles 50000 --repeat 7
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import babel.dates
+import dateutil.parser
+from flask import render_template
+
+from app import create_app, format_datetime
+from pagination import Page
+
+
+def original_format_datetime(value, format='medium'):
+  date = dateutil.parser.parse(value)
+  if format == 'full':
+      format = "EEEE MMMM, d, y 'at' h:mma"
+  elif format == 'medium':
+      format = "EE MM, dd, y h:mma"
+  return babel.dates.format_datetime(date, format, locale='en')
+
+
+def tiles(count, as_string):
+    start = datetime(2026, 1, 1, 20, 0)
+    shows = []
+    for i in range(count):
+        start_time = start + timedelta(hours=7 * i)
+        shows.append(SimpleNamespace(
+            artist_id=i, artist_name=f'Artist {i}', artist_image_link='https://example.com/a.jpg',
+            start_time=start_time.strftime('%Y-%m-%d %H:%M:%S') if as_string else start_time,
+        ))
+    return Page(shows, None, None)
+
+
+def time_render(app, shows, repeat):
+    timings = []
+    with app.test_request_context():
+        for _ in range(repeat):
+            start = time.perf_counter()
+            render_template('pages/show_venue_tiles.html', shows=shows, venue_id=1, when='upcoming')
+            timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tiles', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app()
+    filters = app.jinja_env.filters
+    try:
+        filters['datetime'] = original_format_datetime
+        before = time_render(app, tiles(args.tiles, as_string=True), args.repeat)
+    finally:
+        filters['datetime'] = format_datetime
+    after = time_render(app, tiles(args.tiles, as_string=False), args.repeat)
+
+    print(f'{args.tiles} tiles, median of {args.repeat} renders')
+    print(f'  original filter  {before * 1000:9.1f} ms')
+    print(f'  current filter   {after * 1000:9.1f} ms  ({before / after:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
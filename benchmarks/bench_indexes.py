@@ -0,0 +1,127 @@
+"""
+Shows the query plans and timings of the hot venue/artist/show queries on a
+seeded catalog, first without and then with the indexes added in migration
+2baa00815680.
+
+Usage:
+    python -m benchmarks.bench_indexes --database-url postgresql://.../fyyur_bench
+    python -m benchmarks.bench_indexes --database-url sqlite:///bench.db --shows 200000
+
+The target database is wiped and recreated, so never point this at real data.
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, func, select, text
+
+from benchmarks.seed import seed
+from config import db
+from models import Venue, Artist, Show
+
+
+INDEXES = [index for table in (Venue.__table__, Artist.__table__, Show.__table__)
+           for index in table.indexes]
+
+
+def queries(now):
+    """The statements behind show_venue, show_artist, venues, shows and search."""
+    return {
+        'venue upcoming shows': (
+            select(Show.id, Show.start_time)
+            .where(Show.venue_id == 42, Show.start_time > now)
+            .order_by(Show.start_time)
+        ),
+        'artist upcoming shows': (
+            select(Show.id, Show.start_time)
+            .where(Show.artist_id == 42, Show.start_time > now)
+            .order_by(Show.start_time)
+        ),
+        'venues page': (
+            select(Venue.state, Venue.city, Venue.id, Venue.name, func.count(Show.id))
+            .outerjoin(Show, (Show.venue_id == Venue.id) & (Show.start_time > now))
+            .group_by(Venue.state, Venue.city, Venue.id)
+            .order_by(Venue.state, Venue.city, Venue.id)
+            .limit(20)
+        ),
+        'shows page': (
+            select(Show.id, Show.start_time)
+            .where(Show.start_time > now)
+            .order_by(Show.start_time, Show.id)
+            .limit(20)
+        ),
+        'venue name search': select(Venue.id).where(Venue.name.ilike('%velvet moon%')),
+        'artist name search': select(Artist.id).where(Artist.name.ilike('%velvet moon%')),
+    }
+
+
+def _run(connection, stmt, prefix=''):
+    compiled = stmt.compile(dialect=connection.dialect)
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    return connection.exec_driver_sql(prefix + str(compiled), params).fetchall()
+
+
+def explain(connection, stmt):
+    if connection.dialect.name == 'postgresql':
+        rows = _run(connection, stmt, 'EXPLAIN ')
+        return '\n'.join(row[0] for row in rows)
+    rows = _run(connection, stmt, 'EXPLAIN QUERY PLAN ')
+    return '\n'.join(row[-1] for row in rows)
+
+
+def timed(connection, stmt, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _run(connection, stmt)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def report(connection, label, repeat):
+    connection.execute(text('ANALYZE'))
+    print(f'\n=== {label} ===')
+    results = {}
+    for name, stmt in queries(datetime.now()).items():
+        results[name] = timed(connection, stmt, repeat)
+        print(f'\n-- {name}: {results[name]:.2f} ms (median of {repeat})')
+        print(explain(connection, stmt))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--venues', type=int, default=5000)
+    parser.add_argument('--artists', type=int, default=10000)
+    parser.add_argument('--shows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    with engine.begin() as connection:
+        db.metadata.drop_all(connection)
+        db.metadata.create_all(connection)
+        for index in INDEXES:
+            index.drop(connection)
+        seed(connection, args.venues, args.artists, args.shows)
+
+    with engine.begin() as connection:
+        before = report(connection, 'without indexes', args.repeat)
+        if connection.dialect.name == 'postgresql':
+            connection.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        for index in INDEXES:
+            index.create(connection)
+        after = report(connection, 'with indexes', args.repeat)
+
+    print('\n=== summary (median ms) ===')
+    for name in before:
+        print(f'{name:24} {before[name]:10.2f} -> {after[name]:10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,381 @@
+"""
+Load-tests every route in app.py and reports p50/p95/p99 latency,
+throughput and SQL statements per request for each one.
+
+Routes are driven either through the Flask test client (in-process, no
+network) or a real WSGI server: --server starts werkzeug's threaded server
+in this process, --url targets one already running (SQL counts are then
+unavailable). Ids and search terms are drawn with the same skew as the
+seeded catalog, so the response cache sees a realistic hit rate; pass
+--no-cache to measure the views alone.
+
+Results are saved as JSON for comparing runs.
+
+Usage:
+    python -m benchmarks.bench_routes --database-url postgresql://.../fyyur_bench --seed-scale medium
+    python -m benchmarks.bench_routes --database-url sqlite:///bench.db --server --concurrency 8 \\
+        --output results/after.json
+    python -m benchmarks.bench_routes --compare results/before.json results/after.json
+
+--seed-scale wipes and reseeds the target database, so never point it at real data.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta
+
+
+# Endpoints that change data; only driven with --writes.
+WRITES = {
+    'main.create_venue_submission', 'main.create_artist_submission', 'main.create_show_submission',
+    'main.edit_venue_submission', 'main.edit_artist_submission', 'main.delete_venue',
+}
+SKIPPED = {'static'}
+
+
+class Catalog:
+    """What the request factories draw ids and search terms from."""
+
+    def __init__(self, rng, venues, artists, skew, words, genres):
+        self.rng = rng
+        self.words = words
+        self.genres = genres
+        self.venues = venues
+        self.artists = artists
+        self.venue_weights = self._weights(venues, skew)
+        self.artist_weights = self._weights(artists, skew)
+        self.created_venues = []
+
+    @staticmethod
+    def _weights(n, skew):
+        total, weights = 0.0, []
+        for rank in range(1, n + 1):
+            total += 1 / rank ** skew
+            weights.append(total)
+        return weights
+
+    def venue_id(self):
+        return self.rng.choices(range(1, self.venues + 1), cum_weights=self.venue_weights)[0]
+
+    def artist_id(self):
+        return self.rng.choices(range(1, self.artists + 1), cum_weights=self.artist_weights)[0]
+
+    def word(self):
+        return self.rng.choice(self.words).lower()[:self.rng.randint(2, 5)]
+
+
+def venue_form(catalog):
+    return {'name': f'Bench {catalog.word()}', 'city': 'San Francisco', 'state': 'CA',
+            'address': '1 Bench St', 'phone': '5550100', 'facebook_link': 'https://facebook.com/bench',
+            'image_link': '', 'website_link': '', 'seeking_description': ''}
+
+
+def artist_form(catalog):
+    return {'name': f'Bench {catalog.word()}', 'city': 'San Francisco', 'state': 'CA',
+            'phone': '5550100', 'genres': catalog.rng.sample(catalog.genres, 2),
+            'facebook_link': 'https://facebook.com/bench', 'image_link': '',
+            'website_link': '', 'seeking_description': ''}
+
+
+# endpoint -> catalog -> (method, path, form data)
+REQUESTS = {
+    'main.index': lambda c: ('GET', '/', None),
+    'main.venues': lambda c: ('GET', '/venues', None),
+    'main.search_venues': lambda c: ('POST', '/venues/search', {'search_term': c.word()}),
+    'main.show_venue': lambda c: ('GET', f'/venues/{c.venue_id()}', None),
+    'main.more_venue_shows': lambda c: ('GET', f'/venues/{c.venue_id()}/shows?when=past', None),
+    'main.create_venue_form': lambda c: ('GET', '/venues/create', None),
+    'main.edit_venue': lambda c: ('GET', f'/venues/{c.venue_id()}/edit', None),
+    'main.artists': lambda c: ('GET', '/artists', None),
+    'main.search_artists': lambda c: ('POST', '/artists/search', {'search_term': c.word()}),
+    'main.show_artist': lambda c: ('GET', f'/artists/{c.artist_id()}', None),
+    'main.more_artist_shows': lambda c: ('GET', f'/artists/{c.artist_id()}/shows?when=past', None),
+    'main.create_artist_form': lambda c: ('GET', '/artists/create', None),
+    'main.edit_artist': lambda c: ('GET', f'/artists/{c.artist_id()}/edit', None),
+    'main.shows': lambda c: ('GET', '/shows', None),
+    'main.create_shows': lambda c: ('GET', '/shows/create', None),
+    'main.metrics_endpoint': lambda c: ('GET', '/metrics', None),
+    # The seed sets no image links, so this is the lookup and a 404.
+    'main.thumbnail': lambda c: ('GET', f'/img/artist/{c.artist_id()}/tile', None),
+    'main.typeahead_names': lambda c: ('GET', f'/typeahead?kind=artists&q={c.word()}', None),
+    'api.venues': lambda c: ('GET', '/api/v1/venues', None),
+    'api.venue': lambda c: ('GET', f'/api/v1/venues/{c.venue_id()}', None),
+    'api.venue_show_page': lambda c: ('GET', f'/api/v1/venues/{c.venue_id()}/shows?when=past', None),
+    'api.artists': lambda c: ('GET', '/api/v1/artists', None),
+    'api.artist': lambda c: ('GET', f'/api/v1/artists/{c.artist_id()}', None),
+    'api.artist_show_page': lambda c: ('GET', f'/api/v1/artists/{c.artist_id()}/shows?when=past', None),
+    'api.shows': lambda c: ('GET', '/api/v1/shows', None),
+    # An unknown ticket: the queue check plus the ShowTicket lookup.
+    'api.show_ticket': lambda c: ('GET', '/api/v1/show-tickets/0', None),
+
+    'main.create_venue_submission': lambda c: ('POST', '/venues/create', venue_form(c)),
+    'main.edit_venue_submission': lambda c: ('POST', f'/venues/{c.venue_id()}/edit', venue_form(c)),
+    'main.create_artist_submission': lambda c: ('POST', '/artists/create', artist_form(c)),
+    'main.edit_artist_submission': lambda c: ('POST', f'/artists/{c.artist_id()}/edit', artist_form(c)),
+    'main.create_show_submission': lambda c: ('POST', '/shows/create', {
+        'venue_id': c.venue_id(), 'artist_id': c.artist_id(),
+        # An hour one to two years out, so few are refused as double-bookings.
+        'start_time': (datetime.now().replace(minute=0, second=0, microsecond=0)
+                       + timedelta(hours=c.rng.randint(365 * 24, 2 * 365 * 24))).strftime('%Y-%m-%d %H:%M:%S'),
+    }),
+    # Deletes venues created by create_venue_submission earlier in the run.
+    'main.delete_venue': lambda c: ('DELETE', f'/venues/{c.created_venues.pop() if c.created_venues else 0}', None),
+}
+
+
+# ----------------------------------------------------------------------------#
+# Clients.
+# ----------------------------------------------------------------------------#
+
+class TestClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def __call__(self, method, path, data):
+        try:
+            response = self.client.open(path, method=method, data=data)
+        except Exception:
+            # DEBUG propagates view errors to the test client.
+            return 500
+        response.close()
+        return response.status_code
+
+
+class HTTPClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def __call__(self, method, path, data):
+        body = urllib.parse.urlencode(data, doseq=True).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+def start_server(app):
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+# ----------------------------------------------------------------------------#
+# Measurement.
+# ----------------------------------------------------------------------------#
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.count = 0
+        self._lock = threading.Lock()
+        from sqlalchemy import event
+        event.listen(engine, 'before_cursor_execute', self._executed)
+
+    def _executed(self, *args):
+        with self._lock:
+            self.count += 1
+
+
+def percentile(samples, p):
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[p - 1]
+
+
+def run_endpoint(make_client, factory, catalog, requests, concurrency, statements):
+    """Sends ``requests`` requests from ``concurrency`` threads; returns the route's stats."""
+    calls = [factory(catalog) for _ in range(requests)]
+    latencies, statuses = [], []
+    lock = threading.Lock()
+
+    def worker(chunk):
+        client = make_client()
+        for method, path, data in chunk:
+            start = time.perf_counter()
+            status = client(method, path, data)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses.append(status)
+
+    before = statements.count if statements else None
+    threads = [threading.Thread(target=worker, args=(calls[i::concurrency],)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies_ms = [latency * 1000 for latency in latencies]
+    return {
+        'method': calls[0][0],
+        'example': calls[0][1],
+        'requests': len(latencies),
+        'errors': sum(1 for status in statuses if status >= 500),
+        'statuses': {str(status): statuses.count(status) for status in sorted(set(statuses))},
+        'p50_ms': round(percentile(latencies_ms, 50), 3),
+        'p95_ms': round(percentile(latencies_ms, 95), 3),
+        'p99_ms': round(percentile(latencies_ms, 99), 3),
+        'mean_ms': round(statistics.fmean(latencies_ms), 3),
+        'throughput_rps': round(len(latencies) / wall, 1),
+        'sql_per_request': round((statements.count - before) / len(latencies), 2) if statements else None,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    print(f"{'endpoint':32} {'reqs':>6} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'req/s':>8} {'sql/req':>8}")
+    for endpoint, stats in results['routes'].items():
+        sql = '-' if stats['sql_per_request'] is None else f"{stats['sql_per_request']:.1f}"
+        print(f"{endpoint:32} {stats['requests']:6} {stats['errors']:4} {stats['p50_ms']:9.2f} "
+              f"{stats['p95_ms']:9.2f} {stats['p99_ms']:9.2f} {stats['throughput_rps']:8.1f} {sql:>8}")
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{'endpoint':32} {'p50 ms':>19} {'p95 ms':>19} {'req/s':>17} {'sql/req':>13}")
+    for endpoint, new in after['routes'].items():
+        # Runs from before the views moved to the main blueprint lack its prefix.
+        old = before['routes'].get(endpoint) or before['routes'].get(endpoint.removeprefix('main.'))
+        if old is None:
+            continue
+
+        def cell(key, width, fmt='.1f'):
+            a, b = old[key], new[key]
+            if a is None or b is None:
+                return '-'.rjust(width)
+            return f'{a:{fmt}} -> {b:{fmt}}'.rjust(width)
+
+        print(f"{endpoint:32} {cell('p50_ms', 19)} {cell('p95_ms', 19)} "
+              f"{cell('throughput_rps', 17, '.0f')} {cell('sql_per_request', 13)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Database the app runs against (sets DATABASE_URL).')
+    parser.add_argument('--seed-scale', help='Wipe and reseed the database at this scale first.')
+    parser.add_argument('--skew', type=float, default=1.0)
+    parser.add_argument('--server', action='store_true', help='Serve the app over HTTP in this process.')
+    parser.add_argument('--url', help='Benchmark an already running server instead.')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per route.')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--writes', action='store_true', help='Also drive the routes that change data.')
+    parser.add_argument('--no-cache', action='store_true', help='Disable the response cache.')
+    parser.add_argument('--only', nargs='+', metavar='ENDPOINT', help='Only these endpoints.')
+    parser.add_argument('--output', help='Save the results as JSON here.')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='Compare two saved runs.')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+
+    # The app reads DATABASE_URL when it's imported, and so does everything
+    # that imports the models.
+    from app import create_app
+    from config import db
+    from models import Venue, Artist
+    from benchmarks.seed import GENRES, SCALES, WORDS, scale_counts, seed
+
+    if args.seed_scale and args.seed_scale not in SCALES:
+        parser.error(f"--seed-scale must be one of {', '.join(SCALES)}")
+
+    app = create_app(**({'CACHE_BACKEND': 'null'} if args.no_cache else {}))
+
+    with app.app_context():
+        if args.seed_scale:
+            with db.engine.begin() as connection:
+                db.metadata.drop_all(connection)
+                db.metadata.create_all(connection)
+                seed(connection, *scale_counts(args.seed_scale), skew=args.skew)
+        venues = db.session.query(db.func.max(Venue.id)).scalar() or 1
+        artists = db.session.query(db.func.max(Artist.id)).scalar() or 1
+        statements = StatementCounter(db.engine) if not args.url else None
+
+    endpoints = [rule.endpoint for rule in app.url_map.iter_rules() if rule.endpoint not in SKIPPED]
+    missing = sorted(set(endpoints) - set(REQUESTS))
+    if missing:
+        parser.error(f"no request factory for {', '.join(missing)}; add one to REQUESTS")
+    endpoints = [endpoint for endpoint in REQUESTS if endpoint in endpoints]
+    if not args.writes:
+        endpoints = [endpoint for endpoint in endpoints if endpoint not in WRITES]
+    if args.only:
+        endpoints = [endpoint for endpoint in endpoints if endpoint in args.only]
+
+    server = None
+    if args.url:
+        mode, make_client = 'http', lambda: HTTPClient(args.url)
+    elif args.server:
+        server, url = start_server(app)
+        mode, make_client = 'wsgi-server', lambda: HTTPClient(url)
+    else:
+        mode, make_client = 'test-client', lambda: TestClient(app)
+
+    catalog = Catalog(random.Random(0), venues, artists, args.skew, WORDS, GENRES)
+    results = {
+        'meta': {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'mode': mode,
+            'database': app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0],
+            'seed_scale': args.seed_scale,
+            'venues': venues,
+            'artists': artists,
+            'skew': args.skew,
+            'requests_per_route': args.requests,
+            'concurrency': args.concurrency,
+            'cache': app.config['CACHE_BACKEND'],
+            'python': platform.python_version(),
+        },
+        'routes': {},
+    }
+    try:
+        for endpoint in endpoints:
+            results['routes'][endpoint] = run_endpoint(
+                make_client, REQUESTS[endpoint], catalog, args.requests, args.concurrency, statements)
+            if endpoint == 'main.create_venue_submission':
+                with app.app_context():
+                    catalog.created_venues = list(db.session.scalars(
+                        db.select(Venue.id).where(Venue.id > venues).order_by(Venue.id)))
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    print_results(results)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'\nSaved to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
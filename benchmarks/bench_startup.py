@@ -0,0 +1,129 @@
+"""
+Measures how long a worker takes from starting to answering its first
+requests, the way a preforking server starts it:
+
+    cold       a fresh interpreter imports wsgi-like code, builds the app
+               and serves; what every worker does without preloading
+    cached     cold, but loading templates from a TEMPLATE_CACHE_DIR that
+               `flask templates compile` (here: an earlier run) filled
+    forked     a worker forked from a master that already built the app,
+               without preload(): it still compiles templates on first use
+    preloaded  forked from a master that also ran preload(), as wsgi.py does
+
+Each is timed from process start (or fork) to the last of PATHS answered,
+and PATHS are served through the test client, so no network is involved.
+Only "cached" uses a template cache; the others compile in memory.
+
+Usage:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --database-url sqlite:///bench.db --runs 20 \\
+        --path /shows
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# Pages that render templates without touching the database.
+PATHS = ['/', '/venues/create', '/artists/create']
+
+COLD = '''
+import json, sys, time
+started = time.perf_counter()
+import config
+from app import create_app
+imported = time.perf_counter()
+app = create_app(config.Production, TEMPLATE_CACHE_DIR=sys.argv[1] or None)
+built = time.perf_counter()
+client = app.test_client()
+for path in sys.argv[2:]:
+    assert client.get(path).status_code == 200, path
+done = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'create_app_ms': (built - imported) * 1000,
+                  'requests_ms': (done - built) * 1000}))
+'''
+
+
+def cold(paths, runs, template_cache=''):
+    """Milliseconds from spawning an interpreter to it answering ``paths``, per run."""
+    totals, parts = [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        out = subprocess.run([sys.executable, '-c', COLD, template_cache, *paths], check=True,
+                             capture_output=True, text=True).stdout
+        totals.append((time.perf_counter() - started) * 1000)
+        parts.append(json.loads(out.splitlines()[-1]))
+    return totals, parts
+
+
+def forked(app, paths, runs):
+    """Milliseconds from forking ``app``'s process to the child answering ``paths``, per run."""
+    totals = []
+    for _ in range(runs):
+        read, write = os.pipe()
+        started = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read)
+            status = 0
+            try:
+                client = app.test_client()
+                for path in paths:
+                    assert client.get(path).status_code == 200, path
+                os.write(write, str((time.perf_counter() - started) * 1000).encode())
+            except BaseException:
+                status = 1
+            finally:
+                os._exit(status)
+        os.close(write)
+        with os.fdopen(read) as f:
+            result = f.read()
+        os.waitpid(pid, 0)
+        if not result:
+            raise RuntimeError('forked worker failed')
+        totals.append(float(result))
+    return totals
+
+
+def summary(samples):
+    return f'p50 {statistics.median(samples):8.1f} ms   max {max(samples):8.1f} ms'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default='sqlite://',
+                        help='Database the app is built against (sets DATABASE_URL).')
+    parser.add_argument('--runs', type=int, default=10, help='Workers started per mode.')
+    parser.add_argument('--path', action='append', default=[], help='Also request this path.')
+    args = parser.parse_args()
+    if not hasattr(os, 'fork'):
+        parser.error('needs os.fork')
+
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('SECRET_KEY', 'bench-startup')
+    paths = PATHS + args.path
+
+    with tempfile.TemporaryDirectory() as template_cache:
+        cold(paths, 1, template_cache)
+        for mode, cache_dir in (('cold', ''), ('cached', template_cache)):
+            totals, parts = cold(paths, args.runs, cache_dir)
+            print(f'{mode:10} {summary(totals)}')
+            for key in ('import_ms', 'create_app_ms', 'requests_ms'):
+                print(f'  {key:14} p50 {statistics.median(part[key] for part in parts):8.1f} ms')
+
+    import config
+    from app import create_app, preload
+
+    app = create_app(config.Production, TEMPLATE_CACHE_DIR=None)
+    print(f'forked     {summary(forked(app, paths, args.runs))}')
+    preload(app)
+    print(f'preloaded  {summary(forked(app, paths, args.runs))}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Builds the typeahead index of typeahead.py over a catalog of --names venue
+names and reports its build time, memory (estimated by the index, and as
+measured by tracemalloc), and lookup latency for prefixes of 1 to 8
+characters and for the common words many names share, next to the database
+query lookups fall back to while the index builds or past TYPEAHEAD_MAX_BYTES.
+
+Usage:
+    python -m benchmarks.bench_typeahead
+    python -m benchmarks.bench_typeahead --database-url postgresql://.../fyyur_bench --names 1000000
+
+The target database is wiped and recreated, so never point it at real data.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+import tracemalloc
+
+from sqlalchemy import insert
+
+SYLLABLES = ['ka', 'ro', 'mi', 'zu', 'le', 'ta', 'vo', 'shi', 'an', 'del', 'mar', 'quin', 'bel', 'or',
+             'ix', 'ne', 'sa', 'tor', 'lu', 'gra', 'pe', 'dé', 'fu', 'ya']
+
+
+def names(rng, n):
+    """``n`` venue names of two to four words, common and made-up, some accented."""
+    from benchmarks.seed import WORDS
+    made_up = [''.join(rng.choices(SYLLABLES, k=rng.randint(2, 3))).title() for _ in range(50000)]
+    for _ in range(n):
+        words = [rng.choice(WORDS) if rng.random() < 0.4 else rng.choice(made_up)
+                 for _ in range(rng.randint(2, 4))]
+        yield ' '.join(words)
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return (statistics.median(samples) * 1000, samples[int(len(samples) * 0.99)] * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default='sqlite:///typeahead_bench.db')
+    parser.add_argument('--names', type=int, default=1000000)
+    parser.add_argument('--lookups', type=int, default=5000)
+    parser.add_argument('--db-lookups', type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url
+    from app import create_app
+    from benchmarks.seed import WORDS
+    from config import db
+    from models import Venue
+    import typeahead
+
+    app = create_app(CACHE_BACKEND='null')
+    rng = random.Random(0)
+    catalog = list(names(rng, args.names))
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        started = time.perf_counter()
+        with db.engine.begin() as connection:
+            for start in range(0, len(catalog), 10000):
+                connection.execute(insert(Venue), [
+                    {'name': name, 'city': 'Austin', 'state': 'TX', 'address': '1 Main St'}
+                    for name in catalog[start:start + 10000]
+                ])
+        print(f'seeded {args.names} names in {time.perf_counter() - started:.1f} s')
+
+        index = typeahead._indexes[Venue]
+        started = time.perf_counter()
+        typeahead.typeahead(Venue, 'a')
+        answered = time.perf_counter() - started
+        index.wait()
+        print(f'built in {time.perf_counter() - started:.1f} s in the background, '
+              f'the first lookup answered in {answered * 1000:.1f} ms')
+        # Again, under tracemalloc, which slows it down.
+        index.reset()
+        tracemalloc.start()
+        typeahead.typeahead(Venue, 'a')
+        index.wait()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'{index.nbytes / 2**20:.1f} MiB estimated by the index, {current / 2**20:.1f} MiB allocated, '
+              f'{peak / 2**20:.1f} MiB at peak while building')
+
+        prefixes = []
+        for _ in range(args.lookups):
+            words = rng.choice(catalog).split()
+            word = rng.randrange(len(words))
+            prefixes.append(' '.join(words[word:])[:rng.randint(1, 8)])
+
+        common = [rng.choice(WORDS).lower()[:rng.randint(2, 6)] for _ in range(args.lookups)]
+
+        print(f'{"":12}{"p50 ms":>10}{"p99 ms":>10}')
+        for label, terms in (('index', prefixes), ('common', common)):
+            samples = []
+            for prefix in terms:
+                started = time.perf_counter()
+                typeahead.typeahead(Venue, prefix)
+                samples.append(time.perf_counter() - started)
+            print(f'{label:12}' + ''.join(f'{v:10.3f}' for v in percentiles(samples)))
+
+        samples = []
+        for prefix in prefixes[:args.db_lookups]:
+            started = time.perf_counter()
+            typeahead._query_names(Venue, typeahead.fold(prefix), 10)
+            samples.append(time.perf_counter() - started)
+        print(f'{"database":12}' + ''.join(f'{v:10.3f}' for v in percentiles(samples)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""
+Synthetic catalog generator used by the benchmarks.
+
+Popularity is skewed the way real catalogs are: a few cities, venues,
+artists and genres get most of the shows (Zipf-distributed, exponent
+--skew; 0 is uniform). Shows cluster in the months around now and start
+on the hour in the evening, for an hour. Like the app, the seed never
+double-books a venue or artist: a show whose slot is taken is redrawn, so
+at high skew the busiest venues and artists fill up and the rest take
+more shows than Zipf alone would give them.
+
+Usage:
+    python -m benchmarks.seed --database-url postgresql://... --scale medium
+    python -m benchmarks.seed --database-url sqlite:///bench.db --shows 50000 --skew 0
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from sqlalchemy import create_engine, insert
+
+import bulk
+import counters
+from models import Venue, Artist, ArtistGenre, Show
+
+
+# (venues, artists, shows)
+SCALES = {
+    'tiny': (100, 200, 1_000),
+    'small': (1_000, 2_000, 10_000),
+    'medium': (10_000, 20_000, 100_000),
+    'large': (50_000, 100_000, 1_000_000),
+    'xlarge': (200_000, 400_000, 10_000_000),
+}
+
+SHOW_DURATION = timedelta(hours=1)
+# Slots drawn for a venue and artist before drawing another pair.
+SLOT_ATTEMPTS = 8
+
+WORDS = [
+    'Jazz', 'Blue', 'Note', 'Park', 'Hall', 'Club', 'Red', 'Rock', 'Soul',
+    'Lounge', 'Garden', 'House', 'Electric', 'Velvet', 'Golden', 'Street',
+    'Funk', 'Moon', 'River', 'Echo', 'Wild', 'Black', 'Silver', 'Harbor',
+]
+GENRES = [
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk',
+    'Funk', 'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre',
+    'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul', 'Other',
+]
+# Most to least popular.
+CITIES = [
+    ('San Francisco', 'CA'), ('Los Angeles', 'CA'), ('New York', 'NY'),
+    ('Brooklyn', 'NY'), ('Austin', 'TX'), ('Seattle', 'WA'),
+    ('Chicago', 'IL'), ('Nashville', 'TN'), ('New Orleans', 'LA'),
+    ('Portland', 'OR'),
+]
+
+
+def _name(rng):
+    return ' '.join(rng.sample(WORDS, rng.randint(2, 3)))
+
+
+def _zipf(n, skew):
+    """Cumulative weights for ranks 1..n with P(rank) proportional to rank**-skew."""
+    return list(accumulate(1 / rank ** skew for rank in range(1, n + 1)))
+
+
+def _insert_batches(connection, table, rows, batch_size):
+    columns = None
+    batch = []
+
+    def flush():
+        if connection.dialect.name == 'postgresql':
+            bulk.copy_rows(connection, table.name, columns, batch)
+        else:
+            connection.execute(insert(table), batch)
+
+    for row in rows:
+        columns = columns or list(row)
+        batch.append(row)
+        if len(batch) >= batch_size:
+            flush()
+            batch = []
+    if batch:
+        flush()
+
+
+def seed(connection, venues=1000, artists=2000, shows=20000, seed=0, batch_size=5000, skew=1.0):
+    """
+    Inserts ``venues`` venues, ``artists`` artists and ``shows`` shows spread
+    over two years either side of now, with Zipf(``skew``) popularity. Ids
+    start at 1 in every table.
+    """
+    rng = random.Random(seed)
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    city_weights = _zipf(len(CITIES), skew)
+    genre_weights = _zipf(len(GENRES), skew)
+
+    def popularity(n):
+        # Popular ids are scattered rather than all low.
+        ids = list(range(1, n + 1))
+        rng.shuffle(ids)
+        return ids, _zipf(n, skew)
+
+    def venue_rows():
+        for i in range(1, venues + 1):
+            city, state = rng.choices(CITIES, cum_weights=city_weights)[0]
+            yield {'id': i, 'name': _name(rng), 'city': city, 'state': state,
+                   'address': f'{rng.randint(1, 999)} {rng.choice(WORDS)} St'}
+
+    def artist_rows():
+        for i in range(1, artists + 1):
+            city, state = rng.choices(CITIES, cum_weights=city_weights)[0]
+            yield {'id': i, 'name': _name(rng), 'city': city, 'state': state}
+
+    def genre_rows():
+        for i in range(1, artists + 1):
+            genres = set(rng.choices(GENRES, cum_weights=genre_weights, k=rng.randint(1, 3)))
+            for genre in sorted(genres):
+                yield {'artist_id': i, 'genre': genre}
+
+    def slot():
+        # Hours from now's midnight: a day within two years and an evening hour.
+        if rng.random() < 0.7:
+            days = max(-730.0, min(730.0, rng.gauss(0, 60)))
+        else:
+            days = rng.uniform(-730, 730)
+        return int(days) * 24 + rng.choice((18, 19, 20, 20, 21, 21, 22, 23))
+
+    def show_rows():
+        venue_ids, venue_weights = popularity(venues)
+        artist_ids, artist_weights = popularity(artists)
+        midnight = now.replace(hour=0)
+        # Booked (owner id, slot) pairs, packed into one int each.
+        slots = 2 * 731 * 24
+        venue_booked, artist_booked = set(), set()
+        i = 0
+        while i < shows:
+            k = min(batch_size, shows - i)
+            for venue_id, artist_id in zip(rng.choices(venue_ids, cum_weights=venue_weights, k=k),
+                                           rng.choices(artist_ids, cum_weights=artist_weights, k=k)):
+                attempts = 0
+                while True:
+                    hour = slot()
+                    venue_key = venue_id * slots + hour
+                    artist_key = artist_id * slots + hour
+                    if venue_key not in venue_booked and artist_key not in artist_booked:
+                        break
+                    attempts += 1
+                    if attempts % SLOT_ATTEMPTS == 0:
+                        # Booked up around the popular dates: try another pair.
+                        venue_id = rng.choices(venue_ids, cum_weights=venue_weights)[0]
+                        artist_id = rng.choices(artist_ids, cum_weights=artist_weights)[0]
+                venue_booked.add(venue_key)
+                artist_booked.add(artist_key)
+                i += 1
+                start_time = midnight + timedelta(hours=hour)
+                yield {'id': i, 'venue_id': venue_id, 'artist_id': artist_id,
+                       'start_time': start_time, 'end_time': start_time + SHOW_DURATION}
+
+    _insert_batches(connection, Venue.__table__, venue_rows(), batch_size)
+    _insert_batches(connection, Artist.__table__, artist_rows(), batch_size)
+    _insert_batches(connection, ArtistGenre.__table__, genre_rows(), batch_size)
+    _insert_batches(connection, Show.__table__, show_rows(), batch_size)
+    counters.rebuild(connection)
+
+
+def scale_counts(scale, venues=None, artists=None, shows=None):
+    """The (venues, artists, shows) of ``scale``, with any explicit counts taking precedence."""
+    defaults = SCALES[scale]
+    return tuple(count if count is not None else default
+                 for count, default in zip((venues, artists, shows), defaults))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--venues', type=int, default=None)
+    parser.add_argument('--artists', type=int, default=None)
+    parser.add_argument('--shows', type=int, default=None)
+    parser.add_argument('--skew', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    venues, artists, shows = scale_counts(args.scale, args.venues, args.artists, args.shows)
+    engine = create_engine(args.database_url)
+    with engine.begin() as connection:
+        seed(connection, venues, artists, shows, args.seed, args.batch_size, args.skew)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+from bisect import bisect_right
+
+from sqlalchemy import exc, select
+
+from models import Show, DEFAULT_SHOW_DURATION, MAX_SHOW_DURATION
+
+
+# ----------------------------------------------------------------------------#
+# Double-booking checks.
+#
+# A show occupies [start_time, end_time) of its venue and of its artist, and
+# neither may be booked twice at once. On PostgreSQL two exclusion
+# constraints over tsrange(start_time, end_time) enforce this, concurrent
+# writers included. Elsewhere it rests on the checks below, which also give
+# PostgreSQL users a readable error before the constraint fires.
+#
+# Shows last at most MAX_SHOW_DURATION, so a show overlapping [start, end)
+# starts within (start - MAX_SHOW_DURATION, end): a bounded range of the
+# (venue_id, start_time) and (artist_id, start_time) indexes, whatever the
+# size of the table. Bulk writers check a whole batch at once against a
+# Bookings index holding the shows near it instead of querying per row.
+# ----------------------------------------------------------------------------#
+
+OWNERS = (('venue_id', 'venue'), ('artist_id', 'artist'))
+
+# SQLSTATE exclusion_violation.
+EXCLUSION_VIOLATION = '23P01'
+
+
+class ShowConflict(ValueError):
+    """The show's venue or artist is already booked for part of its time."""
+
+    def __init__(self, key):
+        self.key = key
+        super().__init__(f'The {dict(OWNERS)[key]} already has a show at that time.')
+
+
+def end_time_for(start_time, end_time=None):
+    """``end_time``, or the default for a show starting at ``start_time``. Raises ValueError if out of range."""
+    if end_time is None:
+        return start_time + DEFAULT_SHOW_DURATION
+    if not start_time < end_time <= start_time + MAX_SHOW_DURATION:
+        raise ValueError('A show must end after it starts, and within '
+                         f'{MAX_SHOW_DURATION.total_seconds() / 3600:g} hours.')
+    return end_time
+
+
+def _overlapping(key, owner_id, start_time, end_time):
+    owner = getattr(Show, key)
+    return (
+        select(Show.id)
+        .where(owner == owner_id,
+               Show.start_time > start_time - MAX_SHOW_DURATION,
+               Show.start_time < end_time,
+               Show.end_time > start_time)
+        .limit(1)
+    )
+
+
+def check(connection, venue_id, artist_id, start_time, end_time):
+    """Raises ShowConflict if the venue or the artist is busy during [start_time, end_time)."""
+    for key, owner_id in (('venue_id', venue_id), ('artist_id', artist_id)):
+        if connection.execute(_overlapping(key, owner_id, start_time, end_time)).first():
+            raise ShowConflict(key)
+
+
+def as_conflict(error):
+    """The ShowConflict behind a failed write, or None if it failed for another reason."""
+    if isinstance(error, ShowConflict):
+        return error
+    if isinstance(error, exc.IntegrityError):
+        code = getattr(error.orig, 'pgcode', None) or getattr(error.orig, 'sqlstate', None)
+        if code == EXCLUSION_VIOLATION:
+            constraint = str(error.orig)
+            return ShowConflict('artist_id' if 'artist' in constraint else 'venue_id')
+    return None
+
+
+class IntervalIndex:
+    """
+    Disjoint half-open intervals sorted by start. Since none overlap, their
+    ends are sorted too, and an overlap check is a bisection. They are kept
+    in blocks of at most 2 * LOAD, found by bisecting the blocks' first
+    starts, so an insert moves at most a block's worth of items rather than
+    everything after it: an owner can have any number of shows in a batch's
+    range (an import chunk may span years of a venue's calendar).
+    """
+
+    LOAD = 500
+
+    def __init__(self):
+        self._firsts = []  # each block's first start
+        self._starts = []
+        self._ends = []
+        self._len = 0
+
+    def _locate(self, start):
+        """The block ``start`` falls in, and its position there."""
+        b = max(bisect_right(self._firsts, start) - 1, 0)
+        return b, bisect_right(self._starts[b], start)
+
+    def overlaps(self, start, end):
+        if start >= end or not self._len:
+            return False
+        b, i = self._locate(start)
+        starts, ends = self._starts[b], self._ends[b]
+        # Only the block holding the interval before start and the one after it
+        # can overlap; i == 0 means no interval starts at or before start.
+        if i > 0 and ends[i - 1] > start:
+            return True
+        if i < len(starts):
+            return starts[i] < end
+        return b + 1 < len(self._firsts) and self._firsts[b + 1] < end
+
+    def add(self, start, end):
+        if start >= end:
+            return
+        self._len += 1
+        if not self._firsts:
+            self._firsts.append(start)
+            self._starts.append([start])
+            self._ends.append([end])
+            return
+        b, i = self._locate(start)
+        starts, ends = self._starts[b], self._ends[b]
+        starts.insert(i, start)
+        ends.insert(i, end)
+        if i == 0:
+            self._firsts[b] = start
+        if len(starts) > 2 * self.LOAD:
+            self._firsts.insert(b + 1, starts[self.LOAD])
+            self._starts[b:b + 1] = starts[:self.LOAD], starts[self.LOAD:]
+            self._ends[b:b + 1] = ends[:self.LOAD], ends[self.LOAD:]
+
+    def __len__(self):
+        return self._len
+
+
+class Bookings:
+    """
+    The venue and artist bookings around a batch of show rows (mappings
+    with venue_id, artist_id, start_time and end_time), loaded in one query
+    per owner kind, to check the batch's rows against them and each other.
+    """
+
+    def __init__(self, connection, rows):
+        self._indexes = {}
+        if not rows:
+            return
+        since = min(row['start_time'] for row in rows) - MAX_SHOW_DURATION
+        until = max(row['end_time'] for row in rows)
+        for key, _ in OWNERS:
+            owner = getattr(Show, key)
+            indexes = self._indexes[key] = {row[key]: IntervalIndex() for row in rows}
+            for owner_id, start_time, end_time in connection.execute(
+                select(owner, Show.start_time, Show.end_time)
+                .where(owner.in_(indexes), Show.start_time > since, Show.start_time < until)
+            ):
+                indexes[owner_id].add(start_time, end_time)
+
+    def conflict(self, row):
+        """The key ('venue_id' or 'artist_id') ``row`` is double-booked on, else None."""
+        for key, _ in OWNERS:
+            if self._indexes[key][row[key]].overlaps(row['start_time'], row['end_time']):
+                return key
+        return None
+
+    def add(self, row):
+        for key, _ in OWNERS:
+            self._indexes[key][row[key]].add(row['start_time'], row['end_time'])
+
+    def book(self, rows):
+        """Splits ``rows`` into those that fit, added in order, and ``(row, ShowConflict)`` for the rest."""
+        kept, conflicts = [], []
+        for row in rows:
+            key = self.conflict(row)
+            if key is None:
+                self.add(row)
+                kept.append(row)
+            else:
+                conflicts.append((row, ShowConflict(key)))
+        return kept, conflicts
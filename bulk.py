@@ -0,0 +1,407 @@
+import csv
+import io
+import json
+import os
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import func, insert, select, update
+from werkzeug.datastructures import MultiDict
+
+from config import cache
+from models import Venue, Artist, ArtistGenre, Show, ImportCheckpoint
+import booking
+import counters
+import search
+import typeahead
+
+
+# ----------------------------------------------------------------------------#
+# Bulk import and export of venues, artists and shows as CSV or JSONL.
+#
+# Imports validate every record with the same form the web handlers use,
+# then write it in chunks, one transaction per chunk: COPY on PostgreSQL,
+# executemany elsewhere. Each chunk's transaction also records how many
+# records of the file are done in import_checkpoint, so re-running an
+# interrupted import picks up after the last committed chunk.
+# ----------------------------------------------------------------------------#
+
+# ``form`` names the class in forms.py, imported when a Validator needs it.
+# ``optional`` are fields the form requires that a record may leave empty,
+# as the database does: rows not entered through the form (e.g. seeded) lack
+# them, and an export of those must import again.
+Kind = namedtuple('Kind', 'model form fields optional')
+
+KINDS = {
+    'venues': Kind(Venue, 'VenueForm', (
+        'name', 'city', 'state', 'address', 'phone', 'image_link',
+        'facebook_link', 'website_link', 'seeking_talent', 'seeking_description',
+    ), ('facebook_link',)),
+    'artists': Kind(Artist, 'ArtistForm', (
+        'name', 'city', 'state', 'phone', 'image_link', 'genres',
+        'facebook_link', 'website_link', 'seeking_venue', 'seeking_description',
+    ), ('phone', 'facebook_link')),
+    'shows': Kind(Show, 'ShowForm', ('venue_id', 'artist_id', 'start_time', 'end_time'), ()),
+}
+
+FORMATS = ('csv', 'jsonl')
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'  # DateTimeField's default format
+GENRE_SEPARATOR = ';'
+FALSE_STRINGS = ('', '0', 'false', 'f', 'no', 'n', 'off')
+
+Progress = namedtuple('Progress', 'records imported rejected')
+
+
+class BulkError(Exception):
+    pass
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension == 'ndjson':
+        return 'jsonl'
+    if extension not in FORMATS:
+        raise BulkError(f"Can't tell the format of {path}; pass --format.")
+    return extension
+
+
+def read_records(path, format):
+    """Yields ``(number, record)`` for each record of ``path``, numbered from 1."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if format == 'csv':
+            yield from enumerate(csv.DictReader(f), 1)
+            return
+        number = 0
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                yield number, json.loads(line)
+            except ValueError as e:
+                raise BulkError(f'{path}, line {line_number}: {e}') from e
+
+
+# ----------------------------------------------------------------------------#
+# Validation.
+# ----------------------------------------------------------------------------#
+
+class Validator:
+    """
+    Checks records against ``kind``'s form, limited to the fields we store.
+    Fields in ``kind.optional`` are only checked when they have a value.
+    """
+
+    def __init__(self, kind):
+        import forms
+        from wtforms.validators import Optional
+        self.kind = kind
+        self.form = getattr(forms, kind.form)(formdata=None, meta={'csrf': False})
+        for name in [field.name for field in self.form if field.name not in kind.fields]:
+            del self.form[name]
+        for name in kind.optional:
+            # A new list: the form class shares the original with every form.
+            self.form[name].validators = [Optional(), *self.form[name].validators]
+
+    def formdata(self, record):
+        data = MultiDict()
+        for field in self.kind.fields:
+            value = record.get(field)
+            if value is None or value == '':
+                continue
+            if field == 'genres':
+                if isinstance(value, str):
+                    value = value.split(GENRE_SEPARATOR)
+                for genre in value:
+                    if str(genre).strip():
+                        data.add(field, str(genre).strip())
+            elif field.startswith('seeking_') and field != 'seeking_description':
+                # BooleanField only treats 'false' and '' as false.
+                if str(value).strip().lower() not in FALSE_STRINGS:
+                    data.add(field, 'y')
+            else:
+                data.add(field, str(value))
+        return data
+
+    def validate(self, record):
+        """Returns ``(row, None)`` for a valid record, else ``(None, message)``."""
+        self.form.process(self.formdata(record))
+        errors = {} if self.form.validate() else dict(self.form.errors)
+
+        row = {name: (value if value != '' else None) for name, value in self.form.data.items()}
+        row['id'] = record.get('id')
+        for name in [name for name in ('id', 'venue_id', 'artist_id') if name in row]:
+            if row[name] in (None, ''):
+                row[name] = None
+                if name != 'id':
+                    errors.setdefault(name, ['This field is required.'])
+                continue
+            try:
+                row[name] = int(row[name])
+            except (TypeError, ValueError):
+                errors.setdefault(name, ['Not a valid integer.'])
+
+        if errors:
+            return None, '; '.join(f'{name}: {message}'
+                                   for name, messages in errors.items() for message in messages)
+        return row, None
+
+
+def missing_owners(connection, rows):
+    """Venue and artist ids referenced by ``rows`` that don't exist."""
+    missing = {}
+    for model, key in counters.OWNERS:
+        wanted = {row[key] for row in rows}
+        found = set(connection.execute(select(model.id).where(model.id.in_(wanted))).scalars())
+        missing[key] = wanted - found
+    return missing
+
+
+def check_shows(connection, rows):
+    """
+    Splits show ``rows`` into those that can be written, with their default
+    end times filled in, and ``(row, message)`` for those naming a missing
+    venue or artist or double-booking one. Earlier rows win over later ones.
+    """
+    for row in rows:
+        row['end_time'] = booking.end_time_for(row['start_time'], row.get('end_time'))
+    missing = missing_owners(connection, rows) if rows else {}
+    kept, rejected = [], []
+    for row in rows:
+        gone = [key for key in ('venue_id', 'artist_id') if row[key] in missing[key]]
+        if gone:
+            rejected.append((row, '; '.join(f'{key}: No such record.' for key in gone)))
+        else:
+            kept.append(row)
+    kept, conflicts = booking.Bookings(connection, kept).book(kept)
+    rejected.extend((row, f'{conflict.key}: {conflict}') for row, conflict in conflicts)
+    return kept, rejected
+
+
+# ----------------------------------------------------------------------------#
+# Writing.
+# ----------------------------------------------------------------------------#
+
+def _copy_value(value):
+    if isinstance(value, datetime):
+        return value.strftime(DATETIME_FORMAT)
+    return value
+
+
+def copy_rows(connection, table, columns, rows):
+    """Loads ``rows`` into ``table`` with COPY FROM STDIN."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_copy_value(row[column]) for column in columns])
+
+    quote = connection.dialect.identifier_preparer.quote
+    sql = 'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+        quote(table), ', '.join(quote(column) for column in columns))
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'):
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)  # psycopg2
+        else:
+            with cursor.copy(sql) as copy:  # psycopg 3
+                copy.write(buffer.getvalue())
+    finally:
+        cursor.close()
+
+
+def _write_postgresql(connection, table, columns, rows):
+    sequence = func.pg_get_serial_sequence(table.name, 'id')
+    missing = [row for row in rows if row['id'] is None]
+    if missing:
+        ids = connection.execute(
+            select(func.nextval(sequence)).select_from(func.generate_series(1, len(missing)))
+        ).scalars()
+        for row, id in zip(missing, ids):
+            row['id'] = id
+    copy_rows(connection, table.name, columns, rows)
+    if len(missing) < len(rows):
+        # Keep the sequence ahead of the explicit ids just loaded.
+        connection.execute(select(func.setval(sequence, select(func.max(table.c.id)).scalar_subquery())))
+
+
+def _write_executemany(connection, table, columns, rows):
+    with_id = [row for row in rows if row['id'] is not None]
+    without_id = [row for row in rows if row['id'] is None]
+    if with_id:
+        connection.execute(insert(table), [{column: row[column] for column in columns} for row in with_id])
+    if without_id:
+        stmt = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+        ids = connection.execute(stmt, [{column: row[column] for column in columns if column != 'id'}
+                                        for row in without_id]).scalars()
+        for row, id in zip(without_id, ids):
+            row['id'] = id
+
+
+def write_rows(connection, kind, rows):
+    """Inserts validated ``rows`` of ``kind``, filling in their ids."""
+    table = kind.model.__table__
+    columns = ['id'] + [field for field in kind.fields if field in table.c] + ['updated_at']
+    now = datetime.now()
+    for row in rows:
+        row['updated_at'] = now
+    if connection.dialect.name == 'postgresql':
+        _write_postgresql(connection, table, columns, rows)
+    else:
+        _write_executemany(connection, table, columns, rows)
+
+    if kind.model is Artist:
+        genres = [{'artist_id': row['id'], 'genre': genre}
+                  for row in rows for genre in dict.fromkeys(row['genres'])]
+        if connection.dialect.name == 'postgresql':
+            copy_rows(connection, ArtistGenre.__tablename__, ['artist_id', 'genre'], genres)
+        elif genres:
+            connection.execute(insert(ArtistGenre.__table__), genres)
+    elif kind.model is Show:
+        counters.adjust(connection, rows, 1)
+
+
+def _records_done(connection, source):
+    stmt = select(ImportCheckpoint.records_done).where(ImportCheckpoint.source == source)
+    return connection.execute(stmt).scalar() or 0
+
+
+def _save_checkpoint(connection, source, records_done):
+    values = {'records_done': records_done, 'updated_at': datetime.now()}
+    result = connection.execute(
+        update(ImportCheckpoint).where(ImportCheckpoint.source == source).values(**values)
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(ImportCheckpoint).values(source=source, **values))
+
+
+def cache_tags(kind, rows):
+    """Tags of the cached pages that inserting ``rows`` of ``kind`` changes."""
+    if kind.model is Venue:
+        return ['venues']
+    if kind.model is Artist:
+        return ['artists']
+    tags = {'shows', 'venues', 'artists'}
+    for row in rows:
+        tags.add(f"venue:{row['venue_id']}")
+        tags.add(f"artist:{row['artist_id']}")
+    return sorted(tags)
+
+
+# ----------------------------------------------------------------------------#
+# Import and export.
+# ----------------------------------------------------------------------------#
+
+def import_file(engine, kind_name, path, format=None, chunk_size=5000, restart=False,
+                on_progress=None, on_reject=None):
+    """
+    Imports ``path`` into ``kind_name`` and returns the final Progress.
+    Resumes after the records a previous run committed unless ``restart``.
+    ``on_progress(progress)`` runs after every chunk and
+    ``on_reject(number, message)`` for every invalid record.
+    """
+    kind = KINDS[kind_name]
+    format = format or detect_format(path)
+    source = f'{kind_name}:{os.path.abspath(path)}'
+    validator = Validator(kind)
+
+    with engine.begin() as connection:
+        if restart:
+            _save_checkpoint(connection, source, 0)
+        done = _records_done(connection, source)
+    progress = Progress(done, 0, 0)
+
+    def flush(batch, last):
+        nonlocal progress
+        rejected = 0
+        with engine.begin() as connection:
+            rows = [row for _, row in batch]
+            if kind.model is Show and rows:
+                rows, refused = check_shows(connection, rows)
+                rejected = len(refused)
+                if on_reject:
+                    numbers = {id(row): number for number, row in batch}
+                    for number, message in sorted((numbers[id(row)], message) for row, message in refused):
+                        on_reject(number, message)
+            if rows:
+                write_rows(connection, kind, rows)
+            _save_checkpoint(connection, source, last)
+        if rows:
+            cache.invalidate(*cache_tags(kind, rows))
+        progress = Progress(last, progress.imported + len(rows), progress.rejected + rejected)
+
+    batch, number = [], done
+    try:
+        for number, record in read_records(path, format):
+            if number <= done:
+                continue
+            row, error = validator.validate(record)
+            if error:
+                progress = progress._replace(rejected=progress.rejected + 1)
+                if on_reject:
+                    on_reject(number, error)
+            else:
+                batch.append((number, row))
+            if number % chunk_size == 0:
+                flush(batch, number)
+                batch = []
+                if on_progress:
+                    on_progress(progress)
+        if number > progress.records:
+            flush(batch, number)
+            if on_progress:
+                on_progress(progress)
+    finally:
+        if kind.model in (Venue, Artist):
+            search.reindex(kind.model)
+            typeahead.reindex(kind.model)
+    return progress
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.strftime(DATETIME_FORMAT)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def export_file(connection, kind_name, out, format, chunk_size=5000, on_progress=None):
+    """Writes every record of ``kind_name`` to the text stream ``out``; returns the count."""
+    kind = KINDS[kind_name]
+    table = kind.model.__table__
+    fields = ('id',) + kind.fields
+    columns = [table.c[field] for field in fields if field in table.c]
+
+    writer = None
+    if format == 'csv':
+        writer = csv.DictWriter(out, fieldnames=fields, lineterminator='\n')
+        writer.writeheader()
+
+    result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(
+        select(*columns).order_by(table.c.id)
+    )
+    count = 0
+    for partition in result.partitions():
+        rows = [row._asdict() for row in partition]
+        if kind.model is Artist:
+            genres = {row['id']: [] for row in rows}
+            stmt = (
+                select(ArtistGenre.artist_id, ArtistGenre.genre)
+                .where(ArtistGenre.artist_id.in_(genres))
+                .order_by(ArtistGenre.artist_id, ArtistGenre.genre)
+            )
+            for artist_id, genre in connection.execute(stmt):
+                genres[artist_id].append(genre)
+            for row in rows:
+                row['genres'] = genres[row['id']]
+
+        for row in rows:
+            if writer is not None:
+                if 'genres' in row:
+                    row['genres'] = GENRE_SEPARATOR.join(row['genres'])
+                writer.writerow({name: _copy_value(value) for name, value in row.items()})
+            else:
+                out.write(json.dumps(row, default=_json_value) + '\n')
+        count += len(rows)
+        if on_progress:
+            on_progress(count)
+    return count
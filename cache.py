@@ -0,0 +1,210 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import make_response, request, session
+
+
+# ----------------------------------------------------------------------------#
+# Response cache.
+#
+# Rendered pages are stored under a key built from the request path and the
+# current version of every tag the view declares (e.g. ``venue:12``).
+# Invalidating a tag bumps its version, so all entries built on the old
+# version become unreachable and age out of the backend; nothing has to be
+# enumerated or deleted.
+# ----------------------------------------------------------------------------#
+
+class LRUBackend:
+    """In-process backend: a bounded, least-recently-used dict with TTLs."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        # Tag versions live apart from entries so eviction can't reset them.
+        self._counters = {}
+        # Versions restart from 0 with the process, so validators built from
+        # them also carry this. A forked worker counts on its own from there.
+        self.epoch = os.urandom(8).hex()
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._forked)
+
+    def _forked(self):
+        self.epoch = os.urandom(8).hex()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def version(self, tag):
+        with self._lock:
+            return self._counters.get(tag, 0)
+
+    def bump(self, tag):
+        with self._lock:
+            self._counters[tag] = self._counters.get(tag, 0) + 1
+
+
+class RedisBackend:
+    """
+    Shared backend for multi-process deployments. ``client`` may be any
+    object with redis-py's get/set/incr signature, so tests can pass a local
+    stand-in instead of a server.
+    """
+
+    def __init__(self, url=None, client=None, prefix='fyyur:'):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.epoch = ''
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=ttl)
+
+    def version(self, tag):
+        return int(self.client.get(self.prefix + 'tag:' + tag) or 0)
+
+    def bump(self, tag):
+        self.client.incr(self.prefix + 'tag:' + tag)
+
+
+class ResponseCache:
+    """
+    Flask extension caching the HTML of read-heavy views.
+
+    Configuration:
+        CACHE_BACKEND      'lru' (default), 'redis' or 'null'
+        CACHE_URL          redis URL for the shared backend
+        CACHE_MAX_ENTRIES  size bound of the in-process backend
+        CACHE_TTL          seconds an entry may be served, as a backstop
+                           for pages whose upcoming/past split ages
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = 60
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+        self._stats_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_BACKEND', 'lru')
+        app.config.setdefault('CACHE_URL', None)
+        app.config.setdefault('CACHE_MAX_ENTRIES', 1024)
+        app.config.setdefault('CACHE_TTL', 60)
+        self.ttl = app.config['CACHE_TTL']
+        kind = app.config['CACHE_BACKEND']
+        if kind == 'lru':
+            self.backend = LRUBackend(app.config['CACHE_MAX_ENTRIES'])
+        elif kind == 'redis':
+            self.backend = RedisBackend(app.config['CACHE_URL'])
+        elif kind == 'null':
+            self.backend = None
+        else:
+            raise ValueError(f'Unknown CACHE_BACKEND: {kind!r}')
+        app.extensions['response_cache'] = self
+
+    def _count(self, stat, n=1):
+        with self._stats_lock:
+            self.stats[stat] += n
+
+    def _key(self, tags):
+        versions = ','.join(f'{tag}={self.backend.version(tag)}' for tag in tags)
+        return f'view:{request.full_path}|{versions}'
+
+    def cached(self, *tags):
+        """
+        Caches a GET view's rendered body. ``tags`` may be format strings
+        over the view's arguments, e.g. ``'venue:{venue_id}'``.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                # Pending flashes are rendered into the page, so a page that
+                # carries them must neither be served from nor stored in cache.
+                if self.backend is None or request.method != 'GET' or session.get('_flashes'):
+                    return view(**kwargs)
+
+                key = self._key([tag.format(**kwargs) for tag in tags])
+                body = self.backend.get(key)
+                if body is not None:
+                    self._count('hits')
+                    return body
+
+                self._count('misses')
+                body = view(**kwargs)
+                if isinstance(body, str):
+                    self.backend.set(key, body, self.ttl)
+                return body
+            return wrapper
+        return decorator
+
+    def etag(self, tags):
+        """
+        A validator for the current request's response, built from the
+        versions of ``tags`` without touching the database, or None when
+        caching is off. It also rolls over every CACHE_TTL seconds, like
+        cached pages, since upcoming shows turn into past ones unannounced.
+        """
+        if self.backend is None:
+            return None
+        versions = ','.join(f'{tag}={self.backend.version(tag)}' for tag in tags)
+        window = int(time.time() // self.ttl) if self.ttl else 0
+        key = f'{self.backend.epoch}|{window}|{request.full_path}|{versions}'
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()[:24]
+
+    def conditional(self, *tags):
+        """
+        Answers a matching If-None-Match with 304 before the view runs and
+        sets a weak ETag on full responses. ``tags`` are formatted like
+        cached()'s.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                etag = self.etag([tag.format(**kwargs) for tag in tags])
+                if etag is None:
+                    return view(**kwargs)
+                if request.if_none_match.contains_weak(etag):
+                    response = make_response('', 304)
+                else:
+                    response = make_response(view(**kwargs))
+                    if response.status_code != 200:
+                        return response
+                response.set_etag(etag, weak=True)
+                return response
+            return wrapper
+        return decorator
+
+    def invalidate(self, *tags):
+        """Makes every entry built on any of ``tags`` unreachable."""
+        if self.backend is None:
+            return
+        for tag in tags:
+            self.backend.bump(tag)
+        self._count('invalidations', len(tags))
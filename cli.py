@@ -0,0 +1,227 @@
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete
+
+from config import db, cache
+import assets
+import bulk
+import counters
+from models import ShowTicket
+
+
+# ----------------------------------------------------------------------------#
+# Migrations.
+# ----------------------------------------------------------------------------#
+
+def init_migrate(app):
+    """
+    Binds Flask-Migrate to ``app``. ``flask db`` does this itself; scripts
+    calling flask_migrate's functions (upgrade() etc.) do it first.
+    """
+    from flask_migrate import Migrate
+    if 'migrate' not in app.extensions:
+        Migrate(app, db)
+
+
+class MigrateGroup(click.Group):
+    """
+    ``flask db``, Flask-Migrate's commands. Flask-Migrate imports alembic,
+    which only these commands use, so it is imported and bound to the app
+    the first time one of them is looked up rather than at start.
+    """
+
+    def commands_group(self):
+        from flask_migrate.cli import db as commands
+        init_migrate(current_app._get_current_object())
+        return commands
+
+    def list_commands(self, ctx):
+        return self.commands_group().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self.commands_group().get_command(ctx, name)
+
+
+migrate_group = MigrateGroup('db', help='Perform database migrations.')
+
+
+# ----------------------------------------------------------------------------#
+# Show counters.
+# ----------------------------------------------------------------------------#
+
+@click.group('counters', cls=AppGroup)
+def counters_group():
+    """Maintain the denormalized upcoming/past show counters."""
+
+
+@counters_group.command('sweep')
+@click.option('--every', type=float, default=None,
+              help='Keep running, sweeping every this many seconds.')
+def sweep_command(every):
+    """Move shows that have started from upcoming to past."""
+    while True:
+        owners = set()
+        with db.engine.begin() as connection:
+            moved = counters.sweep(connection, owners=owners)
+        if moved:
+            # The listings' counts, and the moved shows' pages.
+            cache.invalidate('venues', 'artists',
+                             *sorted(f'{model.__tablename__}:{id}' for model, id in owners))
+        click.echo(f'Moved {moved} show(s) from upcoming to past.')
+        if every is None:
+            break
+        time.sleep(every)
+
+
+@counters_group.command('rebuild')
+def rebuild_command():
+    """Recount every venue's and artist's shows from scratch."""
+    with db.engine.begin() as connection:
+        counters.rebuild(connection)
+    cache.invalidate('venues', 'artists')
+    click.echo('Show counters rebuilt.')
+
+
+# ----------------------------------------------------------------------------#
+# Bulk import and export.
+# ----------------------------------------------------------------------------#
+
+@click.group('catalog', cls=AppGroup)
+def catalog_group():
+    """Import and export venues, artists and shows as CSV or JSONL."""
+
+
+@catalog_group.command('import')
+@click.argument('kind', type=click.Choice(sorted(bulk.KINDS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'format', type=click.Choice(bulk.FORMATS), default=None,
+              help='Input format; guessed from the file extension by default.')
+@click.option('--chunk-size', type=click.IntRange(min=1), default=5000, show_default=True,
+              help='Records written per transaction.')
+@click.option('--restart', is_flag=True,
+              help='Start from the first record instead of resuming.')
+def import_command(kind, path, format, chunk_size, restart):
+    """Import KIND records from PATH, resuming an interrupted run."""
+    started = time.perf_counter()
+
+    def report(progress):
+        rate = progress.imported / max(time.perf_counter() - started, 1e-9)
+        click.echo(f'{kind}: {progress.records} records read, {progress.imported} imported, '
+                   f'{progress.rejected} rejected ({rate:.0f}/s)', err=True)
+
+    def reject(number, message):
+        click.echo(f'record {number}: {message}', err=True)
+
+    try:
+        progress = bulk.import_file(db.engine, kind, path, format, chunk_size, restart,
+                                    on_progress=report, on_reject=reject)
+    except bulk.BulkError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Imported {progress.imported} {kind}, rejected {progress.rejected}.')
+
+
+@catalog_group.command('export')
+@click.argument('kind', type=click.Choice(sorted(bulk.KINDS)))
+@click.argument('output', type=click.File('w', encoding='utf-8', lazy=False))
+@click.option('--format', 'format', type=click.Choice(bulk.FORMATS), default=None,
+              help='Output format; guessed from the file extension, else jsonl.')
+@click.option('--chunk-size', type=click.IntRange(min=1), default=5000, show_default=True,
+              help='Records fetched per round trip.')
+def export_command(kind, output, format, chunk_size):
+    """Export every KIND record to OUTPUT ('-' for stdout)."""
+    if format is None:
+        try:
+            format = bulk.detect_format(output.name)
+        except bulk.BulkError:
+            format = 'jsonl'
+
+    def report(count):
+        click.echo(f'{kind}: {count} records exported', err=True)
+
+    with db.engine.connect() as connection:
+        count = bulk.export_file(connection, kind, output, format, chunk_size, on_progress=report)
+    click.echo(f'Exported {count} {kind}.', err=True)
+
+
+# ----------------------------------------------------------------------------#
+# Show ingest.
+# ----------------------------------------------------------------------------#
+
+@click.group('ingest', cls=AppGroup)
+def ingest_group():
+    """Maintain the show ingest queue's tickets."""
+
+
+@ingest_group.command('prune')
+@click.option('--older-than', type=click.FloatRange(min=0), default=7, show_default=True,
+              help='Delete tickets older than this many days.')
+def prune_command(older_than):
+    """Forget the outcome of old show ingest tickets."""
+    with db.engine.begin() as connection:
+        deleted = connection.execute(
+            delete(ShowTicket).where(ShowTicket.created_at < datetime.now() - timedelta(days=older_than))
+        ).rowcount
+    click.echo(f'Deleted {deleted} ticket(s).')
+
+
+# ----------------------------------------------------------------------------#
+# Static assets.
+# ----------------------------------------------------------------------------#
+
+@click.group('assets', cls=AppGroup)
+def assets_group():
+    """Build the fingerprinted, precompressed static assets."""
+
+
+@assets_group.command('build')
+@click.option('--clean', is_flag=True, help='Delete the files of earlier builds.')
+def build_command(clean):
+    """Write hashed, bundled and compressed copies of static/ to static/dist."""
+    run = assets.build(current_app.static_folder, clean)
+    stats = run.stats
+    brotli = (f"{stats['br'] / 1024:.0f} KiB with brotli" if 'br' in stats
+              else 'no .br files without the brotli package')
+    click.echo(f"Built {stats['files']} files, {stats['bytes'] / 1024:.0f} KiB: "
+               f"{stats['gzip'] / 1024:.0f} KiB gzipped, {brotli}.")
+    for bundle in assets.BUNDLES:
+        click.echo(f"  {bundle} -> {run.files[bundle]['path']}")
+    if clean:
+        click.echo(f"Removed {stats['removed']} file(s) of earlier builds.")
+    current_app.extensions['assets'].load(current_app.config['ASSETS_MANIFEST'])
+
+
+# ----------------------------------------------------------------------------#
+# Templates.
+# ----------------------------------------------------------------------------#
+
+@click.group('templates', cls=AppGroup)
+def templates_group():
+    """Manage the compiled template cache."""
+
+
+@templates_group.command('compile')
+@click.option('--clear', is_flag=True, help='Empty the cache first.')
+def compile_command(clear):
+    """Compile every template into TEMPLATE_CACHE_DIR."""
+    env = current_app.jinja_env
+    if env.bytecode_cache is None:
+        raise click.ClickException('TEMPLATE_CACHE_DIR is not set.')
+    if clear:
+        env.bytecode_cache.clear()
+    started = time.perf_counter()
+    names = env.list_templates()
+    for name in names:
+        env.get_template(name)
+    click.echo(f'Compiled {len(names)} templates into {current_app.config["TEMPLATE_CACHE_DIR"]} '
+               f'in {(time.perf_counter() - started) * 1000:.0f} ms.')
+
+
+def init_app(app):
+    """Adds the commands above to ``flask``."""
+    for group in (migrate_group, counters_group, catalog_group, ingest_group, assets_group,
+                  templates_group):
+        app.cli.add_command(group)
@@ -0,0 +1,172 @@
+from datetime import datetime
+
+from sqlalchemy import bindparam, delete, event, func, insert, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import Venue, Artist, Show, ShowCounterState
+
+
+# ----------------------------------------------------------------------------#
+# Denormalized upcoming/past show counters.
+#
+# Venue and Artist carry upcoming_shows_count and past_shows_count, accurate
+# as of ShowCounterState.swept_until (the watermark): a show is upcoming
+# while its start_time is after the watermark. Inserts and deletes adjust
+# the counters in the same transaction. sweep() later moves the shows whose
+# start_time the clock has passed from upcoming to past, and advances the
+# watermark. Counting against the watermark rather than now() means a show
+# is never counted past twice.
+# ----------------------------------------------------------------------------#
+
+STATE_ID = 1
+OWNERS = ((Venue, 'venue_id'), (Artist, 'artist_id'))
+# INSERT ... ON CONFLICT DO NOTHING, by dialect.
+INSERT_IGNORING_CONFLICTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def _watermark(connection, for_update=False):
+    # Writers take the row in share mode and the sweeper in exclusive mode,
+    # so a show inserted mid-sweep is classified against the watermark the
+    # sweep commits.
+    stmt = (
+        select(ShowCounterState.swept_until)
+        .where(ShowCounterState.id == STATE_ID)
+        .with_for_update(read=not for_update)
+    )
+    watermark = connection.execute(stmt).scalar()
+    if watermark is None:
+        # Fresh database not built by the migrations, which seed the row:
+        # nothing has been counted yet, so start now. Concurrent writers may
+        # all get here; the first insert wins and the rest read its row.
+        insert_ = INSERT_IGNORING_CONFLICTS.get(connection.dialect.name)
+        if insert_ is None:
+            connection.execute(insert(ShowCounterState).values(id=STATE_ID, swept_until=datetime.now()))
+        else:
+            connection.execute(insert_(ShowCounterState).values(id=STATE_ID, swept_until=datetime.now())
+                               .on_conflict_do_nothing(index_elements=['id']))
+        watermark = connection.execute(stmt).scalar()
+    return watermark
+
+
+def _apply(connection, model, deltas):
+    """
+    Adds ``{owner_id: (upcoming_delta, past_delta)}`` to ``model``'s counters
+    and bumps updated_at, since the owner's page lists the shows that moved.
+    """
+    deltas = {owner_id: delta for owner_id, delta in deltas.items() if delta != (0, 0)}
+    if not deltas:
+        return
+    table = model.__table__
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam('owner_id'))
+        .values(upcoming_shows_count=table.c.upcoming_shows_count + bindparam('upcoming_delta'),
+                past_shows_count=table.c.past_shows_count + bindparam('past_delta'),
+                updated_at=datetime.now())
+    )
+    # Sorted so concurrent writers lock rows in the same order.
+    connection.execute(stmt, [
+        {'owner_id': owner_id, 'upcoming_delta': upcoming, 'past_delta': past}
+        for owner_id, (upcoming, past) in sorted(deltas.items())
+    ])
+
+
+def adjust(connection, shows, delta):
+    """
+    Adds ``delta`` (1 for inserted, -1 for deleted) to the counters of the
+    venues and artists of ``shows``, mappings with venue_id, artist_id and
+    start_time. Bulk writers that bypass the ORM must call this themselves.
+    """
+    if not shows:
+        return
+    watermark = _watermark(connection)
+    for model, key in OWNERS:
+        deltas = {}
+        for show in shows:
+            upcoming, past = deltas.get(show[key], (0, 0))
+            if show['start_time'] > watermark:
+                upcoming += delta
+            else:
+                past += delta
+            deltas[show[key]] = (upcoming, past)
+        _apply(connection, model, deltas)
+
+
+def sweep(connection, until=None, owners=None):
+    """
+    Moves shows that started between the watermark and ``until`` (default
+    now) from upcoming to past and advances the watermark. Returns the
+    number of shows moved, and adds ``(model, id)`` of their venues and
+    artists to the set ``owners`` if given.
+    """
+    until = until or datetime.now()
+    since = _watermark(connection, for_update=True)
+    if until <= since:
+        return 0
+
+    for model, key in OWNERS:
+        owner = getattr(Show, key)
+        counts = connection.execute(
+            select(owner, func.count(Show.id))
+            .where(Show.start_time > since, Show.start_time <= until)
+            .group_by(owner)
+        ).all()
+        _apply(connection, model, {owner_id: (-n, n) for owner_id, n in counts})
+        if owners is not None:
+            owners.update((model, owner_id) for owner_id, _ in counts)
+    # Every show has one venue and one artist, so each pass counts them all.
+    moved = sum(n for _, n in counts)
+
+    connection.execute(
+        update(ShowCounterState).where(ShowCounterState.id == STATE_ID).values(swept_until=until)
+    )
+    return moved
+
+
+def rebuild(connection, now=None):
+    """Recomputes every counter from the show table and resets the watermark."""
+    now = now or datetime.now()
+    connection.execute(delete(ShowCounterState))
+    connection.execute(insert(ShowCounterState).values(id=STATE_ID, swept_until=now))
+
+    shows = Show.__table__
+    for model, key in OWNERS:
+        table = model.__table__
+        owned = shows.c[key] == table.c.id
+        connection.execute(update(table).values(
+            upcoming_shows_count=select(func.count(shows.c.id))
+            .where(owned, shows.c.start_time > now).scalar_subquery(),
+            past_shows_count=select(func.count(shows.c.id))
+            .where(owned, shows.c.start_time <= now).scalar_subquery(),
+            updated_at=now,
+        ))
+
+
+# ----------------------------------------------------------------------------#
+# Keep the counters in step with ORM writes to Show.
+# ----------------------------------------------------------------------------#
+
+def _show_row(show):
+    return {'venue_id': show.venue_id, 'artist_id': show.artist_id, 'start_time': show.start_time}
+
+
+@event.listens_for(Show, 'after_insert')
+def _show_inserted(mapper, connection, target):
+    adjust(connection, [_show_row(target)], 1)
+
+
+@event.listens_for(Show, 'after_delete')
+def _show_deleted(mapper, connection, target):
+    adjust(connection, [_show_row(target)], -1)
+
+
+@event.listens_for(Show, 'after_update')
+def _show_updated(mapper, connection, target):
+    attrs = inspect(target).attrs
+    old = {}
+    for key in ('venue_id', 'artist_id', 'start_time'):
+        history = attrs[key].history
+        old[key] = history.deleted[0] if history.deleted else getattr(target, key)
+    if old != _show_row(target):
+        adjust(connection, [old], -1)
+        adjust(connection, [_show_row(target)], 1)
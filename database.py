@@ -0,0 +1,151 @@
+import os
+import time
+
+from flask import g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import NullPool, QueuePool
+
+import instrumentation
+import metrics
+
+
+# ----------------------------------------------------------------------------#
+# Engine and connection pool tuning.
+# ----------------------------------------------------------------------------#
+
+pool_checkout_wait = metrics.register(metrics.Histogram(
+    'fyyur_db_pool_checkout_wait_seconds',
+    'Time spent waiting for a database connection from the pool.',
+))
+
+
+class TimedPoolMixin:
+    """Records how long each checkout waited for a connection."""
+
+    def connect(self):
+        start = time.perf_counter()
+        connection = super().connect()
+        elapsed = time.perf_counter() - start
+        pool_checkout_wait.observe(elapsed)
+        instrumentation.record_pool_wait(elapsed)
+        return connection
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedNullPool(TimedPoolMixin, NullPool):
+    pass
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def env_bool(name, default=False):
+    value = os.environ.get(name)
+    if value in (None, ''):
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+def database_uri():
+    """DATABASE_URL if set, else a PostgreSQL URL built from the POSTGRES_* variables."""
+    if os.environ.get('DATABASE_URL'):
+        return os.environ['DATABASE_URL']
+    return 'postgresql://{user}:{password}@{host}:{port}/{db}'.format(
+        user=os.environ.get('POSTGRES_USER', 'postgres'),
+        password=os.environ.get('POSTGRES_PASSWORD', 'abc'),
+        host=os.environ.get('POSTGRES_HOST', 'localhost'),
+        port=os.environ.get('POSTGRES_PORT', '5432'),
+        db=os.environ.get('POSTGRES_DB', 'fyurr'),
+    )
+
+
+def engine_options(uri):
+    """
+    Builds SQLALCHEMY_ENGINE_OPTIONS for ``uri`` from the environment:
+
+        DB_POOL_SIZE           connections kept open per process (5)
+        DB_MAX_OVERFLOW        extra connections allowed under load (10)
+        DB_POOL_TIMEOUT        seconds to wait for a free connection (30)
+        DB_POOL_RECYCLE        seconds before a connection is replaced (1800)
+        DB_POOL_PRE_PING       test connections on checkout (on)
+        DB_EXTERNAL_POOLER     running behind PgBouncer or similar (off):
+                               don't pool in-process and don't use server-side
+                               prepared statements, which transaction pooling
+                               can't route
+    """
+    url = make_url(uri)
+    options = {'pool_pre_ping': env_bool('DB_POOL_PRE_PING', True)}
+
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # Flask-SQLAlchemy pins in-memory SQLite to a single StaticPool connection.
+        return options
+
+    if env_bool('DB_EXTERNAL_POOLER'):
+        options['poolclass'] = TimedNullPool
+        if url.get_driver_name() == 'psycopg':
+            # psycopg 3 prepares repeated statements server-side by default.
+            # psycopg2 never does, so it needs no setting.
+            options['connect_args'] = {'prepare_threshold': None}
+        return options
+
+    options.update(
+        poolclass=TimedQueuePool,
+        pool_size=env_int('DB_POOL_SIZE', 5),
+        max_overflow=env_int('DB_MAX_OVERFLOW', 10),
+        pool_timeout=env_int('DB_POOL_TIMEOUT', 30),
+        pool_recycle=env_int('DB_POOL_RECYCLE', 1800),
+    )
+    return options
+
+
+def dispose_after_fork(app, db):
+    """
+    Makes a forked child drop the pooled connections it inherited from its
+    parent, so a server may build the app before forking its workers (see
+    wsgi.py) without two processes sharing a socket. close=False leaves the
+    parent's connections alone. uWSGI runs these hooks too.
+    """
+    def dispose():
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+    os.register_at_fork(after_in_child=dispose)
+
+
+def replica_binds():
+    """
+    SQLALCHEMY_BINDS for the read replicas listed, comma-separated, in
+    DATABASE_REPLICA_URLS, as replica_1, replica_2, ... Each gets the same
+    pool settings as the primary.
+    """
+    urls = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    return {f'replica_{i}': {'url': url, **engine_options(url)} for i, url in enumerate(urls, 1)}
+
+
+# ----------------------------------------------------------------------------#
+# Statement timeout.
+# ----------------------------------------------------------------------------#
+
+statement_timeout_ms = env_int('DB_STATEMENT_TIMEOUT_MS', 0)
+
+
+@event.listens_for(Engine, 'begin')
+def _set_statement_timeout(connection):
+    """
+    Applies DB_STATEMENT_TIMEOUT_MS, or ``g.statement_timeout_ms`` when a view
+    sets it, to every PostgreSQL transaction. SET LOCAL ends with the
+    transaction, so it is safe behind a transaction-pooling PgBouncer.
+    """
+    if connection.dialect.name != 'postgresql':
+        return
+    timeout = statement_timeout_ms
+    if has_app_context():
+        timeout = g.get('statement_timeout_ms', timeout)
+    if timeout:
+        connection.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout)}')
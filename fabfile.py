@@ -13,6 +13,13 @@ def test():
         abort("Aborted at user request.")
 
 
+def bench(options=""):
+    local(
+        "python -m benchmarks.bench_routes --output benchmarks/results/$(date +%Y%m%d-%H%M%S).json "
+        + options
+    )
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
@@ -1,7 +1,8 @@
 from datetime import datetime
 from flask_wtf import Form
 from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL, Regexp
+from wtforms.validators import DataRequired, AnyOf, URL, Regexp, Optional, ValidationError
+from booking import end_time_for
 
 class ShowForm(Form):
     artist_id = StringField(
@@ -15,6 +16,17 @@ class ShowForm(Form):
         validators=[DataRequired()],
         default= datetime.today()
     )
+    end_time = DateTimeField(
+        'end_time',
+        validators=[Optional()]
+    )
+
+    def validate_end_time(self, field):
+        if self.start_time.data:
+            try:
+                end_time_for(self.start_time.data, field.data)
+            except ValueError as e:
+                raise ValidationError(str(e))
 
 class VenueForm(Form):
     name = StringField(
@@ -0,0 +1,126 @@
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, make_response, request, session as http_session
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm import Session
+
+from config import db
+from models import Venue, Artist, Show
+
+
+# ----------------------------------------------------------------------------#
+# Last-modified times and conditional GETs of the detail pages.
+#
+# Venue, Artist and Show carry updated_at, set on every ORM write. Since a
+# venue's page also lists its shows and their artists, a venue's updated_at
+# moves whenever any of them changes too (and likewise for artists): the
+# show counters bump it as shows come, go or pass (see counters._apply) and
+# the hooks below bump it when a venue or artist it plays with is edited.
+#
+# Between sweeps, though, a show can start and move from the page's upcoming
+# list to its past one with updated_at unchanged. So the page is dated by the
+# later of updated_at and the start_time of the last of its shows to start
+# since then, up to now: one primary key lookup plus an index range scan on
+# (owner, start_time) answers If-None-Match or If-Modified-Since with a 304
+# before the view runs, and a show starting changes the validators at once.
+#
+# The response cache (cache.cached) can still hold a body rendered before
+# the show started, for up to CACHE_TTL seconds; `flask counters sweep`
+# drops the cached pages of the owners whose shows it moves. Run it at least
+# every CACHE_TTL seconds (e.g. `flask counters sweep --every 60`) or such a
+# body could be served, and then revalidated, under the new validators until
+# the sweep.
+# ----------------------------------------------------------------------------#
+
+# Model: (the other owner, its key on Show, this model's key on Show).
+PARTNERS = {
+    Venue: (Artist, 'artist_id', 'venue_id'),
+    Artist: (Venue, 'venue_id', 'artist_id'),
+}
+
+
+@event.listens_for(Session, 'before_flush')
+def _touch_modified(session, flush_context, instances):
+    # Genre rows changing alone wouldn't UPDATE the artist, so set the
+    # timestamp here rather than rely on onupdate.
+    now = datetime.now()
+    touched = session.info['touched_owners'] = []
+    for obj in session.dirty:
+        if type(obj) in PARTNERS and session.is_modified(obj):
+            obj.updated_at = now
+            touched.append(obj)
+
+
+@event.listens_for(Session, 'after_flush')
+def _touch_partners(session, flush_context):
+    touched = session.info.pop('touched_owners', None)
+    if not touched:
+        return
+    now = datetime.now()
+    connection = session.connection()
+    for model, (partner, partner_key, key) in PARTNERS.items():
+        ids = {obj.id for obj in touched if type(obj) is model}
+        if ids:
+            partner_ids = select(getattr(Show, partner_key)).where(getattr(Show, key).in_(ids))
+            connection.execute(
+                update(partner.__table__)
+                .where(partner.__table__.c.id.in_(partner_ids))
+                .values(updated_at=now)
+            )
+
+
+def _http_date(value):
+    # updated_at is naive local time; HTTP dates are whole seconds of UTC.
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def conditional_page(model, id_arg):
+    """
+    Answers conditional GETs of ``model``'s detail page, whose id is the
+    ``id_arg`` view argument, from the time the page last changed (see
+    above), and marks the page cacheable by shared caches as
+    PAGE_CACHE_CONTROL says. Pages carrying flashed messages are personal,
+    so those are neither validated nor shared.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if http_session.get('_flashes'):
+                response = make_response(view(*args, **kwargs))
+                response.headers['Cache-Control'] = 'private, no-cache'
+                return response
+
+            owner_key = getattr(Show, PARTNERS[model][2])
+            started = (
+                select(func.max(Show.start_time))
+                .where(owner_key == model.id, Show.start_time > model.updated_at,
+                       Show.start_time <= datetime.now())
+                .scalar_subquery()
+            )
+            row = db.session.execute(
+                select(model.updated_at, started).where(model.id == kwargs[id_arg])
+            ).first()
+            if row is None:
+                return view(*args, **kwargs)
+            modified = max(row[0], row[1] or row[0])
+
+            etag = f'{model.__tablename__}-{kwargs[id_arg]}-{modified.timestamp():.6f}'
+            last_modified = _http_date(modified)
+            if request.if_none_match:
+                fresh = request.if_none_match.contains_weak(etag)
+            else:
+                fresh = request.if_modified_since is not None and last_modified <= request.if_modified_since
+
+            if fresh:
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.last_modified = last_modified
+            response.headers['Cache-Control'] = current_app.config['PAGE_CACHE_CONTROL']
+            return response
+        return wrapper
+    return decorator
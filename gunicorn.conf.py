@@ -0,0 +1,8 @@
+import os
+
+# Build the app once, then fork the workers from it; see wsgi.py.
+wsgi_app = 'wsgi:application'
+preload_app = True
+
+# Binds to $PORT when set, else 127.0.0.1:8000; pass --bind to change it.
+workers = int(os.environ.get('WEB_CONCURRENCY', 2 * (os.cpu_count() or 1) + 1))
@@ -0,0 +1,353 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import uuid
+from datetime import datetime
+
+from sqlalchemy import exc, insert, select
+
+import booking
+import bulk
+import metrics
+from config import cache
+from instrumentation import log_event
+from models import ShowTicket
+
+
+# ----------------------------------------------------------------------------#
+# Show ingest mode.
+#
+# With SHOW_INGEST on, create_show_submission doesn't insert the show itself:
+# submit() appends it to this process's spool file, queues it and answers
+# with a ticket. A background thread takes whatever has queued up, up to
+# SHOW_INGEST_BATCH_SIZE shows, and inserts it in one transaction through
+# bulk.write_rows, recording each ticket's outcome in ShowTicket. Under load
+# the queue grows while a batch commits, so batches grow with it and the
+# commit cost is shared.
+#
+# Back-pressure: at most SHOW_INGEST_MAX_QUEUED shows wait at once; past
+# that, submit() waits SHOW_INGEST_ENQUEUE_TIMEOUT for a slot and raises
+# IngestBusy.
+#
+# Crash safety: a submission is in the spool before it is acknowledged, and
+# the spool is fsynced before every batch, so a crashed process loses
+# nothing and a crashed machine at most the shows of the batch being
+# gathered. The spool is emptied whenever everything in it has been stored.
+# On start, a process replays the spools left by dead ones; ShowTicket makes
+# the replay skip shows that were stored before the crash. A batch that fails
+# in some unexpected way (a full disk, say) is logged and queued again, still
+# spooled and holding its slots, and its retry skips what was stored too.
+#
+# A ticket's status is answered from the submitting process's queue, then
+# from ShowTicket; with several processes, one queued elsewhere reads as
+# unknown until it is stored, typically within a batch's commit time.
+# ----------------------------------------------------------------------------#
+
+SPOOL_NAME = re.compile(r'^shows-(\d+)(?:-.+)?\.jsonl$')
+POLL_INTERVAL = 0.1
+RETRY_DELAY = 1.0
+
+ingested = metrics.register(metrics.Counter(
+    'fyyur_show_ingest_total',
+    'Shows submitted in ingest mode, by outcome.',
+    ('outcome',),
+))
+
+
+class IngestBusy(RuntimeError):
+    """The ingest queue is full; the client should retry after ``retry_after`` seconds."""
+
+    def __init__(self, retry_after=1):
+        super().__init__('The show ingest queue is full.')
+        self.retry_after = retry_after
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_spool(path):
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # The line being written when the process died.
+                break
+    return records
+
+
+def _show_row(record):
+    return {
+        'id': None,
+        'artist_id': record['artist_id'],
+        'venue_id': record['venue_id'],
+        'start_time': datetime.fromisoformat(record['start_time']),
+        'end_time': datetime.fromisoformat(record['end_time']),
+    }
+
+
+def _is_transient(error):
+    return isinstance(error, (exc.OperationalError, exc.InterfaceError)) or (
+        isinstance(error, exc.DBAPIError) and error.connection_invalidated)
+
+
+class ShowIngest:
+    """
+    Configuration:
+
+        SHOW_INGEST                     queue show submissions (off)
+        SHOW_INGEST_SPOOL_DIR           where spool files are kept
+        SHOW_INGEST_BATCH_SIZE          most shows inserted per transaction (500)
+        SHOW_INGEST_MAX_QUEUED          most shows waiting at once (10000)
+        SHOW_INGEST_ENQUEUE_TIMEOUT     seconds to wait for room in the queue (0.5)
+    """
+
+    def __init__(self, app=None, db=None):
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._queued = {}
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.app = app
+        self.db = db
+        app.config.setdefault('SHOW_INGEST', False)
+        app.config.setdefault('SHOW_INGEST_SPOOL_DIR', os.path.join(app.root_path, 'spool'))
+        app.config.setdefault('SHOW_INGEST_BATCH_SIZE', 500)
+        app.config.setdefault('SHOW_INGEST_MAX_QUEUED', 10000)
+        app.config.setdefault('SHOW_INGEST_ENQUEUE_TIMEOUT', 0.5)
+        self.enabled = app.config['SHOW_INGEST']
+        self.spool_dir = app.config['SHOW_INGEST_SPOOL_DIR']
+        self.batch_size = app.config['SHOW_INGEST_BATCH_SIZE']
+        self.max_queued = app.config['SHOW_INGEST_MAX_QUEUED']
+        self.enqueue_timeout = app.config['SHOW_INGEST_ENQUEUE_TIMEOUT']
+        if self._pid == os.getpid():
+            # Bound to another app before; its worker serves that app's database.
+            self.stop()
+            self._pid = None
+
+        metrics.register(metrics.Gauge(
+            'fyyur_show_ingest_queued',
+            'Shows submitted in ingest mode and not yet stored.',
+            lambda: len(self._queued),
+        ))
+        if self.enabled:
+            # Started lazily, so a process forked after import runs its own.
+            app.before_request(self._ensure_started)
+            atexit.register(self.stop)
+        app.extensions['show_ingest'] = self
+
+    # ------------------------------------------------------------------------
+    # Requests.
+
+    def _ensure_started(self):
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self._start()
+
+    def _start(self):
+        pid = os.getpid()
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._spool_path = os.path.join(self.spool_dir, f'shows-{pid}.jsonl')
+        if os.path.exists(self._spool_path):
+            # Left by an earlier process with our pid; replayed below.
+            os.rename(self._spool_path, os.path.join(self.spool_dir, f'shows-{pid}-{uuid.uuid4().hex}.jsonl'))
+        self._spool = open(self._spool_path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+        self._queue = queue.SimpleQueue()
+        self._slots = threading.BoundedSemaphore(self.max_queued)
+        self._queued = {}
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='show-ingest', daemon=True)
+        self._pid = pid
+        self._thread.start()
+
+    def submit(self, artist_id, venue_id, start_time, end_time):
+        """Spools and queues a show, returning its ticket. Raises IngestBusy when full."""
+        self._ensure_started()
+        if not self._slots.acquire(timeout=self.enqueue_timeout):
+            ingested.inc(outcome='busy')
+            raise IngestBusy()
+        record = {
+            'ticket': uuid.uuid4().hex,
+            'artist_id': artist_id,
+            'venue_id': venue_id,
+            'start_time': start_time.isoformat(),
+            'end_time': end_time.isoformat(),
+        }
+        with self._lock:
+            self._spool.write(json.dumps(record) + '\n')
+            self._spool.flush()
+            self._queued[record['ticket']] = record
+        self._queue.put(record)
+        return record['ticket']
+
+    def status(self, ticket):
+        """``{'ticket', 'status', 'show_id', 'error'}`` for ``ticket``, or None if unknown."""
+        if ticket in self._queued:
+            return {'ticket': ticket, 'status': 'queued', 'show_id': None, 'error': None}
+        # From the primary: a replica may not have the ticket yet.
+        row = self.db.session.execute(
+            select(ShowTicket).where(ShowTicket.ticket == ticket),
+            bind_arguments={'bind': self.db.engine},
+        ).scalar()
+        if row is None:
+            return None
+        return {
+            'ticket': ticket,
+            'status': 'rejected' if row.show_id is None else 'landed',
+            'show_id': row.show_id,
+            'error': row.error,
+        }
+
+    def stop(self, timeout=10):
+        """Stores what is queued, then stops the worker."""
+        if self._pid == os.getpid():
+            self._stopping.set()
+            self._thread.join(timeout)
+
+    # ------------------------------------------------------------------------
+    # Worker.
+
+    def _run(self):
+        with self.app.app_context():
+            try:
+                self._replay_orphans()
+            except Exception as e:
+                # The spools stay for the next start to replay.
+                log_event('show_ingest_failed', logging.ERROR, exc_info=True, error=e)
+            while not (self._stopping.is_set() and self._queue.empty()):
+                batch = self._collect()
+                if not batch:
+                    continue
+                try:
+                    self._flush(batch)
+                except Exception as e:
+                    log_event('show_ingest_failed', logging.ERROR, exc_info=True, error=e, shows=len(batch))
+                    if self._stopping.wait(RETRY_DELAY):
+                        break  # still in the spool, replayed on the next start
+                    for record in batch:
+                        record['retry'] = True
+                        self._queue.put(record)
+
+    def _collect(self):
+        try:
+            batch = [self._queue.get(timeout=POLL_INTERVAL)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch, replay=False):
+        if not replay:
+            os.fsync(self._spool.fileno())
+        # Replays and retries may hold shows that were stored already.
+        stored = self._store(batch, replay or any(record.get('retry') for record in batch))
+        if stored and not replay:
+            with self._lock:
+                for record in batch:
+                    del self._queued[record['ticket']]
+                if not self._queued:
+                    self._spool.truncate(0)
+            for _ in batch:
+                self._slots.release()
+        return stored
+
+    def _store(self, batch, dedupe):
+        """
+        Stores ``batch``, skipping shows whose ticket is stored if ``dedupe``,
+        or returns False if the database stayed unreachable until stop().
+        """
+        while True:
+            try:
+                with self.db.engine.begin() as connection:
+                    rows, rejected = self._insert(connection, batch, dedupe)
+                break
+            except Exception as e:
+                if _is_transient(e):
+                    log_event('show_ingest_retry', logging.WARNING, error=e, shows=len(batch))
+                    if self._stopping.wait(RETRY_DELAY):
+                        return False
+                    continue
+                if len(batch) == 1:
+                    self._reject(batch[0], e)
+                    return True
+                # Find the bad apples one show at a time.
+                return all([self._store([record], dedupe) for record in batch])
+
+        ingested.inc(len(rows), outcome='landed')
+        if rejected:
+            ingested.inc(rejected, outcome='rejected')
+        if rows:
+            cache.invalidate(*bulk.cache_tags(bulk.KINDS['shows'], rows))
+        return True
+
+    def _insert(self, connection, batch, dedupe):
+        if dedupe:
+            done = set(connection.execute(
+                select(ShowTicket.ticket).where(ShowTicket.ticket.in_([record['ticket'] for record in batch]))
+            ).scalars())
+            batch = [record for record in batch if record['ticket'] not in done]
+
+        rows = [_show_row(record) for record in batch]
+        tickets = {id(row): record['ticket'] for record, row in zip(batch, rows)}
+        rows, refused = bulk.check_shows(connection, rows)
+        if rows:
+            bulk.write_rows(connection, bulk.KINDS['shows'], rows)
+        now = datetime.now()
+        outcomes = [{'ticket': tickets[id(row)], 'show_id': row['id'], 'error': None, 'created_at': now}
+                    for row in rows]
+        outcomes.extend({'ticket': tickets[id(row)], 'show_id': None, 'error': message, 'created_at': now}
+                        for row, message in refused)
+        if outcomes:
+            connection.execute(insert(ShowTicket), outcomes)
+        return rows, len(refused)
+
+    def _reject(self, record, error):
+        log_event('show_ingest_rejected', logging.WARNING, error=error, ticket=record['ticket'])
+        # A show booked concurrently by another writer trips the exclusion constraint.
+        conflict = booking.as_conflict(error)
+        message = f'{conflict.key}: {conflict}' if conflict else str(error)[:500]
+        with self.db.engine.begin() as connection:
+            connection.execute(insert(ShowTicket).values(
+                ticket=record['ticket'], show_id=None, error=message, created_at=datetime.now()))
+        ingested.inc(outcome='rejected')
+
+    def _replay_orphans(self):
+        for name in sorted(os.listdir(self.spool_dir)):
+            match = SPOOL_NAME.match(name)
+            path = os.path.join(self.spool_dir, name)
+            if not match or path == self._spool_path:
+                continue
+            owner = int(match.group(1))
+            if owner != self._pid and _is_alive(owner):
+                continue
+            claimed = os.path.join(self.spool_dir, f'shows-{self._pid}-{uuid.uuid4().hex}.jsonl')
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue  # claimed by another process
+            records = _read_spool(claimed)
+            log_event('show_ingest_replay', spool=name, shows=len(records))
+            for start in range(0, len(records), self.batch_size):
+                if not self._flush(records[start:start + self.batch_size], replay=True):
+                    return  # stopping with the database down; the next start retries
+            os.remove(claimed)
@@ -0,0 +1,193 @@
+import json
+import logging
+import time
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import metrics
+
+
+# ----------------------------------------------------------------------------#
+# Per-request SQL and render instrumentation.
+#
+# Every request gets a RequestStats in ``g``: SQL statements run and their
+# total time, the slowest one, template render time and time spent waiting
+# for a pooled connection. They are reported three ways: a Server-Timing
+# header, the Prometheus metrics below and, for slow requests and errors,
+# structured JSON log lines.
+# ----------------------------------------------------------------------------#
+
+STATEMENT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+request_duration = metrics.register(metrics.Histogram(
+    'fyyur_http_request_duration_seconds',
+    'Time from the start of a request to its response.',
+    ('endpoint', 'method', 'status'),
+))
+sql_statements = metrics.register(metrics.Histogram(
+    'fyyur_http_request_sql_statements',
+    'SQL statements executed per request.',
+    ('endpoint',), STATEMENT_BUCKETS,
+))
+sql_duration = metrics.register(metrics.Histogram(
+    'fyyur_http_request_sql_seconds',
+    'Time spent executing SQL per request.',
+    ('endpoint',),
+))
+render_duration = metrics.register(metrics.Histogram(
+    'fyyur_http_request_render_seconds',
+    'Time spent rendering templates per request.',
+    ('endpoint',),
+))
+pool_wait_duration = metrics.register(metrics.Histogram(
+    'fyyur_http_request_pool_wait_seconds',
+    'Time spent waiting for pooled database connections per request.',
+    ('endpoint',),
+))
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+        self.render_time = 0.0
+        self.pool_wait = 0.0
+        self._render_started = []
+
+    def add_statement(self, statement, elapsed):
+        self.sql_count += 1
+        self.sql_time += elapsed
+        if elapsed > self.slowest_time:
+            self.slowest_time = elapsed
+            self.slowest_statement = statement
+
+    def as_dict(self):
+        return {
+            'duration_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'sql_count': self.sql_count,
+            'sql_ms': round(self.sql_time * 1000, 2),
+            'slowest_sql_ms': round(self.slowest_time * 1000, 2),
+            'slowest_sql': ' '.join(self.slowest_statement.split())[:500] if self.slowest_statement else None,
+            'render_ms': round(self.render_time * 1000, 2),
+            'pool_wait_ms': round(self.pool_wait * 1000, 2),
+        }
+
+
+def current_stats():
+    """The running request's RequestStats, or None outside an instrumented request."""
+    if not has_request_context():
+        return None
+    return g.get('request_stats')
+
+
+def log_event(event, level=logging.INFO, exc_info=False, **fields):
+    """
+    Logs ``event`` and ``fields`` as one JSON object, with the method, path,
+    endpoint and SQL/render stats of the request it happens in.
+    """
+    record = {'event': event}
+    if has_request_context():
+        record.update(method=request.method, path=request.path, endpoint=request.endpoint)
+        stats = current_stats()
+        if stats is not None:
+            record.update(stats.as_dict())
+    record.update({key: str(value) if isinstance(value, BaseException) else value
+                   for key, value in fields.items()})
+    logging.getLogger('fyyur').log(level, json.dumps(record, default=str), exc_info=exc_info)
+
+
+# ----------------------------------------------------------------------------#
+# SQL timing.
+# ----------------------------------------------------------------------------#
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _statement_started(conn, cursor, statement, parameters, context, executemany):
+    context._instrumentation_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _statement_finished(conn, cursor, statement, parameters, context, executemany):
+    stats = current_stats()
+    if stats is not None:
+        stats.add_statement(statement, time.perf_counter() - context._instrumentation_started)
+
+
+def record_pool_wait(elapsed):
+    stats = current_stats()
+    if stats is not None:
+        stats.pool_wait += elapsed
+
+
+# ----------------------------------------------------------------------------#
+# Flask hooks.
+# ----------------------------------------------------------------------------#
+
+def _render_started(app, template, context, **extra):
+    stats = current_stats()
+    if stats is not None:
+        stats._render_started.append(time.perf_counter())
+
+
+def _render_finished(app, template, context, **extra):
+    stats = current_stats()
+    if stats is not None and stats._render_started:
+        stats.render_time += time.perf_counter() - stats._render_started.pop()
+
+
+class Instrumentation:
+    """
+    Configuration:
+
+        SERVER_TIMING       add a Server-Timing header to responses (on)
+        SLOW_REQUEST_MS     log requests slower than this, 0 to log all (500)
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SERVER_TIMING', True)
+        app.config.setdefault('SLOW_REQUEST_MS', 500)
+        self.server_timing = app.config['SERVER_TIMING']
+        self.slow_request_ms = app.config['SLOW_REQUEST_MS']
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        before_render_template.connect(_render_started, app)
+        template_rendered.connect(_render_finished, app)
+        app.extensions['instrumentation'] = self
+
+    def _start(self):
+        g.request_stats = RequestStats()
+
+    def _finish(self, response):
+        stats = current_stats()
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats.started
+        endpoint = request.endpoint or 'unmatched'
+
+        request_duration.observe(elapsed, endpoint=endpoint, method=request.method,
+                                 status=str(response.status_code))
+        sql_statements.observe(stats.sql_count, endpoint=endpoint)
+        sql_duration.observe(stats.sql_time, endpoint=endpoint)
+        render_duration.observe(stats.render_time, endpoint=endpoint)
+        pool_wait_duration.observe(stats.pool_wait, endpoint=endpoint)
+
+        if self.server_timing:
+            response.headers.add('Server-Timing', ', '.join([
+                f'sql;dur={stats.sql_time * 1000:.2f};desc="{stats.sql_count} statements"',
+                f'sql-slowest;dur={stats.slowest_time * 1000:.2f}',
+                f'render;dur={stats.render_time * 1000:.2f}',
+                f'pool;dur={stats.pool_wait * 1000:.2f}',
+                f'app;dur={elapsed * 1000:.2f}',
+            ]))
+        if elapsed * 1000 >= self.slow_request_ms:
+            log_event('slow_request', logging.WARNING, status=response.status_code)
+        return response
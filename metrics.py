@@ -0,0 +1,107 @@
+import threading
+from bisect import bisect_left
+
+
+# ----------------------------------------------------------------------------#
+# Process-local metrics in the Prometheus text exposition format.
+#
+# Under gunicorn each worker keeps its own, and /metrics answers with those
+# of whichever worker took the scrape; see the README's production notes.
+# ----------------------------------------------------------------------------#
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+_lock = threading.Lock()
+
+
+def _label_text(names, values, extra=''):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with _lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name + _label_text(self.labelnames, key), value
+
+
+class Gauge:
+    """A value read from ``getter`` at scrape time."""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, getter):
+        self.name = name
+        self.documentation = documentation
+        self.getter = getter
+
+    def samples(self):
+        yield self.name, self.getter()
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with _lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def samples(self):
+        with _lock:
+            series = {key: ([*counts], total) for key, (counts, total) in self._series.items()}
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield self.name + '_bucket' + _label_text(self.labelnames, key, f'le="{le}"'), cumulative
+            yield self.name + '_sum' + _label_text(self.labelnames, key), total
+            yield self.name + '_count' + _label_text(self.labelnames, key), cumulative
+
+
+def register(metric):
+    """Adds ``metric`` to the scrape, replacing one of the same name (from an app built again)."""
+    with _lock:
+        _registry[:] = [m for m in _registry if m.name != metric.name]
+        _registry.append(metric)
+    return metric
+
+
+def render():
+    """Returns every registered metric in the Prometheus text format."""
+    lines = []
+    for metric in list(_registry):
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for name, value in metric.samples():
+            lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
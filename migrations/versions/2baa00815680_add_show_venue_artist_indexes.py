@@ -0,0 +1,48 @@
+"""Add indexes for show, venue and artist access paths.
+
+Revision ID: 2baa00815680
+Revises: 56c0bbc8e79d
+Create Date: 2026-10-17 09:12:41.503112
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2baa00815680'
+down_revision = '56c0bbc8e79d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('show', schema=None) as batch_op:
+        batch_op.create_index('ix_show_venue_id_start_time', ['venue_id', 'start_time'], unique=False)
+        batch_op.create_index('ix_show_artist_id_start_time', ['artist_id', 'start_time'], unique=False)
+        batch_op.create_index('ix_show_start_time_id', ['start_time', 'id'], unique=False)
+
+    with op.batch_alter_table('venue', schema=None) as batch_op:
+        batch_op.create_index('ix_venue_state_city', ['state', 'city', 'id'], unique=False)
+
+    # Trigram indexes let name.ilike('%term%') use an index scan. They only
+    # exist on PostgreSQL; other backends keep a plain index on name.
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_venue_name_trgm', 'venue', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_artist_name_trgm', 'artist', ['name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_artist_name_trgm', table_name='artist')
+    op.drop_index('ix_venue_name_trgm', table_name='venue')
+
+    with op.batch_alter_table('venue', schema=None) as batch_op:
+        batch_op.drop_index('ix_venue_state_city')
+
+    with op.batch_alter_table('show', schema=None) as batch_op:
+        batch_op.drop_index('ix_show_start_time_id')
+        batch_op.drop_index('ix_show_artist_id_start_time')
+        batch_op.drop_index('ix_show_venue_id_start_time')
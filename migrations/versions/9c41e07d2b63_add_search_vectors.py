@@ -0,0 +1,89 @@
+"""Add full-text search vectors to venue and artist.
+
+Revision ID: 9c41e07d2b63
+Revises: 2baa00815680
+Create Date: 2026-10-17 11:40:07.218764
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '9c41e07d2b63'
+down_revision = '2baa00815680'
+branch_labels = None
+depends_on = None
+
+
+# Name is weighted 'A', every other searchable field 'B'. search.SEARCH_FIELDS
+# applies the same weights in the in-process fallback index.
+VENUE_TRIGGER = """
+CREATE OR REPLACE FUNCTION venue_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.city, '') || ' ' ||
+                                        coalesce(NEW.state, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER venue_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, city, state ON venue
+    FOR EACH ROW EXECUTE FUNCTION venue_search_vector_update();
+"""
+
+ARTIST_TRIGGER = """
+CREATE OR REPLACE FUNCTION artist_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.city, '') || ' ' ||
+                                        coalesce(NEW.state, '') || ' ' ||
+                                        coalesce(NEW.genres, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER artist_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, city, state, genres ON artist
+    FOR EACH ROW EXECUTE FUNCTION artist_search_vector_update();
+"""
+
+
+def upgrade():
+    is_postgresql = op.get_bind().dialect.name == 'postgresql'
+    vector_type = sa.Text().with_variant(postgresql.TSVECTOR(), 'postgresql')
+
+    for table in ('venue', 'artist'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('search_vector', vector_type, nullable=True))
+
+    if is_postgresql:
+        op.execute(VENUE_TRIGGER)
+        op.execute(ARTIST_TRIGGER)
+        # Fire the triggers once to backfill existing rows.
+        op.execute('UPDATE venue SET name = name')
+        op.execute('UPDATE artist SET name = name')
+
+    op.create_index('ix_venue_search_vector', 'venue', ['search_vector'], unique=False,
+                    postgresql_using='gin')
+    op.create_index('ix_artist_search_vector', 'artist', ['search_vector'], unique=False,
+                    postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_artist_search_vector', table_name='artist')
+    op.drop_index('ix_venue_search_vector', table_name='venue')
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP TRIGGER IF EXISTS artist_search_vector_trigger ON artist')
+        op.execute('DROP TRIGGER IF EXISTS venue_search_vector_trigger ON venue')
+        op.execute('DROP FUNCTION IF EXISTS artist_search_vector_update()')
+        op.execute('DROP FUNCTION IF EXISTS venue_search_vector_update()')
+
+    for table in ('artist', 'venue'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('search_vector')
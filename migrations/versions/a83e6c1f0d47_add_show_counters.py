@@ -0,0 +1,64 @@
+"""Add denormalized upcoming/past show counters.
+
+Revision ID: a83e6c1f0d47
+Revises: d5f1a7c3e9b2
+Create Date: 2026-10-17 14:26:18.552390
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a83e6c1f0d47'
+down_revision = 'd5f1a7c3e9b2'
+branch_labels = None
+depends_on = None
+
+
+show = sa.table(
+    'show',
+    sa.column('id', sa.Integer),
+    sa.column('venue_id', sa.Integer),
+    sa.column('artist_id', sa.Integer),
+    sa.column('start_time', sa.DateTime),
+)
+
+
+def upgrade():
+    for table in ('venue', 'artist'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+            batch_op.add_column(sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+
+    state = op.create_table('show_counter_state',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('swept_until', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    # Backfill as of now; `flask counters sweep` rolls forward from here.
+    now = datetime.now()
+    op.bulk_insert(state, [{'id': 1, 'swept_until': now}])
+    for table, key in (('venue', 'venue_id'), ('artist', 'artist_id')):
+        owner = sa.table(table, sa.column('id', sa.Integer),
+                         sa.column('upcoming_shows_count', sa.Integer),
+                         sa.column('past_shows_count', sa.Integer))
+        owned = show.c[key] == owner.c.id
+        op.execute(owner.update().values(
+            upcoming_shows_count=sa.select(sa.func.count(show.c.id))
+            .where(owned, show.c.start_time > now).scalar_subquery(),
+            past_shows_count=sa.select(sa.func.count(show.c.id))
+            .where(owned, show.c.start_time <= now).scalar_subquery(),
+        ))
+
+
+def downgrade():
+    op.drop_table('show_counter_state')
+
+    for table in ('artist', 'venue'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('past_shows_count')
+            batch_op.drop_column('upcoming_shows_count')
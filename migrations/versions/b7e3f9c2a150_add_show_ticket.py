@@ -0,0 +1,35 @@
+"""Add show_ticket for the show ingest queue.
+
+Revision ID: b7e3f9c2a150
+Revises: f2c8a5e1b7d4
+Create Date: 2026-10-17 18:03:52.740117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e3f9c2a150'
+down_revision = 'f2c8a5e1b7d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('show_ticket',
+    sa.Column('ticket', sa.String(length=32), nullable=False),
+    sa.Column('show_id', sa.Integer(), nullable=True),
+    sa.Column('error', sa.String(length=500), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('ticket')
+    )
+    with op.batch_alter_table('show_ticket', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_show_ticket_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('show_ticket', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_show_ticket_created_at'))
+
+    op.drop_table('show_ticket')
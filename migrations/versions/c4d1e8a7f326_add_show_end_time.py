@@ -0,0 +1,97 @@
+"""Add show.end_time and forbid double-booking venues and artists.
+
+Revision ID: c4d1e8a7f326
+Revises: b7e3f9c2a150
+Create Date: 2026-10-17 19:20:31.905364
+
+"""
+from datetime import timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d1e8a7f326'
+down_revision = 'b7e3f9c2a150'
+branch_labels = None
+depends_on = None
+
+
+DEFAULT_SHOW_DURATION = timedelta(hours=2)
+
+show = sa.table(
+    'show',
+    sa.column('id', sa.Integer),
+    sa.column('venue_id', sa.Integer),
+    sa.column('artist_id', sa.Integer),
+    sa.column('start_time', sa.DateTime),
+    sa.column('end_time', sa.DateTime),
+)
+
+
+def _backfill_postgresql():
+    op.execute(f"""
+        UPDATE show SET end_time = LEAST(
+            show.start_time + interval '{int(DEFAULT_SHOW_DURATION.total_seconds())} seconds',
+            next.at_venue, next.by_artist)
+        FROM (
+            SELECT id,
+                   lead(start_time) OVER (PARTITION BY venue_id ORDER BY start_time, id) AS at_venue,
+                   lead(start_time) OVER (PARTITION BY artist_id ORDER BY start_time, id) AS by_artist
+            FROM show
+        ) AS next
+        WHERE next.id = show.id
+    """)
+
+
+def _backfill(connection):
+    rows = connection.execute(
+        sa.select(show.c.id, show.c.venue_id, show.c.artist_id, show.c.start_time)
+        .order_by(show.c.start_time.desc(), show.c.id.desc())
+    ).all()
+    next_at_venue, next_by_artist, ends = {}, {}, []
+    for id, venue_id, artist_id, start_time in rows:
+        end_time = min(filter(None, (start_time + DEFAULT_SHOW_DURATION,
+                                     next_at_venue.get(venue_id), next_by_artist.get(artist_id))))
+        next_at_venue[venue_id] = next_by_artist[artist_id] = start_time
+        ends.append({'show_id': id, 'end_time': end_time})
+    if ends:
+        connection.execute(
+            show.update().where(show.c.id == sa.bindparam('show_id')).values(end_time=sa.bindparam('end_time')),
+            ends,
+        )
+
+
+def upgrade():
+    with op.batch_alter_table('show', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('end_time', sa.DateTime(), nullable=True))
+
+    # Existing shows last the default duration, cut short by the next show
+    # at the same venue or by the same artist, so none overlap. Shows that
+    # start together end up empty, which overlaps nothing.
+    connection = op.get_bind()
+    if connection.dialect.name == 'postgresql':
+        _backfill_postgresql()
+    else:
+        _backfill(connection)
+
+    with op.batch_alter_table('show', schema=None) as batch_op:
+        batch_op.alter_column('end_time', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_check_constraint('ck_show_end_time', 'end_time >= start_time')
+
+    if connection.dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        for key in ('venue', 'artist'):
+            op.execute(f'ALTER TABLE show ADD CONSTRAINT ex_show_{key}_overlap '
+                       f'EXCLUDE USING gist ({key}_id WITH =, tsrange(start_time, end_time) WITH &&)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for key in ('artist', 'venue'):
+            op.execute(f'ALTER TABLE show DROP CONSTRAINT ex_show_{key}_overlap')
+
+    with op.batch_alter_table('show', schema=None) as batch_op:
+        batch_op.drop_constraint('ck_show_end_time', type_='check')
+        batch_op.drop_column('end_time')
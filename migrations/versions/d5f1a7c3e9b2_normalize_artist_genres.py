@@ -0,0 +1,149 @@
+"""Move artist genres into an artist_genre table.
+
+Revision ID: d5f1a7c3e9b2
+Revises: 9c41e07d2b63
+Create Date: 2026-10-17 13:02:55.870431
+
+"""
+import ast
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5f1a7c3e9b2'
+down_revision = '9c41e07d2b63'
+branch_labels = None
+depends_on = None
+
+
+artist = sa.table(
+    'artist',
+    sa.column('id', sa.Integer),
+    sa.column('genres', sa.String),
+)
+artist_genre = sa.table(
+    'artist_genre',
+    sa.column('artist_id', sa.Integer),
+    sa.column('genre', sa.String),
+)
+
+# Genres now live in artist_genre, so the artist vector aggregates them and a
+# trigger on artist_genre touches the parent row to refresh it.
+ARTIST_TRIGGER = """
+CREATE OR REPLACE FUNCTION artist_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.city, '') || ' ' ||
+                                        coalesce(NEW.state, '') || ' ' ||
+                                        coalesce((SELECT string_agg(genre, ' ')
+                                                  FROM artist_genre
+                                                  WHERE artist_id = NEW.id), '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS artist_search_vector_trigger ON artist;
+CREATE TRIGGER artist_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, city, state ON artist
+    FOR EACH ROW EXECUTE FUNCTION artist_search_vector_update();
+
+CREATE OR REPLACE FUNCTION artist_genre_touch_artist() RETURNS trigger AS $$
+BEGIN
+    UPDATE artist SET name = name
+    WHERE id = CASE WHEN TG_OP = 'DELETE' THEN OLD.artist_id ELSE NEW.artist_id END;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER artist_genre_touch_artist_trigger
+    AFTER INSERT OR UPDATE OR DELETE ON artist_genre
+    FOR EACH ROW EXECUTE FUNCTION artist_genre_touch_artist();
+"""
+
+PREVIOUS_ARTIST_TRIGGER = """
+DROP TRIGGER IF EXISTS artist_genre_touch_artist_trigger ON artist_genre;
+DROP FUNCTION IF EXISTS artist_genre_touch_artist();
+
+CREATE OR REPLACE FUNCTION artist_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.city, '') || ' ' ||
+                                        coalesce(NEW.state, '') || ' ' ||
+                                        coalesce(NEW.genres, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS artist_search_vector_trigger ON artist;
+CREATE TRIGGER artist_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, city, state, genres ON artist
+    FOR EACH ROW EXECUTE FUNCTION artist_search_vector_update();
+"""
+
+
+def _parse_genres(value):
+    """Reads the str(list) format the old create_artist_submission stored."""
+    if not value:
+        return []
+    try:
+        genres = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        genres = value.split(',')
+    if isinstance(genres, str):
+        genres = [genres]
+    return sorted({str(genre).strip() for genre in genres if str(genre).strip()})
+
+
+def upgrade():
+    op.create_table('artist_genre',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('genre', sa.String(length=120), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['artist.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('artist_id', 'genre')
+    )
+    op.create_index('ix_artist_genre_genre_artist_id', 'artist_genre', ['genre', 'artist_id'], unique=False)
+
+    connection = op.get_bind()
+    rows = [
+        {'artist_id': row.id, 'genre': genre}
+        for row in connection.execute(sa.select(artist.c.id, artist.c.genres))
+        for genre in _parse_genres(row.genres)
+    ]
+    if rows:
+        op.bulk_insert(artist_genre, rows)
+
+    if connection.dialect.name == 'postgresql':
+        op.execute(ARTIST_TRIGGER)
+
+    with op.batch_alter_table('artist', schema=None) as batch_op:
+        batch_op.drop_column('genres')
+
+    if connection.dialect.name == 'postgresql':
+        op.execute('UPDATE artist SET name = name')
+
+
+def downgrade():
+    with op.batch_alter_table('artist', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('genres', sa.String(length=120), nullable=True))
+
+    connection = op.get_bind()
+    genres = {}
+    for row in connection.execute(sa.select(artist_genre.c.artist_id, artist_genre.c.genre)):
+        genres.setdefault(row.artist_id, []).append(row.genre)
+    for artist_id, names in genres.items():
+        connection.execute(
+            artist.update().where(artist.c.id == artist_id).values(genres=str(sorted(names)))
+        )
+
+    if connection.dialect.name == 'postgresql':
+        op.execute(PREVIOUS_ARTIST_TRIGGER)
+
+    op.drop_index('ix_artist_genre_genre_artist_id', table_name='artist_genre')
+    op.drop_table('artist_genre')
+
+    if connection.dialect.name == 'postgresql':
+        op.execute('UPDATE artist SET name = name')
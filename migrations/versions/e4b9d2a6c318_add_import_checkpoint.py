@@ -0,0 +1,29 @@
+"""Add import_checkpoint for resumable bulk imports.
+
+Revision ID: e4b9d2a6c318
+Revises: a83e6c1f0d47
+Create Date: 2026-10-17 16:02:41.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b9d2a6c318'
+down_revision = 'a83e6c1f0d47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('import_checkpoint',
+    sa.Column('source', sa.String(length=1000), nullable=False),
+    sa.Column('records_done', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('source')
+    )
+
+
+def downgrade():
+    op.drop_table('import_checkpoint')
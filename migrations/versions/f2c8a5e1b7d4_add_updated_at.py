@@ -0,0 +1,39 @@
+"""Add updated_at to venue, artist and show.
+
+Revision ID: f2c8a5e1b7d4
+Revises: e4b9d2a6c318
+Create Date: 2026-10-17 17:12:09.381526
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c8a5e1b7d4'
+down_revision = 'e4b9d2a6c318'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('venue', 'artist', 'show')
+
+
+def upgrade():
+    # Backfilled from the app's clock, which writes use from now on.
+    now = datetime.now()
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute(sa.table(table, sa.column('updated_at', sa.DateTime)).update().values(updated_at=now))
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False,
+                                  server_default=sa.func.now())
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('updated_at')
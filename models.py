@@ -1,3 +1,7 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy.dialects.postgresql import ExcludeConstraint, TSVECTOR
+from sqlalchemy.ext.associationproxy import association_proxy
 from config import db
 
 
@@ -6,6 +10,12 @@ from config import db
 # ----------------------------------------------------------------------------#
 class Venue(db.Model):
     __tablename__ = 'venue'
+    __table_args__ = (
+        db.Index('ix_venue_state_city', 'state', 'city', 'id'),
+        db.Index('ix_venue_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_venue_search_vector', 'search_vector', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -18,24 +28,65 @@ class Venue(db.Model):
     website_link = db.Column(db.String(255))
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
+    # Maintained by counters.py, see ShowCounterState.
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now,
+                           server_default=db.func.now())
+    # Maintained by a database trigger on PostgreSQL, unused elsewhere.
+    search_vector = db.deferred(db.Column(db.Text().with_variant(TSVECTOR(), 'postgresql')))
     shows = db.relationship('Show', backref='venue', lazy=True)
 
 
 class Artist(db.Model):
     __tablename__ = 'artist'
+    __table_args__ = (
+        db.Index('ix_artist_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_artist_search_vector', 'search_vector', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website_link = db.Column(db.String(255))
     seeking_venue = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
+    # Maintained by counters.py, see ShowCounterState.
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now,
+                           server_default=db.func.now())
+    # Maintained by a database trigger on PostgreSQL, unused elsewhere.
+    search_vector = db.deferred(db.Column(db.Text().with_variant(TSVECTOR(), 'postgresql')))
     shows = db.relationship('Show', backref='artist', lazy=True)
+    genre_rows = db.relationship('ArtistGenre', cascade='all, delete-orphan',
+                                 order_by='ArtistGenre.genre', lazy=True)
+    genres = association_proxy('genre_rows', 'genre',
+                               creator=lambda genre: ArtistGenre(genre=genre))
+
+
+class ArtistGenre(db.Model):
+    __tablename__ = 'artist_genre'
+    __table_args__ = (
+        db.Index('ix_artist_genre_genre_artist_id', 'genre', 'artist_id'),
+    )
+    artist_id = db.Column(db.Integer, db.ForeignKey('artist.id', ondelete='CASCADE'), primary_key=True)
+    genre = db.Column(db.String(120), primary_key=True)
+
+
+# Shows without an end time last DEFAULT_SHOW_DURATION; none may last longer
+# than MAX_SHOW_DURATION (see booking.py).
+DEFAULT_SHOW_DURATION = timedelta(hours=2)
+MAX_SHOW_DURATION = timedelta(hours=24)
+
+
+def _default_end_time(context):
+    return context.get_current_parameters()['start_time'] + DEFAULT_SHOW_DURATION
 
 
 class Show(db.Model):
@@ -44,3 +95,60 @@ class Show(db.Model):
     artist_id = db.Column(db.Integer, db.ForeignKey('artist.id'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False, default=_default_end_time)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now,
+                           server_default=db.func.now())
+
+    __table_args__ = (
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_show_start_time_id', 'start_time', 'id'),
+        db.CheckConstraint('end_time >= start_time', name='ck_show_end_time'),
+        # No venue or artist booked twice at once; needs the btree_gist extension.
+        ExcludeConstraint(
+            (venue_id, '='), (db.func.tsrange(start_time, end_time), '&&'),
+            name='ex_show_venue_overlap', using='gist',
+        ).ddl_if(dialect='postgresql'),
+        ExcludeConstraint(
+            (artist_id, '='), (db.func.tsrange(start_time, end_time), '&&'),
+            name='ex_show_artist_overlap', using='gist',
+        ).ddl_if(dialect='postgresql'),
+    )
+
+
+db.event.listen(Show.__table__, 'before_create',
+                db.DDL('CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql'))
+# The name_trgm indexes of venue and artist use pg_trgm's operator classes.
+for _table in (Venue.__table__, Artist.__table__):
+    db.event.listen(_table, 'before_create',
+                    db.DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
+
+class ShowCounterState(db.Model):
+    """
+    Single-row table holding the instant the show counters are accurate for.
+    A show counts as upcoming while its start_time is after swept_until.
+    """
+    __tablename__ = 'show_counter_state'
+    id = db.Column(db.Integer, primary_key=True)
+    swept_until = db.Column(db.DateTime, nullable=False)
+
+
+class ImportCheckpoint(db.Model):
+    """How many records of a bulk import file have been committed."""
+    __tablename__ = 'import_checkpoint'
+    source = db.Column(db.String(1000), primary_key=True)
+    records_done = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+
+class ShowTicket(db.Model):
+    """
+    Outcome of a show submitted in ingest mode (see ingest.py): the show
+    it became, or why it was rejected.
+    """
+    __tablename__ = 'show_ticket'
+    ticket = db.Column(db.String(32), primary_key=True)
+    show_id = db.Column(db.Integer)
+    error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
@@ -0,0 +1,174 @@
+import base64
+import json
+from datetime import datetime
+
+from flask import abort, current_app, request
+from sqlalchemy import tuple_
+
+
+# ----------------------------------------------------------------------------#
+# Keyset pagination.
+# ----------------------------------------------------------------------------#
+
+class Page:
+    """One page of rows plus the opaque cursors to its neighbours."""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and 'dt' in value:
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+
+def encode_cursor(values, direction='next'):
+    """Packs the sort key of a boundary row into an opaque url-safe token."""
+    payload = json.dumps({'d': direction, 'k': [_encode_value(v) for v in values]},
+                         separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+SCALARS = (str, int, float, bool, type(None), datetime)
+
+
+def decode_cursor(cursor, width=None):
+    """
+    Reverses encode_cursor. Raises ValueError if the token was tampered with,
+    or doesn't hold ``width`` key values when ``width`` is given.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction = payload['d']
+        values = [_decode_value(v) for v in payload['k']]
+    except (TypeError, KeyError, ValueError) as e:
+        raise ValueError(f'Invalid cursor: {cursor!r}') from e
+    if direction not in ('next', 'prev'):
+        raise ValueError(f'Invalid cursor direction: {direction!r}')
+    if not all(isinstance(v, SCALARS) for v in values):
+        raise ValueError(f'Invalid cursor key: {values!r}')
+    if width is not None and len(values) != width:
+        raise ValueError(f'Cursor key has {len(values)} values, expected {width}')
+    return direction, values
+
+
+def _seek(cursor, width):
+    """decode_cursor for a page being served: aborts with 400 on a bad cursor."""
+    if not cursor:
+        return 'next', None
+    try:
+        return decode_cursor(cursor, width)
+    except ValueError:
+        abort(400)
+
+
+def page_args(default_per_page=None):
+    """
+    Reads ``cursor`` and ``per_page`` from the current request, clamping the
+    page size to MAX_PAGE_SIZE. Aborts with 400 on a malformed cursor.
+    """
+    per_page = (request.values.get('per_page', type=int)
+                or default_per_page or current_app.config['PAGE_SIZE'])
+    per_page = max(1, min(per_page, current_app.config['MAX_PAGE_SIZE']))
+    cursor = request.values.get('cursor') or None
+    if cursor is not None:
+        try:
+            decode_cursor(cursor)
+        except ValueError:
+            abort(400)
+    return cursor, per_page
+
+
+def _fits(value, key):
+    """Whether a cursor value can be compared with column ``key``."""
+    try:
+        python_type = key.type.python_type
+    except NotImplementedError:
+        return True
+    if python_type is float:
+        python_type = (int, float)
+    return value is None or isinstance(value, python_type)
+
+
+def _page(rows, per_page, backwards, seeked, key_of):
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, seeked
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if has_next:
+            next_cursor = encode_cursor(key_of(rows[-1]), 'next')
+        if has_prev:
+            prev_cursor = encode_cursor(key_of(rows[0]), 'prev')
+    return Page(rows, next_cursor, prev_cursor)
+
+
+def paginate(query, keys, cursor=None, per_page=20, descending=False):
+    """
+    Returns a Page of ``query`` ordered by ``keys`` and starting after (or,
+    for a ``prev`` cursor, ending before) the row the cursor points at.
+
+    ``keys`` must be columns selected by the query whose combined values are
+    unique, e.g. ``(Show.start_time, Show.id)``. Seeking is done with a
+    row-value comparison on the key, so every page costs one index range
+    scan no matter how deep it is, unlike OFFSET.
+    """
+    direction, values = _seek(cursor, len(keys))
+    if values is not None and not all(map(_fits, values, keys)):
+        abort(400)
+    # Walking backwards is the same scan with the ordering flipped.
+    backwards = direction == 'prev'
+    reverse = descending != backwards
+
+    if values is not None:
+        row_key = tuple_(*keys)
+        query = query.filter(row_key < tuple_(*values) if reverse else row_key > tuple_(*values))
+    query = query.order_by(*[key.desc() if reverse else key.asc() for key in keys])
+
+    rows = query.limit(per_page + 1).all()
+    return _page(rows, per_page, backwards, values is not None,
+                 lambda row: [getattr(row, key.key) for key in keys])
+
+
+def paginate_list(items, key, cursor=None, per_page=20, descending=False):
+    """
+    Same contract as paginate for an in-memory list that is already sorted
+    by ``key(item)`` (a tuple), descending if ``descending`` is set.
+    """
+    direction, values = _seek(cursor, len(key(items[0])) if items else None)
+    backwards = direction == 'prev'
+    reverse = descending != backwards
+
+    ordered = items[::-1] if backwards else items
+    if values is not None:
+        values = tuple(values)
+        try:
+            ordered = [item for item in ordered
+                       if (tuple(key(item)) < values if reverse else tuple(key(item)) > values)]
+        except TypeError:
+            # A key value of the wrong type, e.g. a string for an id.
+            abort(400)
+
+    return _page(list(ordered[:per_page + 1]), per_page, backwards, values is not None,
+                 lambda item: list(key(item)))
@@ -0,0 +1,135 @@
+from datetime import datetime
+
+from sqlalchemy import func
+
+from config import db
+from models import Venue, Artist, Show
+from pagination import paginate
+
+
+# ----------------------------------------------------------------------------#
+# Show queries shared by the HTML views and the JSON API.
+# ----------------------------------------------------------------------------#
+
+
+def split_shows(query, when, cursor=None, per_page=20):
+  """
+  Pages ``query`` (which must select Show.id and Show.start_time) through the
+  upcoming shows soonest first, or the past shows latest first.
+  """
+  now = datetime.now()
+  if when == 'upcoming':
+      return paginate(query.filter(Show.start_time > now),
+                      (Show.start_time, Show.id), cursor, per_page)
+  return paginate(query.filter(Show.start_time <= now),
+                  (Show.start_time, Show.id), cursor, per_page, descending=True)
+
+
+def venue_shows(venue_id, when, cursor=None, per_page=20):
+  query = (
+      db.session.query(
+          Show.id,
+          Show.start_time,
+          Show.artist_id,
+          Artist.name.label('artist_name'),
+          Artist.image_link.label('artist_image_link')
+      )
+      .join(Artist, Show.artist_id == Artist.id)
+      .filter(Show.venue_id == venue_id)
+  )
+  return split_shows(query, when, cursor, per_page)
+
+
+def artist_shows(artist_id, when, cursor=None, per_page=20):
+  query = (
+      db.session.query(
+          Show.id,
+          Show.start_time,
+          Show.venue_id,
+          Venue.name.label('venue_name'),
+          Venue.image_link.label('venue_image_link')
+      )
+      .join(Venue, Show.venue_id == Venue.id)
+      .filter(Show.artist_id == artist_id)
+  )
+  return split_shows(query, when, cursor, per_page)
+
+
+def show_counts(owner_column, owner_id):
+  """Counts upcoming and past shows for one venue or artist in one pass."""
+  now = datetime.now()
+  return (
+      db.session.query(
+          func.count(Show.id).filter(Show.start_time > now).label('upcoming'),
+          func.count(Show.id).filter(Show.start_time <= now).label('past')
+      )
+      .filter(owner_column == owner_id)
+      .one()
+  )
+
+
+def upcoming_shows_query():
+  """Upcoming shows with their venue and artist, for paginate() on (start_time, id)."""
+  return (
+      db.session.query(
+          Show.id,
+          Show.venue_id,
+          Venue.name.label('venue_name'),
+          Show.artist_id,
+          Artist.name.label('artist_name'),
+          Artist.image_link.label('artist_image_link'),
+          Show.start_time
+      )
+      .join(Artist, Show.artist_id == Artist.id)
+      .join(Venue, Show.venue_id == Venue.id)
+      .filter(Show.start_time > datetime.now())
+  )
+
+
+# ----------------------------------------------------------------------------#
+# Detail pages.
+# ----------------------------------------------------------------------------#
+
+
+def venue_details(venue, per_page):
+  """A venue with its first ``per_page`` upcoming and past shows and their counts."""
+  counts = show_counts(Show.venue_id, venue.id)
+  return {
+      'id': venue.id,
+      'name': venue.name,
+      'address': venue.address,
+      'city': venue.city,
+      'state': venue.state,
+      'phone': venue.phone,
+      'website': venue.website_link,
+      'facebook_link': venue.facebook_link,
+      'seeking_talent': venue.seeking_talent,
+      'seeking_description': venue.seeking_description,
+      'image_link': venue.image_link,
+      'past_shows': venue_shows(venue.id, 'past', per_page=per_page),
+      'upcoming_shows': venue_shows(venue.id, 'upcoming', per_page=per_page),
+      'past_shows_count': counts.past,
+      'upcoming_shows_count': counts.upcoming,
+  }
+
+
+def artist_details(artist, per_page):
+  """An artist with their first ``per_page`` upcoming and past shows and their counts."""
+  counts = show_counts(Show.artist_id, artist.id)
+  return {
+      'id': artist.id,
+      'name': artist.name,
+      'genres': list(artist.genres),
+      'city': artist.city,
+      'state': artist.state,
+      'phone': artist.phone,
+      'website': artist.website_link,
+      'facebook_link': artist.facebook_link,
+      'seeking_venue': artist.seeking_venue,
+      'seeking_description': artist.seeking_description,
+      'image_link': artist.image_link,
+      'past_shows': artist_shows(artist.id, 'past', per_page=per_page),
+      'upcoming_shows': artist_shows(artist.id, 'upcoming', per_page=per_page),
+      'past_shows_count': counts.past,
+      'upcoming_shows_count': counts.upcoming
+  }
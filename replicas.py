@@ -0,0 +1,158 @@
+import itertools
+import threading
+import time
+
+from flask import current_app, g, has_request_context, session as http_session
+from flask_sqlalchemy.session import Session as BaseSession
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import metrics
+from unit_of_work import is_read_only
+
+
+# ----------------------------------------------------------------------------#
+# Read-replica routing.
+#
+# Replicas are the SQLALCHEMY_BINDS whose key starts with ``replica``. A
+# read-only request (see unit_of_work) reads from one healthy replica, picked
+# round-robin when it first touches the database. Everything else, and every
+# flush, goes to the primary.
+#
+# A browser that just wrote reads from the primary for REPLICA_STICKY_SECONDS
+# afterwards, so the page a POST redirects to shows the change even if the
+# replicas haven't caught up yet. Replicas are probed at most every
+# REPLICA_HEALTH_INTERVAL seconds; one that can't be reached or that lags
+# more than REPLICA_MAX_LAG_SECONDS is skipped, and with none healthy reads
+# fall back to the primary.
+# ----------------------------------------------------------------------------#
+
+STICKY_KEY = '_read_primary_until'
+
+replica_reads = metrics.register(metrics.Counter(
+    'fyyur_db_replica_reads_total',
+    'Read-only requests by the engine they read from.',
+    ('target',),
+))
+
+
+class Replica:
+    def __init__(self, key, engine):
+        self.key = key
+        self.engine = engine
+        self.healthy = True
+        self.lag = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+        event.listen(engine, 'handle_error', self._failed)
+
+    def _failed(self, context):
+        if context.is_disconnect or context.connection is None:
+            self.healthy = False
+            self.checked_at = time.monotonic()
+
+    def probe(self, max_lag):
+        try:
+            with self.engine.connect() as connection:
+                if connection.dialect.name == 'postgresql':
+                    self.lag = connection.exec_driver_sql(
+                        'SELECT CASE WHEN pg_is_in_recovery() '
+                        'THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) '
+                        'ELSE 0 END'
+                    ).scalar()
+                else:
+                    connection.exec_driver_sql('SELECT 1')
+                    self.lag = 0
+            self.healthy = self.lag <= max_lag
+        except Exception:
+            self.healthy = False
+        self.checked_at = time.monotonic()
+
+    def is_healthy(self, interval, max_lag):
+        # One request re-probes a stale replica; the others go on with the
+        # last known state rather than queue behind it.
+        if time.monotonic() - self.checked_at >= interval and self._lock.acquire(blocking=False):
+            try:
+                self.probe(max_lag)
+            finally:
+                self._lock.release()
+        return self.healthy
+
+
+class ReplicaRouter:
+    """
+    Configuration:
+
+        SQLALCHEMY_BINDS            'replica*' keys are read replicas
+        REPLICA_STICKY_SECONDS      read from the primary this long after a write (10)
+        REPLICA_HEALTH_INTERVAL     seconds between replica probes (5)
+        REPLICA_MAX_LAG_SECONDS     skip replicas further behind than this (30)
+    """
+
+    def __init__(self, app=None, db=None):
+        self.db = db
+        self._replicas = None
+        self._turn = itertools.count()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.db = db
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 10)
+        app.config.setdefault('REPLICA_HEALTH_INTERVAL', 5)
+        app.config.setdefault('REPLICA_MAX_LAG_SECONDS', 30)
+        self.sticky_seconds = app.config['REPLICA_STICKY_SECONDS']
+        self.health_interval = app.config['REPLICA_HEALTH_INTERVAL']
+        self.max_lag = app.config['REPLICA_MAX_LAG_SECONDS']
+        self.keys = sorted(key for key in app.config.get('SQLALCHEMY_BINDS') or {}
+                           if key.startswith('replica'))
+        # Built from this app's engines on first use.
+        self._replicas = None
+        app.after_request(self._stick_after_write)
+        app.extensions['replicas'] = self
+
+    @property
+    def replicas(self):
+        if self._replicas is None:
+            self._replicas = [Replica(key, self.db.engines[key]) for key in self.keys]
+        return self._replicas
+
+    def healthy(self):
+        return [replica for replica in self.replicas
+                if replica.is_healthy(self.health_interval, self.max_lag)]
+
+    def read_engine(self):
+        """The engine the running request reads from, or None for the primary."""
+        if 'read_engine' in g:
+            return g.read_engine
+        engine = None
+        if self.keys and is_read_only() and http_session.get(STICKY_KEY, 0) < time.time():
+            candidates = self.healthy()
+            if candidates:
+                engine = candidates[next(self._turn) % len(candidates)].engine
+        replica_reads.inc(target='primary' if engine is None else 'replica')
+        g.read_engine = engine
+        return engine
+
+    def _stick_after_write(self, response):
+        if self.keys and g.get('wrote'):
+            http_session[STICKY_KEY] = time.time() + self.sticky_seconds
+        return response
+
+
+class RoutingSession(BaseSession):
+    """Sends the reads of read-only requests to a replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context():
+            router = current_app.extensions.get('replicas')
+            engine = router.read_engine() if router is not None else None
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(Session, 'after_commit')
+def _note_write(session):
+    if has_request_context() and not is_read_only():
+        g.wrote = True
@@ -0,0 +1,212 @@
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import namedtuple
+
+from sqlalchemy import event, func, literal, true
+from sqlalchemy.orm import Session, selectinload
+
+from config import db
+from models import Venue, Artist
+from pagination import paginate, paginate_list
+
+
+# ----------------------------------------------------------------------------#
+# Full-text search.
+#
+# On PostgreSQL venues and artists carry a trigger-maintained ``search_vector``
+# tsvector with a GIN index. Every search term is matched as a prefix
+# (``term:*``) and results are ordered by ts_rank. Other backends, such as
+# SQLite in local test runs, use an in-process inverted index with the same
+# matching and weighting rules.
+# ----------------------------------------------------------------------------#
+
+# Field weights, mirroring the setweight() labels used by the triggers in
+# migration 9c41e07d2b63.
+SEARCH_FIELDS = {
+    Venue: {'A': ('name',), 'B': ('city', 'state')},
+    Artist: {'A': ('name',), 'B': ('city', 'state', 'genres')},
+}
+WEIGHTS = {'A': 1.0, 'B': 0.4}
+
+Hit = namedtuple('Hit', 'rank id')
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Splits text into lowercase word tokens, as to_tsvector('simple') does."""
+    if not text:
+        return []
+    if not isinstance(text, str):
+        text = ' '.join(text)
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _tsquery(tokens):
+    # Tokens are plain \w+ runs, so they can't smuggle in tsquery operators.
+    return func.to_tsquery('simple', ' & '.join(f'{token}:*' for token in tokens))
+
+
+class FallbackIndex:
+    """
+    In-process inverted index over the searchable fields of one model.
+
+    Tokens are kept in a sorted array so a prefix lookup is a bisect plus a
+    short scan. The index is built lazily on the first search and then kept
+    in step with committed writes by the session hooks below.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.fields = SEARCH_FIELDS[model]
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._docs = {}
+        self._postings = {}
+        self._tokens = []
+
+    def _document(self, values):
+        doc = {}
+        for label, fields in self.fields.items():
+            for field in fields:
+                for token in tokenize(values.get(field)):
+                    doc[token] = max(doc.get(token, 0.0), WEIGHTS[label])
+        return doc
+
+    def _add(self, id, values):
+        doc = self._document(values)
+        self._docs[id] = doc
+        for token, weight in doc.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                insort(self._tokens, token)
+            postings[id] = weight
+
+    def _remove(self, id):
+        for token in self._docs.pop(id, {}):
+            postings = self._postings[token]
+            del postings[id]
+            if not postings:
+                del self._postings[token]
+                del self._tokens[bisect_left(self._tokens, token)]
+
+    def values(self, obj):
+        return {field: getattr(obj, field) for fields in self.fields.values() for field in fields}
+
+    def _load(self):
+        query = db.session.query(self.model)
+        if self.model is Artist:
+            query = query.options(selectinload(Artist.genre_rows))
+        for obj in query:
+            self._add(obj.id, self.values(obj))
+        self._loaded = True
+
+    def update(self, id, values):
+        with self._lock:
+            if self._loaded:
+                self._remove(id)
+                if values is not None:
+                    self._add(id, values)
+
+    def reset(self):
+        """Drops the index so the next search rebuilds it from the table."""
+        with self._lock:
+            self._loaded = False
+            self._docs, self._postings, self._tokens = {}, {}, []
+
+    def _matches(self, prefix):
+        """Best weight per id over all indexed tokens starting with ``prefix``."""
+        matches = {}
+        i = bisect_left(self._tokens, prefix)
+        while i < len(self._tokens) and self._tokens[i].startswith(prefix):
+            token = self._tokens[i]
+            # Whole-word hits outrank prefix hits of the same field.
+            scale = 1.0 if token == prefix else 0.9
+            for id, weight in self._postings[token].items():
+                matches[id] = max(matches.get(id, 0.0), weight * scale)
+            i += 1
+        return matches
+
+    def search(self, tokens):
+        """Returns every Hit matching all tokens, best first."""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if not tokens:
+                return [Hit(0.0, id) for id in sorted(self._docs, reverse=True)]
+            scores = None
+            for token in tokens:
+                matches = self._matches(token)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {id: score + matches[id] for id, score in scores.items() if id in matches}
+                if not scores:
+                    return []
+        return sorted((Hit(score, id) for id, score in scores.items()), reverse=True)
+
+
+_fallback_indexes = {model: FallbackIndex(model) for model in SEARCH_FIELDS}
+
+
+def reindex(model):
+    """
+    Drops ``model``'s fallback index, to be rebuilt on the next search. Bulk
+    writers that bypass the session must call this after committing.
+    """
+    _fallback_indexes[model].reset()
+
+
+def search(model, term, cursor=None, per_page=20):
+    """
+    Runs a ranked prefix search over ``model`` and returns ``(page, total)``,
+    where ``page`` is a Page of rows with ``id`` and ``rank`` attributes,
+    best match first.
+    """
+    tokens = tokenize(term)
+
+    if db.engine.dialect.name != 'postgresql':
+        hits = _fallback_indexes[model].search(tokens)
+        return paginate_list(hits, lambda hit: hit, cursor, per_page, descending=True), len(hits)
+
+    if tokens:
+        tsquery = _tsquery(tokens)
+        rank = func.ts_rank(model.search_vector, tsquery).label('rank')
+        match = model.search_vector.op('@@')(tsquery)
+    else:
+        rank = literal(0.0).label('rank')
+        match = true()
+
+    query = db.session.query(rank, model.id).filter(match)
+    page = paginate(query, (rank, model.id), cursor, per_page, descending=True)
+    total = db.session.query(func.count(model.id)).filter(match).scalar()
+    return page, total
+
+
+# ----------------------------------------------------------------------------#
+# Keep the fallback indexes in step with committed writes.
+# ----------------------------------------------------------------------------#
+
+@event.listens_for(Session, 'after_flush')
+def _collect_search_changes(session, flush_context):
+    pending = session.info.setdefault('search_changes', {})
+    for obj in session.new | session.dirty:
+        index = _fallback_indexes.get(type(obj))
+        if index is not None:
+            pending[(type(obj), obj.id)] = index.values(obj)
+    for obj in session.deleted:
+        if type(obj) in _fallback_indexes:
+            pending[(type(obj), obj.id)] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_search_changes(session):
+    for (model, id), values in session.info.pop('search_changes', {}).items():
+        _fallback_indexes[model].update(id, values)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_search_changes(session):
+    session.info.pop('search_changes', None)
@@ -2,3 +2,40 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// "Load more" on venue and artist pages: swap the button's wrapper for the
+// next tiles, which carry their own button when there are more to fetch.
+document.addEventListener('click', function (e) {
+  var button = e.target.closest('.load-more button');
+  if (!button) return;
+  e.preventDefault();
+  button.disabled = true;
+  fetch(button.getAttribute('data-url'))
+    .then(function (response) { return response.text(); })
+    .then(function (html) { button.parentElement.outerHTML = html; });
+});
+
+// Venue and artist pickers on the show form: typing a name fills the input's
+// datalist with matches from /typeahead, each offering its id as the value.
+var typeaheadTimer;
+document.addEventListener('input', function (e) {
+  var input = e.target;
+  var url = input.getAttribute && input.getAttribute('data-typeahead');
+  if (!url || /^\d*$/.test(input.value.trim())) return;
+  clearTimeout(typeaheadTimer);
+  typeaheadTimer = setTimeout(function () {
+    fetch(url + '&q=' + encodeURIComponent(input.value))
+      .then(function (response) { return response.json(); })
+      .then(function (data) {
+        var list = document.getElementById(input.getAttribute('list'));
+        list.innerHTML = '';
+        data.results.forEach(function (result) {
+          var option = document.createElement('option');
+          option.value = result.id;
+          option.label = result.name;
+          option.textContent = result.name;
+          list.appendChild(option);
+        });
+      });
+  }, 100);
+});
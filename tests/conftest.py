@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pytest
+
+# config.py reads the database URL when it is imported.
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('SECRET_KEY', 'test')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search
+import typeahead
+from app import create_app
+from config import db
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Builds an app on a fresh SQLite database in ``tmp_path``, with ``settings`` on top."""
+    def make(**settings):
+        app = create_app(**{
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "fyyur.db"}',
+            'SQLALCHEMY_ENGINE_OPTIONS': {},
+            'CACHE_BACKEND': 'null',
+            'TEMPLATE_CACHE_DIR': None,
+            'THUMBNAIL_CACHE_DIR': str(tmp_path / 'thumbnails'),
+            **settings,
+        })
+        # The search and typeahead indexes outlive an app; start each test empty.
+        for index in [*search._fallback_indexes.values(), *typeahead._indexes.values()]:
+            index.reset()
+        return app
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    with app.app_context():
+        # The primary only: db remembers the binds of every app built before.
+        db.create_all(bind_key=None)
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
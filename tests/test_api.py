@@ -0,0 +1,40 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from config import db
+from models import Artist, Venue
+
+
+@pytest.fixture
+def cached_client(make_app):
+    app = make_app(CACHE_BACKEND='lru')
+    with app.app_context():
+        db.create_all(bind_key=None)
+        venue = Venue(name='The Musical Hop', city='San Francisco', state='CA', address='1015 Folsom St')
+        artist = Artist(name='Guns N Petals', city='San Francisco', state='CA')
+        db.session.add_all([venue, artist])
+        db.session.commit()
+        yield app.test_client()
+        db.session.remove()
+
+
+def rows(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+@pytest.mark.parametrize('path', ['/api/v1/venues', '/api/v1/artists'])
+def test_listing_changes_when_a_show_is_created(cached_client, path):
+    first = cached_client.get(path)
+    assert [row['num_upcoming_shows'] for row in rows(first)] == [0]
+    etag = first.headers['ETag']
+    assert cached_client.get(path, headers={'If-None-Match': etag}).status_code == 304
+
+    start_time = (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S')
+    response = cached_client.post('/shows/create', data={'venue_id': 1, 'artist_id': 1, 'start_time': start_time})
+    assert 'successfully listed' in response.get_data(as_text=True)
+
+    again = cached_client.get(path, headers={'If-None-Match': etag})
+    assert again.status_code == 200
+    assert [row['num_upcoming_shows'] for row in rows(again)] == [1]
@@ -0,0 +1,133 @@
+import gzip
+import json
+import re
+import zlib
+from types import SimpleNamespace
+
+import pytest
+
+import assets
+import config
+
+CSS = ''.join(f'.rule-{n} {{ background: url("../img/logo.png"); /* row {n} */ }}\n' for n in range(100))
+JS = ''.join(f'console.log({n});\n' for n in range(100))
+
+
+@pytest.fixture
+def static(tmp_path, monkeypatch):
+    folder = tmp_path / 'static'
+    (folder / 'css').mkdir(parents=True)
+    (folder / 'js').mkdir()
+    (folder / 'img').mkdir()
+    (folder / 'css' / 'main.css').write_text(CSS)
+    (folder / 'css' / 'extra.css').write_text('.tiny { color: red; }')
+    (folder / 'js' / 'script.js').write_text(JS + '//# sourceMappingURL=script.js.map\n')
+    (folder / 'img' / 'logo.png').write_bytes(b'\x89PNG' + bytes(2048))
+    monkeypatch.setattr(assets, 'BUNDLES', {'css/app.css': ['css/extra.css', 'css/main.css'],
+                                            'js/app.js': ['js/script.js']})
+    # A stand-in for the optional brotli package.
+    monkeypatch.setattr(assets, '_brotli', lambda: SimpleNamespace(compress=lambda content, quality: zlib.compress(content)))
+    return folder
+
+
+def test_build_writes_hashed_names_and_compressed_siblings(static):
+    files = assets.build(str(static)).files
+    dist = static / assets.DIST
+
+    assert json.loads((dist / assets.MANIFEST).read_text())['files'] == files
+    for name, entry in files.items():
+        root, ext = name.rsplit('.', 1)
+        assert re.fullmatch(rf'{re.escape(root)}\.[0-9a-f]{{12}}\.{ext}', entry['path'])
+        assert (dist / entry['path']).exists()
+
+    main = files['css/main.css']
+    assert main['encodings'] == ['br', 'gzip']
+    content = (dist / main['path']).read_bytes()
+    assert gzip.decompress((dist / (main['path'] + '.gz')).read_bytes()) == content
+    assert zlib.decompress((dist / (main['path'] + '.br')).read_bytes()) == content
+    # Minified, pointing at the hashed image.
+    assert b'/*' not in content
+    assert f'url("../{files["img/logo.png"]["path"]}")'.encode() in content
+
+    # Too small to compress, or not compressible.
+    assert files['css/extra.css']['encodings'] == []
+    assert files['img/logo.png']['encodings'] == []
+    assert not list(dist.glob('img/*.gz'))
+
+    bundle = (dist / files['js/app.js']['path']).read_text()
+    assert 'sourceMappingURL' not in bundle and 'console.log(99)' in bundle
+
+
+def test_build_without_brotli_writes_gzip_only(static, monkeypatch):
+    monkeypatch.setattr(assets, '_brotli', lambda: None)
+    run = assets.build(str(static))
+
+    assert run.files['css/main.css']['encodings'] == ['gzip']
+    assert not list((static / assets.DIST).rglob('*.br'))
+    assert 'br' not in run.stats
+
+
+def test_a_changed_file_gets_a_new_name_and_clean_drops_the_old(static):
+    before = assets.build(str(static)).files['css/main.css']['path']
+    (static / 'css' / 'main.css').write_text(CSS + '.new { color: blue; }')
+    run = assets.build(str(static), clean=True)
+
+    after = run.files['css/main.css']['path']
+    assert after != before
+    assert not (static / assets.DIST / before).exists()
+    assert run.stats['removed'] > 0
+
+
+@pytest.fixture
+def built(make_app, static):
+    assets.build(str(static))
+    app = make_app(ASSETS_MANIFEST=str(static / assets.DIST / assets.MANIFEST))
+    # Serve the build from the temporary folder; the next app's init_app resets this.
+    config.assets.static_folder = str(static)
+    return app, config.assets
+
+
+def test_static_view_serves_precompressed_files(built):
+    app, extension = built
+    client = app.test_client()
+    with app.test_request_context():
+        url = extension.url('css/main.css')
+    assert url.startswith('/static/dist/css/main.')
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert zlib.decompress(response.data).startswith(b'.rule-0{')
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age == assets.IMMUTABLE_MAX_AGE
+    response.close()
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data).startswith(b'.rule-0{')
+    assert response.mimetype == 'text/css'
+    response.close()
+
+    response = client.get(url, headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.data.startswith(b'.rule-0{')
+    assert 'Accept-Encoding' in response.headers['Vary']
+    response.close()
+
+
+def test_static_view_without_compressed_siblings(built):
+    app, extension = built
+    with app.test_request_context():
+        url = extension.url('img/logo.png')
+    response = app.test_client().get(url, headers={'Accept-Encoding': 'gzip, br'})
+
+    assert 'Content-Encoding' not in response.headers
+    assert 'Vary' not in response.headers
+    assert response.cache_control.immutable
+    response.close()
+
+    # Files outside the build aren't immutable.
+    response = app.test_client().get('/static/css/main.css')
+    assert response.status_code == 200
+    assert not response.cache_control.immutable
+    response.close()
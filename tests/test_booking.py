@@ -0,0 +1,139 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import exc, select
+from werkzeug.datastructures import MultiDict
+
+import booking
+import bulk
+from config import db
+from forms import ShowForm
+from models import Artist, Show, Venue
+
+T = datetime(2030, 6, 1, 20, 0)
+HOUR = timedelta(hours=1)
+
+
+def test_overlapping_intervals_conflict():
+    index = booking.IntervalIndex()
+    index.add(T, T + 2 * HOUR)
+
+    assert index.overlaps(T + HOUR, T + 3 * HOUR)
+    assert index.overlaps(T - HOUR, T + HOUR)
+    assert index.overlaps(T - HOUR, T + 3 * HOUR)
+    assert index.overlaps(T + HOUR / 2, T + HOUR)
+    assert not index.overlaps(T + HOUR, T + HOUR)  # empty
+
+
+def test_back_to_back_intervals_do_not():
+    index = booking.IntervalIndex()
+    index.add(T, T + 2 * HOUR)
+
+    assert not index.overlaps(T + 2 * HOUR, T + 3 * HOUR)
+    assert not index.overlaps(T - HOUR, T)
+    index.add(T + 2 * HOUR, T + 3 * HOUR)
+    index.add(T - HOUR, T)
+    assert len(index) == 3
+    assert index.overlaps(T + 2 * HOUR, T + 4 * HOUR)
+
+
+def test_index_agrees_with_brute_force_across_blocks(monkeypatch):
+    monkeypatch.setattr(booking.IntervalIndex, 'LOAD', 2)
+    rng = random.Random(7)
+    index, kept = booking.IntervalIndex(), []
+    for _ in range(300):
+        start = T + rng.randrange(1000) * HOUR / 4
+        end = start + rng.randrange(1, 8) * HOUR / 4
+        expected = any(s < end and start < e for s, e in kept)
+        assert index.overlaps(start, end) == expected
+        if not expected:
+            index.add(start, end)
+            kept.append((start, end))
+    assert len(index) == len(kept)
+    assert len(index._firsts) > 1
+
+
+@pytest.fixture
+def owners(app):
+    db.session.add_all([Venue(id=n, name=f'Venue {n}', city='Austin', state='TX', address=f'{n} Main St')
+                        for n in (1, 2)] +
+                       [Artist(id=n, name=f'Artist {n}', city='Austin', state='TX') for n in (1, 2)])
+    db.session.add(Show(venue_id=1, artist_id=1, start_time=T, end_time=T + 2 * HOUR))
+    db.session.commit()
+
+
+def row(venue_id, artist_id, start, hours=2):
+    return {'venue_id': venue_id, 'artist_id': artist_id, 'start_time': start, 'end_time': start + hours * HOUR}
+
+
+def test_book_keeps_earlier_rows_and_refuses_clashes(owners):
+    rows = [
+        row(1, 2, T + HOUR),        # venue 1 is busy
+        row(2, 1, T - HOUR),        # artist 1 is busy
+        row(2, 2, T + 2 * HOUR),    # fits
+        row(1, 2, T + 3 * HOUR),    # artist 2 is now busy, from the row before
+        row(1, 1, T + 2 * HOUR, 1), # back to back with the stored show
+    ]
+    with db.engine.connect() as connection:
+        kept, conflicts = booking.Bookings(connection, rows).book(rows)
+
+    assert kept == [rows[2], rows[4]]
+    assert [(r, c.key) for r, c in conflicts] == [(rows[0], 'venue_id'), (rows[1], 'artist_id'),
+                                                  (rows[3], 'artist_id')]
+
+
+def test_bulk_import_rejects_conflicting_rows(owners, tmp_path):
+    path = tmp_path / 'shows.csv'
+    path.write_text('venue_id,artist_id,start_time,end_time\n'
+                    f'2,2,{T:%Y-%m-%d %H:%M:%S},\n'
+                    f'2,1,{T + HOUR:%Y-%m-%d %H:%M:%S},\n'
+                    f'1,2,{T + HOUR:%Y-%m-%d %H:%M:%S},{T + 3 * HOUR:%Y-%m-%d %H:%M:%S}\n')
+    rejects = []
+    progress = bulk.import_file(db.engine, 'shows', str(path), on_reject=lambda *reject: rejects.append(reject))
+
+    assert (progress.imported, progress.rejected) == (1, 2)
+    assert [(number, message.split(':')[0]) for number, message in rejects] == [(2, 'venue_id'), (3, 'venue_id')]
+    assert db.session.scalars(select(Show.venue_id).order_by(Show.id)).all() == [1, 2]
+
+
+def test_check_finds_stored_shows(owners):
+    with db.engine.connect() as connection:
+        with pytest.raises(booking.ShowConflict) as conflict:
+            booking.check(connection, 2, 1, T + HOUR, T + 3 * HOUR)
+        assert conflict.value.key == 'artist_id'
+        booking.check(connection, 1, 1, T + 2 * HOUR, T + 3 * HOUR)
+
+
+class ExclusionViolation(Exception):
+    pgcode = booking.EXCLUSION_VIOLATION
+
+
+def test_as_conflict():
+    conflict = booking.ShowConflict('venue_id')
+    assert booking.as_conflict(conflict) is conflict
+
+    error = exc.IntegrityError('INSERT', {}, ExclusionViolation('conflicting key value violates '
+                                                                'exclusion constraint "ex_show_artist_overlap"'))
+    assert booking.as_conflict(error).key == 'artist_id'
+    error = exc.IntegrityError('INSERT', {}, ExclusionViolation('violates exclusion constraint "ex_show_venue_overlap"'))
+    assert booking.as_conflict(error).key == 'venue_id'
+
+    assert booking.as_conflict(exc.IntegrityError('INSERT', {}, Exception('NOT NULL'))) is None
+    assert booking.as_conflict(ValueError('bad date')) is None
+
+
+@pytest.mark.parametrize('end_time, valid', [
+    ('', True),
+    ('2030-06-01 23:00:00', True),
+    ('2030-06-02 20:00:00', True),   # the longest a show may last
+    ('2030-06-01 20:00:00', False),  # ends as it starts
+    ('2030-06-01 19:00:00', False),
+    ('2030-06-02 20:00:01', False),
+])
+def test_show_form_checks_end_time(app, end_time, valid):
+    data = MultiDict({'artist_id': '1', 'venue_id': '1', 'start_time': '2030-06-01 20:00:00', 'end_time': end_time})
+    with app.test_request_context(method='POST'):
+        form = ShowForm(formdata=data, meta={'csrf': False})
+        assert form.validate() == valid
+        assert ('end_time' in form.errors) != valid
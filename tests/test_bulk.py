@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import func, select
+
+import bulk
+from benchmarks.seed import seed
+from config import db
+from models import Artist, ArtistGenre, Show, Venue
+
+# Parents first, so shows find their venue and artist.
+ORDER = ('venues', 'artists', 'shows')
+
+
+def snapshot():
+    with db.engine.connect() as connection:
+        return {
+            model.__tablename__: connection.execute(select(model.__table__).order_by(*model.__table__.primary_key)).all()
+            for model in (Venue, Artist, ArtistGenre)
+        } | {
+            'show': connection.execute(select(Show.id, Show.venue_id, Show.artist_id, Show.start_time, Show.end_time)
+                                       .order_by(Show.id)).all(),
+        }
+
+
+def comparable(rows):
+    """Rows without their import time, and unset flags read as False as the forms do."""
+    return [{k: (bool(v) if k.startswith('seeking_') and k != 'seeking_description' else v)
+             for k, v in row._asdict().items() if k not in ('updated_at', 'search_vector')}
+            for row in rows]
+
+
+@pytest.mark.parametrize('format', bulk.FORMATS)
+def test_export_of_seeded_catalog_imports_again(app, tmp_path, format):
+    with db.engine.begin() as connection:
+        seed(connection, venues=20, artists=30, shows=200)
+    with db.engine.connect() as connection:
+        for kind in ORDER:
+            with open(tmp_path / f'{kind}.{format}', 'w', newline='', encoding='utf-8') as out:
+                bulk.export_file(connection, kind, out, format)
+    before = snapshot()
+
+    db.drop_all(bind_key=None)
+    db.create_all(bind_key=None)
+    rejects = []
+    for kind in ORDER:
+        progress = bulk.import_file(db.engine, kind, str(tmp_path / f'{kind}.{format}'),
+                                    on_reject=lambda number, message: rejects.append((kind, number, message)))
+        assert progress.rejected == 0
+    assert rejects == []
+
+    after = snapshot()
+    for table in before:
+        assert comparable(after[table]) == comparable(before[table]), table
+
+
+def test_optional_fields_are_still_checked_when_given():
+    validator = bulk.Validator(bulk.KINDS['artists'])
+    record = {'name': 'Guns N Petals', 'city': 'San Francisco', 'state': 'CA', 'genres': 'Rock n Roll'}
+
+    assert validator.validate(record)[1] is None
+    assert 'facebook_link' in validator.validate({**record, 'facebook_link': 'not a url'})[1]
+    assert 'phone' in validator.validate({**record, 'phone': 'call me'})[1]
+
+
+def test_web_forms_keep_their_rules(app):
+    import forms
+
+    bulk.Validator(bulk.KINDS['artists'])
+    with app.test_request_context(method='POST', data={'name': 'Guns N Petals'}):
+        form = forms.ArtistForm(meta={'csrf': False})
+        form.validate()
+    assert 'phone' in form.errors
+    assert 'facebook_link' in form.errors
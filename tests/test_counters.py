@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select
+
+import counters
+from config import db
+from models import Artist, Show, ShowCounterState, Venue
+
+
+def test_fresh_database_gets_one_watermark(app):
+    with db.engine.begin() as connection:
+        first = counters._watermark(connection)
+        assert counters._watermark(connection) == first
+        assert connection.execute(select(func.count()).select_from(ShowCounterState)).scalar() == 1
+
+
+def test_watermark_insert_ignores_a_row_another_writer_created(app):
+    with db.engine.begin() as connection:
+        theirs = datetime(2030, 1, 1)
+        connection.execute(insert(ShowCounterState).values(id=counters.STATE_ID, swept_until=theirs))
+        connection.execute(counters.INSERT_IGNORING_CONFLICTS['sqlite'](ShowCounterState)
+                           .values(id=counters.STATE_ID, swept_until=datetime.now())
+                           .on_conflict_do_nothing(index_elements=['id']))
+        assert counters._watermark(connection) == theirs
+
+
+def test_sweep_moves_started_shows_to_past(app):
+    now = datetime.now()
+    venue = Venue(name='The Dueling Pianos Bar', city='New York', state='NY', address='335 Delancey St')
+    artists = [Artist(name=name, city='New York', state='NY') for name in ('Guns N Petals', 'Matt Quevedo')]
+    db.session.add_all([venue, *artists])
+    for artist in artists:
+        db.session.add(Show(artist=artist, venue=venue, start_time=now + timedelta(hours=1)))
+    db.session.add(Show(artist=artists[0], venue=venue, start_time=now + timedelta(days=3)))
+    db.session.commit()
+    assert (venue.upcoming_shows_count, venue.past_shows_count) == (3, 0)
+
+    owners = set()
+    with db.engine.begin() as connection:
+        assert counters.sweep(connection, now + timedelta(hours=2), owners) == 2
+    assert owners == {(Venue, venue.id), (Artist, artists[0].id), (Artist, artists[1].id)}
+
+    db.session.expire_all()
+    assert (venue.upcoming_shows_count, venue.past_shows_count) == (1, 2)
+    assert (artists[0].upcoming_shows_count, artists[0].past_shows_count) == (1, 1)
+    assert (artists[1].upcoming_shows_count, artists[1].past_shows_count) == (0, 1)
@@ -0,0 +1,26 @@
+import time
+from datetime import datetime, timedelta
+
+from config import db
+from models import Artist, Show, Venue
+
+
+def test_page_changes_when_a_show_starts_before_any_sweep(client):
+    venue = Venue(name='The Musical Hop', city='San Francisco', state='CA', address='1015 Folsom St')
+    artist = Artist(name='Guns N Petals', city='San Francisco', state='CA')
+    db.session.add_all([venue, artist, Show(artist=artist, venue=venue,
+                                            start_time=datetime.now() + timedelta(seconds=1))])
+    db.session.commit()
+
+    first = client.get(f'/venues/{venue.id}')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert client.get(f'/venues/{venue.id}', headers={'If-None-Match': etag}).status_code == 304
+
+    time.sleep(1.1)
+    again = client.get(f'/venues/{venue.id}', headers={'If-None-Match': etag})
+    assert again.status_code == 200
+    assert again.headers['ETag'] != etag
+    assert again.last_modified >= first.last_modified
+    assert client.get(f'/venues/{venue.id}',
+                      headers={'If-None-Match': again.headers['ETag']}).status_code == 304
@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, insert, select
+
+import ingest
+from app import show_ingest
+from config import db
+from models import Artist, Show, ShowTicket, Venue
+
+
+@pytest.fixture
+def ingest_app(make_app, tmp_path):
+    def make(**settings):
+        app = make_app(SHOW_INGEST=True, SHOW_INGEST_SPOOL_DIR=str(tmp_path / 'spool'), **settings)
+        with app.app_context():
+            db.create_all(bind_key=None)
+            for n in range(3):
+                db.session.add_all([
+                    Venue(name=f'Venue {n}', city='Austin', state='TX', address=f'{n} Main St'),
+                    Artist(name=f'Artist {n}', city='Austin', state='TX'),
+                ])
+            db.session.commit()
+        return app
+
+    yield make
+    show_ingest.stop()
+
+
+def start_time(days=7):
+    return (datetime.now() + timedelta(days=days)).replace(microsecond=0)
+
+
+def submit(client, venue_id=1, artist_id=1, days=7):
+    return client.post('/shows/create', data={
+        'venue_id': venue_id, 'artist_id': artist_id,
+        'start_time': start_time(days).strftime('%Y-%m-%d %H:%M:%S'),
+    })
+
+
+def wait_for(client, location, status='landed', timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = client.get(location)
+        if response.status_code == 200 and response.json['status'] == status:
+            return response.json
+        time.sleep(0.02)
+    raise AssertionError(f'{location} never became {status}: {response.get_json()}')
+
+
+def test_ticket_status(ingest_app):
+    client = ingest_app().test_client()
+
+    response = submit(client)
+    assert response.status_code == 202
+    landed = wait_for(client, response.headers['Location'])
+    assert landed['show_id'] is not None and landed['error'] is None
+
+    # The same slot again is a double booking.
+    response = submit(client, artist_id=2)
+    rejected = wait_for(client, response.headers['Location'], 'rejected')
+    assert rejected['show_id'] is None and 'venue_id' in rejected['error']
+
+    assert client.get('/api/v1/show-tickets/no-such-ticket').status_code == 404
+
+
+def test_full_queue_answers_503(ingest_app, monkeypatch):
+    app = ingest_app(SHOW_INGEST_MAX_QUEUED=1, SHOW_INGEST_ENQUEUE_TIMEOUT=0.05)
+    client = app.test_client()
+    release = threading.Event()
+    flush = show_ingest._flush
+    monkeypatch.setattr(show_ingest, '_flush', lambda batch, replay=False: release.wait(5) and flush(batch, replay))
+
+    first = submit(client)
+    assert first.status_code == 202
+    assert client.get(first.headers['Location']).json['status'] == 'queued'
+    busy = submit(client, venue_id=2, artist_id=2)
+    assert busy.status_code == 503
+    assert busy.headers['Retry-After']
+
+    release.set()
+    wait_for(client, first.headers['Location'])
+    assert submit(client, venue_id=2, artist_id=2).status_code == 202
+
+
+def test_worker_survives_a_failing_batch(ingest_app, monkeypatch):
+    app = ingest_app(SHOW_INGEST_MAX_QUEUED=1, SHOW_INGEST_ENQUEUE_TIMEOUT=0.05)
+    client = app.test_client()
+    monkeypatch.setattr(ingest, 'RETRY_DELAY', 0.01)
+    failures = iter([OSError('No space left on device')])
+
+    def fsync(fd):
+        error = next(failures, None)
+        if error:
+            raise error
+    monkeypatch.setattr(ingest.os, 'fsync', fsync)
+
+    first = submit(client)
+    wait_for(client, first.headers['Location'])
+    # Its slot came back.
+    second = submit(client, venue_id=2, artist_id=2)
+    assert second.status_code == 202
+    wait_for(client, second.headers['Location'])
+
+
+def test_orphaned_spool_is_replayed(ingest_app, tmp_path):
+    app = ingest_app()
+    dead = next(pid for pid in range(4_000_000, 3_000_000, -1) if not ingest._is_alive(pid))
+    records = [{'ticket': f'{n:032x}', 'artist_id': n + 1, 'venue_id': n + 1,
+                'start_time': start_time(n + 1).isoformat(),
+                'end_time': (start_time(n + 1) + timedelta(hours=2)).isoformat()} for n in range(3)]
+    os.makedirs(tmp_path / 'spool')
+    spool = tmp_path / 'spool' / f'shows-{dead}.jsonl'
+    # The last line was being written when the process died.
+    spool.write_text(''.join(json.dumps(record) + '\n' for record in records) + '{"ticket": "ab')
+    with app.app_context():
+        # Stored before the crash, so not again.
+        db.session.execute(insert(Show).values(id=100, artist_id=1, venue_id=1,
+                                               start_time=start_time(1), end_time=start_time(1)))
+        db.session.execute(insert(ShowTicket).values(ticket=records[0]['ticket'], show_id=100,
+                                                     created_at=datetime.now()))
+        db.session.commit()
+
+    client = app.test_client()
+    for record in records[1:]:
+        wait_for(client, f'/api/v1/show-tickets/{record["ticket"]}')
+    assert not spool.exists()
+    with app.app_context():
+        assert db.session.scalar(select(func.count(Show.id))) == 3
@@ -0,0 +1,29 @@
+import pytest
+
+import config
+from app import create_app
+
+
+def test_metrics_open_by_default(client):
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert 'fyyur_db_pool_checkout_wait_seconds' in response.get_data(as_text=True)
+
+
+def test_metrics_token(app, client):
+    app.config['METRICS_TOKEN'] = 's3cret'
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer s3cret'}).status_code == 200
+
+
+@pytest.mark.parametrize('token, status', [(None, 404), ('s3cret', 401)])
+def test_production_hides_timings_and_metrics(monkeypatch, tmp_path, token, status):
+    monkeypatch.setattr(config.Production, 'METRICS_ENABLED', bool(token))
+    monkeypatch.chdir(tmp_path)  # for error.log
+    app = create_app(config.Production, SECRET_KEY='test', METRICS_TOKEN=token,
+                     SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path / "fyyur.db"}',
+                     SQLALCHEMY_ENGINE_OPTIONS={}, CACHE_BACKEND='null', TEMPLATE_CACHE_DIR=None)
+    client = app.test_client()
+    assert client.get('/metrics').status_code == status
+    assert 'Server-Timing' not in client.get('/static/css/main.css').headers
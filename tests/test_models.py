@@ -0,0 +1,20 @@
+from sqlalchemy import create_mock_engine
+
+from config import db
+
+
+def postgresql_ddl():
+    statements = []
+    engine = create_mock_engine('postgresql://', lambda sql, *args, **kwargs: statements.append(
+        str(sql.compile(dialect=engine.dialect)).strip()))
+    db.metadata.create_all(engine, checkfirst=False)
+    return statements
+
+
+def test_create_all_creates_the_extensions_before_their_indexes():
+    statements = postgresql_ddl()
+    first = {name: next(i for i, sql in enumerate(statements) if name in sql)
+             for name in ('EXTENSION IF NOT EXISTS pg_trgm', 'gin_trgm_ops',
+                          'EXTENSION IF NOT EXISTS btree_gist', 'EXCLUDE USING gist')}
+    assert first['EXTENSION IF NOT EXISTS pg_trgm'] < first['gin_trgm_ops']
+    assert first['EXTENSION IF NOT EXISTS btree_gist'] < first['EXCLUDE USING gist']
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from config import db
+from models import Artist, Show, Venue
+from pagination import decode_cursor, encode_cursor
+
+
+def add_catalog(n):
+    for i in range(n):
+        venue = Venue(name=f'Venue {i}', city='Austin', state='TX', address=f'{i} Main St')
+        artist = Artist(name=f'Artist {i}', city='Austin', state='TX')
+        db.session.add_all([venue, artist, Show(artist=artist, venue=venue,
+                                                start_time=datetime.now() + timedelta(days=i + 1))])
+    db.session.commit()
+
+
+def test_cursor_round_trip():
+    values = ['TX', 'Austin', 3, datetime(2030, 1, 2, 20, 30)]
+    assert decode_cursor(encode_cursor(values, 'prev'), 4) == ('prev', values)
+
+
+@pytest.mark.parametrize('values, width', [
+    ([1], 3),
+    ([{'a': 1}, 2], 2),
+    ([[1], 2], 2),
+])
+def test_decode_cursor_rejects_wrong_shape(values, width):
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor(values), width)
+
+
+@pytest.mark.parametrize('path', ['/venues', '/shows', '/artists'])
+@pytest.mark.parametrize('values', [['a'], [{'a': 1}, 2], [1, 2, 3, 4]])
+def test_malformed_cursor_is_a_bad_request(client, path, values):
+    add_catalog(3)
+    assert client.get(path, query_string={'cursor': encode_cursor(values)}).status_code == 400
+
+
+def test_search_rejects_malformed_cursor(client):
+    add_catalog(3)
+    response = client.post('/artists/search', data={'search_term': 'artist',
+                                                    'cursor': encode_cursor(['x', 'y'])})
+    assert response.status_code == 400
+
+
+def test_pager_keeps_page_size(client):
+    add_catalog(5)
+
+    body = client.get('/artists', query_string={'per_page': 2}).get_data(as_text=True)
+    assert 'per_page=2' in body
+
+    body = client.post('/artists/search', data={'search_term': 'artist', 'per_page': 2}).get_data(as_text=True)
+    assert 'name="per_page" value="2"' in body
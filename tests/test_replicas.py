@@ -0,0 +1,65 @@
+import pytest
+
+from config import db, unit_of_work
+from models import Venue
+
+
+def venue(name):
+    return Venue(name=name, city='San Francisco', state='CA', address='1015 Folsom St')
+
+
+@pytest.fixture
+def replicated(make_app, tmp_path):
+    """An app whose replica is a separate SQLite file holding different rows than the primary."""
+    def make(replica_url=None):
+        seed_replica = replica_url is None
+        replica_url = replica_url or f'sqlite:///{tmp_path / "replica.db"}'
+        app = make_app(SQLALCHEMY_BINDS={'replica': replica_url}, REPLICA_STICKY_SECONDS=60)
+
+        @app.post('/_write')
+        def write():
+            with unit_of_work.transaction() as session:
+                session.add(venue('Written Hall'))
+            return 'ok'
+
+        with app.app_context():
+            db.create_all(bind_key=None)
+            db.session.add(venue('Primary Hall'))
+            db.session.commit()
+            if seed_replica:
+                db.metadata.create_all(db.engines['replica'])
+                with db.engines['replica'].begin() as connection:
+                    connection.execute(Venue.__table__.insert().values(
+                        name='Replica Hall', city='San Francisco', state='CA', address='1 Main St'))
+        return app
+    return make
+
+
+def test_get_reads_from_the_replica(replicated):
+    client = replicated().test_client()
+    body = client.get('/venues').get_data(as_text=True)
+    assert 'Replica Hall' in body
+    assert 'Primary Hall' not in body
+
+
+def test_reads_stick_to_the_primary_after_a_write(replicated):
+    client = replicated().test_client()
+    assert client.post('/_write').status_code == 200
+
+    body = client.get('/venues').get_data(as_text=True)
+    assert 'Primary Hall' in body
+    assert 'Written Hall' in body
+
+
+def test_other_browsers_keep_reading_from_the_replica(replicated):
+    app = replicated()
+    writer, reader = app.test_client(), app.test_client()
+    writer.post('/_write')
+    assert 'Replica Hall' in reader.get('/venues').get_data(as_text=True)
+
+
+def test_unreachable_replica_falls_back_to_the_primary(replicated, tmp_path):
+    app = replicated(f'sqlite:///{tmp_path / "missing" / "replica.db"}')
+    body = app.test_client().get('/venues').get_data(as_text=True)
+    assert 'Primary Hall' in body
+    assert app.extensions['replicas'].replicas[0].healthy is False
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, event
+
+from config import db
+from models import Artist, Show, Venue
+
+
+def add_artists(names):
+    venue = Venue(name='The Fillmore', city='San Francisco', state='CA', address='1805 Geary Blvd')
+    db.session.add(venue)
+    for name in names:
+        artist = Artist(name=name, city='San Francisco', state='CA')
+        db.session.add(artist)
+        db.session.add(Show(artist=artist, venue=venue, start_time=datetime.now() + timedelta(days=7)))
+    db.session.commit()
+
+
+def count_statements(client, term):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        response = client.post('/artists/search', data={'search_term': term})
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_search_artists_query_count_does_not_grow_with_hits(client):
+    add_artists(['Guns N Petals'] + [f'Matt Quevedo {n}' for n in range(10)])
+    # The first search loads the fallback index.
+    client.post('/artists/search', data={'search_term': 'petals'})
+
+    one = count_statements(client, 'petals')
+    many = count_statements(client, 'quevedo')
+    assert one == many
+
+
+def test_search_artists_shows_name_and_upcoming_count(client):
+    add_artists(['Guns N Petals', 'The Wild Sax Band'])
+
+    body = client.post('/artists/search', data={'search_term': 'petals'}).get_data(as_text=True)
+    assert 'Guns N Petals' in body
+    assert 'Wild Sax' not in body
+
+
+def test_search_artists_skips_hits_whose_row_is_gone(client):
+    add_artists(['Guns N Petals', 'Petals Of Fire'])
+    client.post('/artists/search', data={'search_term': 'petals'})
+    # Behind the search index's back, as another process would.
+    db.session.execute(delete(Show))
+    db.session.execute(delete(Artist).where(Artist.name == 'Petals Of Fire'))
+    db.session.commit()
+
+    response = client.post('/artists/search', data={'search_term': 'petals'})
+    body = response.get_data(as_text=True)
+    assert response.status_code == 200
+    assert 'Guns N Petals' in body
+    assert '"petals": 1</h3>' in body
+
+
+def test_navbar_search_form_on_listing_search_and_detail_pages(client):
+    add_artists(['Guns N Petals'])
+
+    for path, action in (('/venues', '/venues/search'), ('/venues/1', '/venues/search'),
+                         ('/artists', '/artists/search'), ('/artists/1', '/artists/search')):
+        assert f'action="{action}"' in client.get(path).get_data(as_text=True), path
+    for path in ('/venues/search', '/artists/search'):
+        page = client.post(path, data={'search_term': 'the'}).get_data(as_text=True)
+        assert f'action="{path}"' in page
+    assert 'class="search"' not in client.get('/shows').get_data(as_text=True)
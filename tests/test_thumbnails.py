@@ -0,0 +1,103 @@
+import io
+import ipaddress
+import threading
+from functools import partial
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+
+import pytest
+from PIL import Image
+
+import thumbnails
+from config import db, thumbnails as extension
+from models import Venue
+
+
+class Origin(SimpleHTTPRequestHandler):
+    """Serves the test's image directory; /hop redirects to ``redirect_to``."""
+    redirect_to = None
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.path == '/hop':
+            self.send_response(302)
+            self.send_header('Location', self.redirect_to)
+            self.end_headers()
+            return
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def origin(tmp_path):
+    Image.new('RGB', (800, 600), (200, 30, 30)).save(tmp_path / 'a.jpg')
+    servers = []
+
+    def serve(host='127.0.0.1', redirect_to=None):
+        handler = type('Handler', (Origin,), {'redirect_to': redirect_to})
+        server = HTTPServer((host, 0), partial(handler, directory=str(tmp_path)))
+        server.requests = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def add_venue(image_link):
+    venue = Venue(name='The Musical Hop', city='San Francisco', state='CA', address='1015 Folsom St',
+                  image_link=image_link)
+    db.session.add(venue)
+    db.session.commit()
+    return venue
+
+
+def test_file_stand_in_is_thumbnailed(client, origin, tmp_path, monkeypatch):
+    monkeypatch.setattr(extension, 'schemes', ('http', 'https', 'file'))
+    venue = add_venue(f'file://{tmp_path}/a.jpg')
+
+    response = client.get(f'/img/venue/{venue.id}/tile', headers={'Accept': 'image/webp'})
+    assert response.status_code == 200
+    assert Image.open(io.BytesIO(response.data)).size == (600, 400)
+
+
+def test_private_address_is_not_fetched(client, origin):
+    server = origin()
+    venue = add_venue(f'http://127.0.0.1:{server.server_port}/a.jpg')
+
+    response = client.get(f'/img/venue/{venue.id}/tile')
+    assert response.status_code == 404  # not a redirect to the link either
+    assert server.requests == []
+
+
+def test_redirect_to_private_address_is_not_followed(client, origin, monkeypatch):
+    # Stand in for a public host that redirects to an internal one.
+    monkeypatch.setattr(thumbnails, 'is_public', lambda ip: ip == ipaddress.ip_address('127.0.0.1'))
+    internal = origin('127.0.0.2')
+    public = origin(redirect_to=f'http://127.0.0.2:{internal.server_port}/a.jpg')
+
+    venue = add_venue(f'http://127.0.0.1:{public.server_port}/a.jpg')
+    assert client.get(f'/img/venue/{venue.id}/tile').status_code == 200
+
+    venue = add_venue(f'http://127.0.0.1:{public.server_port}/hop')
+    assert client.get(f'/img/venue/{venue.id}/tile').status_code == 404
+    assert public.requests == ['/a.jpg', '/hop']
+    assert internal.requests == []
+
+
+@pytest.mark.parametrize('address, public', [
+    ('93.184.216.34', True),
+    ('2606:2800:220:1::248', True),
+    ('127.0.0.1', False),
+    ('10.1.2.3', False),
+    ('169.254.169.254', False),
+    ('::1', False),
+    ('::ffff:10.1.2.3', False),
+    ('224.0.0.1', False),
+])
+def test_is_public(address, public):
+    assert thumbnails.is_public(ipaddress.ip_address(address)) is public
@@ -0,0 +1,115 @@
+import itertools
+import threading
+
+from sqlalchemy import event
+
+import typeahead
+from config import db
+from models import Venue
+
+
+def add_venues(names):
+    db.session.add_all([Venue(name=name, city='Austin', state='TX', address='1 Main St') for name in names])
+    db.session.commit()
+
+
+def names(results):
+    return [name for _, name in results]
+
+
+def build(model):
+    """Starts the index's build with a lookup and waits for it."""
+    index = typeahead._indexes[model]
+    typeahead.typeahead(model, 'a')
+    index.wait()
+    assert index._loaded
+    return index
+
+
+def test_names_starting_with_the_prefix_come_first(app):
+    # Every "hop..." inside a name sorts before "hopz", the one name starting with it.
+    add_venues([f'Big Hopa {n}' for n in range(5)] + ['Hopz', 'Hop Hopa'])
+    build(Venue)
+
+    assert names(typeahead.typeahead(Venue, 'hop', limit=4)) == ['Hop Hopa', 'Hopz', 'Big Hopa 0', 'Big Hopa 1']
+    assert names(typeahead.typeahead(Venue, 'hopa', limit=3)) == ['Hop Hopa', 'Big Hopa 0', 'Big Hopa 1']
+    assert names(typeahead.typeahead(Venue, 'hop', limit=1)) == ['Hop Hopa']
+
+
+def test_sync_queries_without_the_lock(app, monkeypatch):
+    add_venues(['The Musical Hop'])
+    index = build(Venue)
+    assert names(typeahead.typeahead(Venue, 'mus')) == ['The Musical Hop']
+
+    # Another process adds a name and bumps the tag.
+    with db.engine.begin() as connection:
+        connection.execute(Venue.__table__.insert().values(name='Mustang Hall', city='Austin', state='TX',
+                                                           address='2 Main St'))
+    versions = itertools.count(1)
+    monkeypatch.setattr(index, '_version_now', lambda: next(versions))
+    app.config['TYPEAHEAD_SYNC_INTERVAL'] = 0
+
+    held = []
+
+    def check(conn, cursor, statement, parameters, context, executemany):
+        held.append(index._lock.locked())
+
+    event.listen(db.engine, 'before_cursor_execute', check)
+    try:
+        assert names(typeahead.typeahead(Venue, 'mus')) == ['Mustang Hall', 'The Musical Hop']
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', check)
+    assert held and not any(held)
+
+
+def test_index_follows_committed_writes(app):
+    add_venues(['The Musical Hop', 'Café Lumière'])
+    build(Venue)
+
+    assert names(typeahead.typeahead(Venue, 'lumie')) == ['Café Lumière']
+    venue = db.session.scalar(db.select(Venue).filter_by(name='The Musical Hop'))
+    venue.name = 'The Dueling Pianos Bar'
+    db.session.commit()
+    assert names(typeahead.typeahead(Venue, 'mus')) == []
+    assert names(typeahead.typeahead(Venue, 'pian')) == ['The Dueling Pianos Bar']
+    db.session.delete(venue)
+    db.session.commit()
+    assert names(typeahead.typeahead(Venue, 'du')) == []
+
+
+def test_lookups_go_to_the_database_while_the_index_builds(app, monkeypatch):
+    add_venues(['The Musical Hop'])
+    index = typeahead._indexes[Venue]
+    release = threading.Event()
+    load = typeahead.PrefixIndex._load
+    monkeypatch.setattr(typeahead.PrefixIndex, '_load', lambda self, max_bytes: release.wait(5) and load(self, max_bytes))
+    queried = []
+    query_names = typeahead._query_names
+    monkeypatch.setattr(typeahead, '_query_names', lambda *args: queried.append(args) or query_names(*args))
+
+    # Answered while _load() waits in the background.
+    assert names(typeahead.typeahead(Venue, 'mus')) == ['The Musical Hop']
+    assert names(typeahead.typeahead(Venue, 'hop')) == ['The Musical Hop']
+    assert len(queried) == 2
+
+    release.set()
+    index.wait()
+    assert names(typeahead.typeahead(Venue, 'mus')) == ['The Musical Hop']
+    assert len(queried) == 2
+
+
+def test_reset_discards_a_build_started_before_it(app, monkeypatch):
+    add_venues(['The Musical Hop'])
+    index = typeahead._indexes[Venue]
+    release = threading.Event()
+    load = typeahead.PrefixIndex._load
+    monkeypatch.setattr(typeahead.PrefixIndex, '_load', lambda self, max_bytes: release.wait(5) and load(self, max_bytes))
+
+    typeahead.typeahead(Venue, 'mus')
+    stale = index._builder
+    index.reset()
+    release.set()
+    stale.join()
+
+    assert not index._loaded
+    assert build(Venue) is index
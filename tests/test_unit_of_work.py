@@ -0,0 +1,75 @@
+import pytest
+from sqlalchemy import func, select
+
+from config import db, unit_of_work
+from models import Venue
+from unit_of_work import ReadOnlyRequestError
+
+
+def venue(name='The Musical Hop'):
+    return Venue(name=name, city='San Francisco', state='CA', address='1015 Folsom St')
+
+
+def committed_names():
+    # On a connection of its own, so only committed rows show.
+    with db.engine.connect() as connection:
+        return connection.execute(select(Venue.name).order_by(Venue.name)).scalars().all()
+
+
+@pytest.fixture
+def post_request(app):
+    with app.test_request_context('/venues/create', method='POST'):
+        app.preprocess_request()
+        yield
+
+
+def test_transaction_commits(post_request):
+    with unit_of_work.transaction() as session:
+        session.add(venue())
+    assert committed_names() == ['The Musical Hop']
+
+
+def test_transaction_rolls_back_and_reraises(post_request):
+    with pytest.raises(ValueError):
+        with unit_of_work.transaction() as session:
+            session.add(venue())
+            session.flush()
+            raise ValueError('boom')
+    assert committed_names() == []
+    assert db.session.scalar(select(func.count(Venue.id))) == 0
+
+
+def test_nested_transactions_commit_with_the_outermost(post_request):
+    with pytest.raises(ValueError):
+        with unit_of_work.transaction() as session:
+            with unit_of_work.transaction():
+                session.add(venue('Park Square Live Music & Coffee'))
+            assert committed_names() == []
+            raise ValueError('boom')
+    assert committed_names() == []
+
+
+def test_safe_method_request_cannot_flush(app):
+    with app.test_request_context('/venues', method='GET'):
+        app.preprocess_request()
+        db.session.add(venue())
+        with pytest.raises(ReadOnlyRequestError):
+            db.session.flush()
+        db.session.rollback()
+    assert committed_names() == []
+
+
+def test_read_only_view_cannot_flush(post_request):
+    @unit_of_work.read_only
+    def search():
+        db.session.add(venue())
+        db.session.flush()
+
+    with pytest.raises(ReadOnlyRequestError):
+        search()
+    db.session.rollback()
+    assert committed_names() == []
+
+
+def test_read_only_search_form_still_answers(client):
+    assert client.post('/venues/search', data={'search_term': 'hop'}).status_code == 200
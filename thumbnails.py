@@ -0,0 +1,410 @@
+import hashlib
+import http.client
+import io
+import ipaddress
+import logging
+import os
+import socket
+import threading
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+from flask import request, send_file, url_for
+
+import metrics
+from cache import LRUBackend
+from instrumentation import log_event
+
+
+# ----------------------------------------------------------------------------#
+# Thumbnails of venue and artist images.
+#
+# Templates point <img> tags at the thumbnail view, /img/<kind>/<id>/<size>,
+# through thumbnail_url() instead of hotlinking image_link. The first request
+# for an image fetches the source once, and every size and format is
+# rendered from that copy. Everything lives in THUMBNAIL_CACHE_DIR:
+#
+#     links/ab/<sha256 of image_link>       the digest of the source it fetched
+#     sources/cd/<sha256 of source>         the source itself
+#     thumbs/cd/<sha256 of source>-<size>.<format>
+#
+# Sources and thumbnails are named after their content, so links to the same
+# picture share them. The directory is an LRU cache: serving a file bumps its
+# access time, and once it grows past THUMBNAIL_CACHE_MAX_BYTES the least
+# recently used files are deleted. An evicted source is fetched again only
+# if a new size or format of it is asked for.
+#
+# thumbnail_url() adds a hash of image_link to the URL, so a changed image
+# gets a new URL and browsers may keep a thumbnail for a year.
+#
+# image_link is whatever a user typed, so fetching it must not reach the
+# servers around ours: every connection, including those of redirects, is
+# made only to addresses on the public internet, checked after resolving
+# the host and used as checked, so a DNS answer can't change in between.
+# ----------------------------------------------------------------------------#
+
+# Size name -> (width, height), and whether to crop to fill it rather than
+# scale to fit inside it. Twice the CSS size, for high density screens.
+SIZES = {
+    # Show tiles: at most 200px high.
+    'tile': ((600, 400), True),
+    # The picture on a venue or artist page: at most 500px high.
+    'page': ((1000, 1000), False),
+}
+# Format -> (Pillow format, mimetype, save options). WebP when accepted.
+FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Sources larger than this, in pixels, aren't decoded.
+MAX_SOURCE_PIXELS = 40_000_000
+# Seconds a link that couldn't be fetched or decoded isn't tried again.
+FAILURE_TTL = 300
+# Access times are bumped at most this often, in seconds.
+TOUCH_INTERVAL = 60
+# Eviction deletes down to this fraction of THUMBNAIL_CACHE_MAX_BYTES.
+EVICT_TO = 0.9
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+USER_AGENT = 'Fyyur-Thumbnailer/1.0'
+
+served = metrics.register(metrics.Counter(
+    'fyyur_thumbnails_total',
+    'Thumbnail requests, by how they were answered.',
+    ('outcome',),
+))
+
+
+class ThumbnailError(Exception):
+    """The image couldn't be fetched or isn't a picture Pillow can read."""
+
+
+class UnsafeLink(ThumbnailError):
+    """The image's host isn't on the public internet, so it isn't fetched."""
+
+
+def is_public(address):
+    """Whether ``address``, an ipaddress address, is one links may point at."""
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    return address.is_global and not address.is_multicast
+
+
+def public_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None, **kwargs):
+    """
+    socket.create_connection() that raises UnsafeLink instead of connecting
+    when the host has an address that isn't public.
+    """
+    host, port = address
+    try:
+        resolved = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except UnicodeError as e:
+        raise OSError(f'bad host name {host!r}') from e
+    addresses = []
+    for *_, sockaddr in resolved:
+        ip = ipaddress.ip_address(sockaddr[0].split('%')[0])
+        if not is_public(ip):
+            raise UnsafeLink(f'{host} resolves to {ip}, which is not a public address')
+        addresses.append(str(ip))
+    error = OSError(f'{host} has no addresses')
+    for ip in dict.fromkeys(addresses):
+        try:
+            return socket.create_connection((ip, port), timeout, source_address)
+        except OSError as e:
+            error = e
+    raise error
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = public_connection
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    # Still verifies the certificate against the host name, not the address.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = public_connection
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+class _RedirectHandler(urllib.request.HTTPRedirectHandler):
+    # Redirected requests connect through the handlers above too; this
+    # keeps them to http(s), so they can't be sent to another handler.
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        scheme = urlsplit(newurl).scheme.lower()
+        if scheme not in ('http', 'https'):
+            raise UnsafeLink(f'redirected to a {scheme or "relative"} link')
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+def opener():
+    """A urllib opener for image links, see the notes at the top."""
+    # No proxies: the proxy would make the connections, unchecked.
+    return urllib.request.build_opener(
+        urllib.request.ProxyHandler({}), _PublicHTTPHandler, _PublicHTTPSHandler, _RedirectHandler,
+    )
+
+
+def _digest(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def link_version(image_link):
+    """A short hash of ``image_link``; it changes when the link does."""
+    return _digest(image_link.encode('utf-8'))[:12]
+
+
+def render(source, size, format):
+    """The ``size`` thumbnail of the image bytes ``source``, encoded as ``format``."""
+    from PIL import Image, ImageOps  # only on a cache miss; keeps it out of startup
+    (width, height), crop = SIZES[size]
+    pillow_format, _, options = FORMATS[format]
+    try:
+        with Image.open(io.BytesIO(source)) as image:
+            if image.width * image.height > MAX_SOURCE_PIXELS:
+                raise ThumbnailError(f'{image.width}x{image.height} image is too large')
+            # Lets JPEGs decode at a fraction of their size; either orientation.
+            image.draft('RGB', (max(width, height),) * 2)
+            image = ImageOps.exif_transpose(image)
+            if crop:
+                image = ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+            else:
+                image.thumbnail((width, height), Image.Resampling.LANCZOS)
+
+            alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+            if alpha and pillow_format == 'JPEG':
+                image = image.convert('RGBA')
+                flat = Image.new('RGB', image.size, (255, 255, 255))
+                flat.paste(image, mask=image.getchannel('A'))
+                image = flat
+            elif image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if alpha else 'RGB')
+
+            out = io.BytesIO()
+            image.save(out, pillow_format, **options)
+            return out.getvalue()
+    except (OSError, ValueError, SyntaxError, Image.DecompressionBombError) as e:
+        raise ThumbnailError(f'unreadable image: {e}') from e
+
+
+class Thumbnails:
+    """
+    Configuration:
+
+        THUMBNAIL_CACHE_DIR         where sources and thumbnails are kept
+        THUMBNAIL_CACHE_MAX_BYTES   size the cache is trimmed to (256 MiB)
+        THUMBNAIL_SCHEMES           URL schemes fetched (http, https)
+        THUMBNAIL_FETCH_TIMEOUT     seconds to wait for a source (5)
+        THUMBNAIL_MAX_SOURCE_BYTES  largest source fetched (10 MiB)
+    """
+
+    def __init__(self, app=None):
+        self._size = None
+        self._size_lock = threading.Lock()
+        self._evicting = threading.Lock()
+        # One fetch per link at a time in this process, without a lock per link.
+        self._fetch_locks = [threading.Lock() for _ in range(64)]
+        self._failures = LRUBackend(max_entries=1024)
+        self._opener = opener()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('THUMBNAIL_CACHE_DIR', os.path.join(app.root_path, 'thumbnails'))
+        app.config.setdefault('THUMBNAIL_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+        app.config.setdefault('THUMBNAIL_SCHEMES', ('http', 'https'))
+        app.config.setdefault('THUMBNAIL_FETCH_TIMEOUT', 5)
+        app.config.setdefault('THUMBNAIL_MAX_SOURCE_BYTES', 10 * 1024 * 1024)
+        self.cache_dir = app.config['THUMBNAIL_CACHE_DIR']
+        self.max_bytes = app.config['THUMBNAIL_CACHE_MAX_BYTES']
+        self.schemes = tuple(scheme.lower() for scheme in app.config['THUMBNAIL_SCHEMES'])
+        self.fetch_timeout = app.config['THUMBNAIL_FETCH_TIMEOUT']
+        self.max_source_bytes = app.config['THUMBNAIL_MAX_SOURCE_BYTES']
+
+        metrics.register(metrics.Gauge(
+            'fyyur_thumbnail_cache_bytes',
+            'Bytes in the thumbnail cache, as last counted by this process.',
+            lambda: self._size or 0,
+        ))
+        app.jinja_env.globals['thumbnail_url'] = self.url
+        app.extensions['thumbnails'] = self
+
+    def url(self, kind, id, image_link, size='tile'):
+        """The thumbnail URL of a venue's or artist's ``image_link``; the link itself if empty."""
+        if not image_link:
+            return image_link
+        return url_for('main.thumbnail', kind=kind, id=id, size=size, v=link_version(image_link))
+
+    # ------------------------------------------------------------------------
+    # Requests.
+
+    def send(self, image_link, size):
+        """
+        Answers a request for the ``size`` thumbnail of ``image_link``, as WebP
+        if the client accepts it. Raises ThumbnailError if it can't be made.
+        """
+        format = 'webp' if any(value == 'image/webp' for value, quality in request.accept_mimetypes) else 'jpeg'
+        name, path = self.thumbnail(image_link, size, format)
+        current = request.args.get('v') == link_version(image_link)
+        response = send_file(
+            path,
+            mimetype=FORMATS[format][1],
+            etag=name,
+            max_age=IMMUTABLE_MAX_AGE if current else 3600,
+            conditional=True,
+        )
+        response.vary.add('Accept')
+        response.cache_control.public = True
+        if current:
+            response.cache_control.immutable = True
+        return response
+
+    def thumbnail(self, image_link, size, format):
+        """The name and path of the ``size`` thumbnail of ``image_link``, made if needed."""
+        link = _digest(image_link.encode('utf-8'))
+        digest = self._read_link(link)
+        if digest is not None:
+            name, path = self._thumb(digest, size, format)
+            if self._touch(path):
+                self._touch(self._path('links', link))
+                served.inc(outcome='hit')
+                return name, path
+
+        failure = self._failures.get(link)
+        if failure is not None:
+            served.inc(outcome='failed')
+            raise ThumbnailError(failure)
+
+        with self._fetch_locks[int(link[:8], 16) % len(self._fetch_locks)]:
+            # Another thread may have made it while this one waited.
+            digest = self._read_link(link)
+            source = self._read(self._path('sources', digest)) if digest else None
+            try:
+                if source is None:
+                    source = self._fetch(image_link)
+                    digest = _digest(source)
+                    self._write(self._path('sources', digest), source)
+                    self._write(self._path('links', link), digest.encode('ascii'))
+                    served.inc(outcome='fetched')
+                name, path = self._thumb(digest, size, format)
+                if not self._touch(path):
+                    self._write(path, render(source, size, format))
+                    served.inc(outcome='rendered')
+            except ThumbnailError as e:
+                log_event('thumbnail_failed', logging.WARNING, error=e, image_link=image_link)
+                self._failures.set(link, str(e), FAILURE_TTL)
+                served.inc(outcome='failed')
+                raise
+        return name, path
+
+    def _fetch(self, image_link):
+        scheme = urlsplit(image_link).scheme.lower()
+        if scheme not in self.schemes:
+            raise ThumbnailError(f'{scheme or "relative"} links are not fetched')
+        try:
+            req = urllib.request.Request(image_link, headers={'User-Agent': USER_AGENT})
+            with self._opener.open(req, timeout=self.fetch_timeout) as response:
+                source = response.read(self.max_source_bytes + 1)
+        except (OSError, ValueError) as e:
+            raise ThumbnailError(f'fetch failed: {e}') from e
+        if len(source) > self.max_source_bytes:
+            raise ThumbnailError(f'source is larger than {self.max_source_bytes} bytes')
+        return source
+
+    # ------------------------------------------------------------------------
+    # The disk cache.
+
+    def _path(self, kind, digest):
+        return os.path.join(self.cache_dir, kind, digest[:2], digest)
+
+    def _thumb(self, digest, size, format):
+        name = f'{digest}-{size}.{format}'
+        return name, os.path.join(self.cache_dir, 'thumbs', digest[:2], name)
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _read_link(self, link):
+        digest = self._read(self._path('links', link))
+        return digest.decode('ascii') if digest else None
+
+    def _touch(self, path):
+        """Marks ``path`` used; False if it isn't in the cache."""
+        try:
+            stat = os.stat(path)
+            now = time.time()
+            if now - stat.st_atime > TOUCH_INTERVAL:
+                # Access time only: Last-Modified stays the time it was made.
+                os.utime(path, (now, stat.st_mtime))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _write(self, path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(content)
+        os.replace(tmp, path)
+
+        with self._size_lock:
+            if self._size is None:
+                self._size = self._scan()[1]
+            else:
+                self._size += len(content)
+            full = self._size > self.max_bytes
+        if full:
+            self.evict()
+
+    def _scan(self):
+        entries, total = [], 0
+        for root, dirs, files in os.walk(self.cache_dir):
+            for file in files:
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_atime, stat.st_size, path))
+                total += stat.st_size
+        return entries, total
+
+    def evict(self):
+        """Deletes the least recently used files until the cache is back under its cap."""
+        if not self._evicting.acquire(blocking=False):
+            return  # another thread is at it
+        try:
+            entries, total = self._scan()
+            target = self.max_bytes * EVICT_TO
+            removed = 0
+            for atime, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+            with self._size_lock:
+                self._size = total
+            if removed:
+                log_event('thumbnail_cache_evicted', files=removed, bytes=total)
+        finally:
+            self._evicting.release()
@@ -0,0 +1,476 @@
+import logging
+import re
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import event, func, inspect, or_, select
+from sqlalchemy.orm import Session
+
+import metrics
+from config import db, cache
+from instrumentation import log_event
+from models import Venue, Artist
+
+
+# ----------------------------------------------------------------------------#
+# Typeahead over venue and artist names.
+#
+# Each process keeps, per model, every name with its id and its folded
+# (lowercased, accent-free) form, and sorted arrays of (slot, offset)
+# entries, one for each word a name starts at: "The Musical Hop" is found by
+# "the m", "musi" and "hop". Entries are plain 64-bit ints, ordered by the
+# folded name from that word on. Those for a name's first word have an array
+# of their own, since names starting with the prefix rank first: a lookup is
+# a bisect plus a short scan in each, and an index costs about 200 bytes per
+# name. An index that grows past TYPEAHEAD_MAX_BYTES is dropped, and lookups
+# on its model go to the database until it's reindexed.
+#
+# Indexes load in a background thread started by the first lookup, and the
+# lookups arriving meanwhile go to the database. They then follow this process's committed writes through the session hooks
+# below. Those hooks also bump a tag version in the response cache's
+# backend; when that backend is shared, other processes see it move within
+# TYPEAHEAD_SYNC_INTERVAL seconds and re-read the names updated since they
+# last looked, rebuilding (in the background too) only when rows have also been deleted.
+# ----------------------------------------------------------------------------#
+
+KINDS = {'venues': Venue, 'artists': Artist}
+
+# Entries sort on this many characters; longer prefixes are checked in full.
+KEY_LENGTH = 24
+# Words starting further into a folded name than this aren't indexed.
+MAX_OFFSET = 255
+# Entries examined per lookup at most, however many share a long key.
+MAX_SCAN = 1000
+# Catching up re-reads this much before the newest updated_at seen, for
+# writers whose clocks run behind.
+CLOCK_SKEW = timedelta(minutes=1)
+LOAD_BATCH = 10000
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def fold(text):
+    """``text``'s words, lowercased and without accents, joined by single spaces."""
+    if not text.isascii():
+        text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    return ' '.join(_WORD_RE.findall(text.casefold()))
+
+
+class OverCapacity(Exception):
+    pass
+
+
+class PrefixIndex:
+    """Every name of one model, looked up by the prefix of any of its words."""
+
+    # What _clear() resets and _rebuild() swaps in.
+    STATE = ('_loaded', '_ids', '_names', '_folded', '_heads', '_entries', '_live', '_bytes', '_version',
+             '_checked_at', '_watermark')
+
+    def __init__(self, model):
+        self.model = model
+        self.tag = f'typeahead:{model.__tablename__}'
+        self.over_cap = False
+        self._loading = False
+        self._builder = None
+        # Bumped by reset(), so that a build started before it is discarded.
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self._loaded = False
+        # Slot -> id, ascending, and slot -> name and folded name (None once deleted).
+        self._ids = array('q')
+        self._names = []
+        self._folded = []
+        # (slot << 8 | offset), sorted by _key(): offset 0 in _heads, the rest in _entries.
+        self._heads = array('Q')
+        self._entries = array('Q')
+        self._live = 0
+        self._bytes = 0
+        self._version = None
+        self._checked_at = 0.0
+        self._watermark = None
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def _key(self, entry):
+        offset = entry & 0xff
+        return self._folded[entry >> 8][offset:offset + KEY_LENGTH]
+
+    def _array(self, entry):
+        return self._entries if entry & 0xff else self._heads
+
+    def _bisect(self, entries, key):
+        lo, hi = 0, len(entries)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(entries[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _word_entries(self, slot, folded):
+        entries = [slot << 8] if folded else []
+        offset = folded.find(' ')
+        while 0 <= offset < MAX_OFFSET:
+            entries.append(slot << 8 | offset + 1)
+            offset = folded.find(' ', offset + 1)
+        return entries
+
+    def _size(self, name, folded, entries):
+        return sys.getsizeof(name) + sys.getsizeof(folded) + 8 * len(entries)
+
+    def _grow(self, nbytes, max_bytes):
+        self._bytes += nbytes
+        if self._bytes > max_bytes:
+            raise OverCapacity(f'{self.model.__tablename__} typeahead index passed {max_bytes} bytes')
+
+    def _add(self, slot, name, max_bytes):
+        folded = fold(name)
+        entries = self._word_entries(slot, folded)
+        self._grow(self._size(name, folded, entries), max_bytes)
+        self._names[slot] = name
+        self._folded[slot] = folded
+        self._live += 1
+        for entry in entries:
+            ordered = self._array(entry)
+            ordered.insert(self._bisect(ordered, self._key(entry)), entry)
+
+    def _remove(self, slot):
+        name, folded = self._names[slot], self._folded[slot]
+        entries = self._word_entries(slot, folded)
+        for entry in entries:
+            ordered = self._array(entry)
+            i = self._bisect(ordered, self._key(entry))
+            while ordered[i] != entry:
+                i += 1
+            del ordered[i]
+        self._names[slot] = self._folded[slot] = None
+        self._live -= 1
+        self._bytes -= self._size(name, folded, entries)
+
+    def _slot(self, id):
+        i = bisect_left(self._ids, id)
+        return i if i < len(self._ids) and self._ids[i] == id else None
+
+    def _set(self, id, name, max_bytes):
+        """Adds, renames (``name``) or forgets (None) ``id``; False if the index must be rebuilt."""
+        slot = self._slot(id)
+        if slot is not None and self._names[slot] is not None:
+            if self._names[slot] == name:
+                return True
+            self._remove(slot)
+        if name is None:
+            return True
+        if slot is None:
+            if self._ids and id < self._ids[-1]:
+                # Slots follow id order so that _slot() can bisect.
+                return False
+            self._ids.append(id)
+            self._names.append(None)
+            self._folded.append(None)
+            self._grow(24, max_bytes)
+            slot = len(self._ids) - 1
+        self._add(slot, name, max_bytes)
+        return True
+
+    def _load(self, max_bytes):
+        self._clear()
+        model = self.model
+        rows = db.session.execute(
+            select(model.id, model.name, model.updated_at).where(model.name.isnot(None))
+            .order_by(model.id).execution_options(yield_per=LOAD_BATCH)
+        )
+        # Entries by array and the character they start at, so that only one
+        # bucket's sort keys are in memory at a time.
+        buckets = {}
+        for id, name, updated_at in rows:
+            slot = len(self._ids)
+            folded = fold(name)
+            self._ids.append(id)
+            self._names.append(name)
+            self._folded.append(folded)
+            words = self._word_entries(slot, folded)
+            self._grow(24 + self._size(name, folded, words), max_bytes)
+            for entry in words:
+                offset = entry & 0xff
+                buckets.setdefault((offset > 0, folded[offset]), array('Q')).append(entry)
+            self._live += 1
+            if self._watermark is None or updated_at > self._watermark:
+                self._watermark = updated_at
+        for later, first in sorted(buckets):
+            entries = sorted(buckets.pop((later, first)), key=self._key)
+            (self._entries if later else self._heads).extend(entries)
+        self._loaded = True
+
+    def _changes(self, watermark):
+        """
+        The (id, name, updated_at) rows updated since ``watermark``, and the
+        number of named rows. Run without the lock.
+        """
+        model = self.model
+        query = select(model.id, model.name, model.updated_at)
+        if watermark is not None:
+            query = query.where(model.updated_at >= watermark - CLOCK_SKEW)
+        rows = db.session.execute(query).all()
+        return rows, db.session.scalar(select(func.count(model.id)).where(model.name.isnot(None)))
+
+    def _catch_up(self, rows, count, max_bytes):
+        """Applies rows from _changes(); False if the index must be rebuilt. Called with the lock held."""
+        for id, name, updated_at in rows:
+            if not self._set(id, name, max_bytes):
+                return False
+            if self._watermark is None or updated_at > self._watermark:
+                self._watermark = updated_at
+        # Deletions leave nothing to find by updated_at, only a count that's off.
+        return count == self._live
+
+    def _version_now(self):
+        return cache.backend.version(self.tag) if cache.backend is not None else 0
+
+    def _drop(self, error):
+        self._clear()
+        self.over_cap = True
+        log_event('typeahead_over_capacity', table=self.model.__tablename__, error=error)
+
+    def _due(self, config):
+        """
+        What lookup() must do before answering: 'load' the index, 'sync' it
+        with other processes' writes, or nothing (None). Called with the
+        lock held, so it only looks at the clock.
+        """
+        if self.over_cap or self._loading:
+            return None
+        if not self._loaded:
+            return 'load'
+        now = time.monotonic()
+        if now - self._checked_at < config['TYPEAHEAD_SYNC_INTERVAL']:
+            return None
+        self._checked_at = now
+        return 'sync'
+
+    def _sync(self, config):
+        """
+        Catches up with other processes' writes, if the tag moved: queries
+        without holding the lock, then applies the rows with it. Rebuilds
+        instead if rows have also been deleted.
+        """
+        rebuild = False
+        try:
+            version = self._version_now()
+            if version == self._version:
+                return
+            rows, count = self._changes(self._watermark)
+            with self._lock:
+                if not self._loaded:
+                    return  # reset meanwhile; the next lookup loads it
+                try:
+                    rebuild = not self._catch_up(rows, count, config['TYPEAHEAD_MAX_BYTES'])
+                except OverCapacity as e:
+                    self._drop(e)
+                    return
+                if not rebuild:
+                    self._version = version
+        finally:
+            if not rebuild:
+                with self._lock:
+                    self._loading = False
+        if rebuild:
+            self._start_rebuild(config)
+
+    def _start_rebuild(self, config):
+        """Runs _rebuild() in a thread of its own, for lookups not to wait for it."""
+        app = current_app._get_current_object()
+
+        def run():
+            with app.app_context():
+                try:
+                    self._rebuild(config)
+                except Exception as e:
+                    log_event('typeahead_build_failed', logging.ERROR, exc_info=True,
+                              table=self.model.__tablename__, error=e)
+
+        self._builder = threading.Thread(target=run, name=f'{self.tag}-build', daemon=True)
+        self._builder.start()
+
+    def _rebuild(self, config):
+        """
+        Loads a fresh copy without holding the lock, then swaps it in, unless
+        reset() ran meanwhile: the copy may predate the writes it was for.
+        """
+        generation = self._generation
+        fresh = PrefixIndex(self.model)
+        try:
+            version = fresh._version_now()
+            fresh._load(config['TYPEAHEAD_MAX_BYTES'])
+            fresh._version, fresh._checked_at = version, time.monotonic()
+        except OverCapacity as e:
+            with self._lock:
+                if self._generation == generation:
+                    self._loading = False
+                    self._drop(e)
+            return
+        except BaseException:
+            self._loading = False
+            raise
+        with self._lock:
+            # Otherwise reset() cleared _loading, and a newer build may be running.
+            if self._generation == generation:
+                for name in self.STATE:
+                    setattr(self, name, getattr(fresh, name))
+                self._loading = False
+
+    def _find(self, prefix, limit):
+        key = prefix[:KEY_LENGTH]
+        # Names starting with the prefix, then those with a later word that
+        # does, each in entry order.
+        found = {}
+        for entries in (self._heads, self._entries):
+            i = self._bisect(entries, key)
+            end = min(len(entries), i + MAX_SCAN)
+            while i < end and len(found) < limit:
+                entry = entries[i]
+                slot, offset = entry >> 8, entry & 0xff
+                folded = self._folded[slot]
+                if not folded.startswith(key, offset):
+                    break
+                if folded.startswith(prefix, offset):
+                    found[slot] = None
+                i += 1
+        return [(self._ids[slot], self._names[slot]) for slot in found]
+
+    def lookup(self, prefix, limit):
+        """
+        Up to ``limit`` (id, name) pairs whose names have a word starting with
+        the folded ``prefix``: names starting with it first, then by the text
+        matched. None while the index is over capacity or first being built.
+        """
+        config = current_app.config
+        with self._lock:
+            due = self._due(config)
+            if due:
+                self._loading = True
+        if due == 'load':
+            self._start_rebuild(config)
+        elif due == 'sync':
+            self._sync(config)
+        with self._lock:
+            if not self._loaded or self.over_cap:
+                return None
+            return self._find(prefix, limit)
+
+    def update(self, id, name):
+        with self._lock:
+            if not self._loaded:
+                return
+            try:
+                if not self._set(id, name, current_app.config['TYPEAHEAD_MAX_BYTES']):
+                    self._clear()
+            except OverCapacity as e:
+                self._drop(e)
+
+    def reset(self):
+        """Drops the index so the next lookup rebuilds it from the table."""
+        with self._lock:
+            self._clear()
+            self._generation += 1
+            self._loading = False
+            self.over_cap = False
+
+    def wait(self, timeout=None):
+        """Waits for the build a lookup started, if any, to finish."""
+        builder = self._builder
+        if builder is not None:
+            builder.join(timeout)
+
+
+_indexes = {model: PrefixIndex(model) for model in KINDS.values()}
+
+metrics.register(metrics.Gauge(
+    'fyyur_typeahead_index_bytes',
+    'Approximate memory held by this process\'s typeahead indexes.',
+    lambda: sum(index.nbytes for index in _indexes.values()),
+))
+
+
+def _like_prefix(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def _query_names(model, prefix, limit):
+    """Names with a word starting with ``prefix`` from the database, for an index over capacity."""
+    name = func.lower(model.name)
+    rows = db.session.execute(
+        select(model.id, model.name)
+        .where(or_(name.like(_like_prefix(prefix), escape='\\'),
+                   name.like('% ' + _like_prefix(prefix), escape='\\')))
+        .order_by(name.like(_like_prefix(prefix), escape='\\').desc(), model.name)
+        .limit(limit)
+    )
+    return [tuple(row) for row in rows]
+
+
+def typeahead(model, term, limit=10):
+    """Up to ``limit`` (id, name) pairs of ``model`` whose names have a word starting with ``term``."""
+    prefix = fold(term)
+    if not prefix:
+        return []
+    names = _indexes[model].lookup(prefix, limit)
+    if names is None:
+        names = _query_names(model, prefix, limit)
+    return names
+
+
+def reindex(model):
+    """
+    Drops ``model``'s index in this process and has the others catch up.
+    Bulk writers that bypass the session must call this after committing.
+    """
+    _indexes[model].reset()
+    _announce(model)
+
+
+def _announce(model):
+    """Tells other processes that ``model``'s names changed."""
+    if cache.backend is not None:
+        cache.backend.bump(_indexes[model].tag)
+
+
+# ----------------------------------------------------------------------------#
+# Keep the indexes in step with committed writes.
+# ----------------------------------------------------------------------------#
+
+@event.listens_for(Session, 'after_flush')
+def _collect_name_changes(session, flush_context):
+    pending = session.info.setdefault('typeahead_changes', {})
+    for obj in session.new | session.dirty:
+        if type(obj) in _indexes and (obj in session.new or inspect(obj).attrs.name.history.has_changes()):
+            pending[(type(obj), obj.id)] = obj.name
+    for obj in session.deleted:
+        if type(obj) in _indexes:
+            pending[(type(obj), obj.id)] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_name_changes(session):
+    changes = session.info.pop('typeahead_changes', {})
+    for (model, id), name in changes.items():
+        _indexes[model].update(id, name)
+    for model in {model for model, _ in changes}:
+        _announce(model)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_name_changes(session):
+    session.info.pop('typeahead_changes', None)
@@ -0,0 +1,95 @@
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+# ----------------------------------------------------------------------------#
+# Request-scoped unit of work.
+#
+# The session begins its transaction lazily, on the first statement. Views
+# that change data wrap the change in ``unit_of_work.transaction()``, which
+# commits it once (nested blocks join the outermost one) or rolls it back on
+# error. Requests with a safe method (GET, HEAD, OPTIONS), and views marked
+# with ``unit_of_work.read_only`` such as the search forms, are read-only:
+# PostgreSQL runs their transaction READ ONLY and flushing from one raises
+# ReadOnlyRequestError. As soon as the view has returned, the session is
+# closed and its connection goes back to the pool, rather than at app
+# context teardown.
+# ----------------------------------------------------------------------------#
+
+SAFE_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+
+
+class ReadOnlyRequestError(RuntimeError):
+    pass
+
+
+def is_read_only():
+    """Whether the running request may only read."""
+    return has_request_context() and g.get('read_only', False)
+
+
+@event.listens_for(Session, 'after_begin')
+def _begin_read_only(session, transaction, connection):
+    if is_read_only() and connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql('SET TRANSACTION READ ONLY')
+
+
+@event.listens_for(Session, 'before_flush')
+def _refuse_read_only_flush(session, flush_context, instances):
+    if is_read_only():
+        raise ReadOnlyRequestError(f'{request.method} {request.path} tried to write to the database.')
+
+
+class UnitOfWork:
+    def __init__(self, app=None, db=None):
+        self.db = db
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.db = db
+        app.before_request(self._begin_request)
+        app.after_request(self._release)
+        app.extensions['unit_of_work'] = self
+
+    def _begin_request(self):
+        g.read_only = request.method in SAFE_METHODS
+        g.transaction_depth = 0
+
+    def _release(self, response):
+        # Streamed bodies may still be reading; teardown closes those.
+        if not response.is_streamed:
+            self.db.session.close()
+        return response
+
+    @contextmanager
+    def transaction(self):
+        """
+        Commits the work done in the block, or rolls it back and re-raises
+        if the block fails. Nested blocks commit with the outermost.
+        """
+        session = self.db.session
+        depth = g.get('transaction_depth', 0)
+        g.transaction_depth = depth + 1
+        try:
+            yield session
+            if depth == 0:
+                session.commit()
+        except BaseException:
+            if depth == 0:
+                session.rollback()
+            raise
+        finally:
+            g.transaction_depth = depth
+
+    def read_only(self, view):
+        """Marks a view that only reads whatever its method, e.g. a search form's POST."""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            g.read_only = True
+            return view(*args, **kwargs)
+        return wrapper
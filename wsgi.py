@@ -0,0 +1,18 @@
+"""
+Production WSGI entry point:
+
+    SECRET_KEY=... gunicorn -c gunicorn.conf.py
+    SECRET_KEY=... uwsgi --master --processes 4 --http :8000 --module wsgi:application
+
+Both servers import this module once in the master process and fork the
+workers from it: gunicorn because gunicorn.conf.py sets preload_app, uWSGI
+unless it runs with --lazy-apps. Workers therefore start with every module
+imported, every template compiled and the engines built. Each drops the
+database connections it inherited when forked (database.dispose_after_fork)
+and opens its own.
+"""
+import config
+from app import create_app, preload
+
+application = create_app(config.Production)
+preload(application)